@@ -0,0 +1,65 @@
+"""card_counters
+
+Revision ID: 2b7e4a1c9d3f
+Revises: 5791b368ac26
+Create Date: 2026-10-16 10:12:41.205118
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7e4a1c9d3f'
+down_revision = '5791b368ac26'
+
+
+COUNTERS = ('votes', 'comments', 'assets', 'checklist_items', 'checklist_items_done')
+
+
+def upgrade():
+    columns = [sa.Column(name, sa.Integer, nullable=False, server_default='0') for name in COUNTERS]
+    op.create_table(
+        'card_counters',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('card_id', sa.Integer, sa.ForeignKey('card.id', ondelete='CASCADE'), nullable=False),
+        sa.UniqueConstraint('card_id', name='card_counters_ix'),
+        *columns
+    )
+
+    metadata = sa.MetaData()
+    card = sa.Table('card', metadata, sa.Column('id', sa.Integer))
+    vote = sa.Table('vote', metadata, sa.Column('id', sa.Integer), sa.Column('card_id', sa.Integer))
+    comment = sa.Table('comment', metadata, sa.Column('id', sa.Integer), sa.Column('card_id', sa.Integer))
+    asset = sa.Table('asset', metadata, sa.Column('filename', sa.Unicode), sa.Column('card_id', sa.Integer))
+    checklists = sa.Table('checklists', metadata, sa.Column('id', sa.Integer), sa.Column('card_id', sa.Integer))
+    checklist_items = sa.Table(
+        'checklist_items', metadata,
+        sa.Column('id', sa.Integer), sa.Column('checklist_id', sa.Integer), sa.Column('done', sa.Boolean)
+    )
+    card_counters = sa.Table(
+        'card_counters', metadata,
+        sa.Column('card_id', sa.Integer),
+        *[sa.Column(name, sa.Integer) for name in COUNTERS]
+    )
+
+    def count(table, *criteria):
+        return sa.select([sa.func.count()]).select_from(table).where(sa.and_(*criteria)).as_scalar()
+
+    items = checklist_items.join(checklists, checklists.c.id == checklist_items.c.checklist_id)
+    select = sa.select([
+        card.c.id,
+        count(vote, vote.c.card_id == card.c.id),
+        count(comment, comment.c.card_id == card.c.id),
+        count(asset, asset.c.card_id == card.c.id),
+        count(items, checklists.c.card_id == card.c.id),
+        count(items, checklists.c.card_id == card.c.id, checklist_items.c.done == sa.true()),
+    ])
+    op.get_bind().execute(
+        card_counters.insert().from_select(('card_id',) + COUNTERS, select)
+    )
+
+
+def downgrade():
+    op.drop_table('card_counters')
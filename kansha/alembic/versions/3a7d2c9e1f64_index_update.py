@@ -0,0 +1,28 @@
+"""index_update
+
+Revision ID: 3a7d2c9e1f64
+Revises: 51e3a9d0c6b8
+Create Date: 2026-10-16 21:12:31.402917
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3a7d2c9e1f64'
+down_revision = '51e3a9d0c6b8'
+
+
+def upgrade():
+    op.create_table(
+        'index_update',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('card_id', sa.Integer, nullable=False),
+    )
+    op.create_index('ix_index_update_card_id', 'index_update', ['card_id'])
+
+
+def downgrade():
+    op.drop_table('index_update')
@@ -0,0 +1,23 @@
+"""card_version
+
+Revision ID: 4c1f8e2d7a05
+Revises: 2b7e4a1c9d3f
+Create Date: 2026-10-16 14:37:02.518344
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1f8e2d7a05'
+down_revision = '2b7e4a1c9d3f'
+
+
+def upgrade():
+    op.add_column('card', sa.Column('version', sa.Integer, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('card', 'version')
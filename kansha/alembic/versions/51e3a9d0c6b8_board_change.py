@@ -0,0 +1,33 @@
+"""board_change
+
+Revision ID: 51e3a9d0c6b8
+Revises: 4c1f8e2d7a05
+Create Date: 2026-10-16 16:05:48.110263
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '51e3a9d0c6b8'
+down_revision = '4c1f8e2d7a05'
+
+
+def upgrade():
+    op.create_table(
+        'board_change',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('board_id', sa.Integer, sa.ForeignKey('board.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('version', sa.Integer, nullable=False),
+        sa.Column('op', sa.Unicode(32), nullable=False),
+        sa.Column('card_id', sa.Integer),
+        sa.Column('column_id', sa.Integer),
+        sa.Column('index', sa.Integer),
+    )
+    op.create_index('board_change_ix', 'board_change', ['board_id', 'version'])
+
+
+def downgrade():
+    op.drop_table('board_change')
@@ -0,0 +1,27 @@
+"""index_capture
+
+Revision ID: 6e2b8f4a1d37
+Revises: 3a7d2c9e1f64
+Create Date: 2026-10-16 22:05:12.118342
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2b8f4a1d37'
+down_revision = '3a7d2c9e1f64'
+
+
+def upgrade():
+    op.create_table(
+        'index_capture',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('card_id', sa.Integer, nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table('index_capture')
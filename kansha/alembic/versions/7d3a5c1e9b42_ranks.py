@@ -0,0 +1,56 @@
+"""ranks
+
+Revision ID: 7d3a5c1e9b42
+Revises: 6e2b8f4a1d37
+Create Date: 2026-10-17 10:12:40.604417
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3a5c1e9b42'
+down_revision = '6e2b8f4a1d37'
+
+# see kansha.models.RANK_GAP
+RANK_GAP = 1 << 16
+
+
+def number(table, parent, column, first, step):
+    """Number the rows of each parent, in their current order"""
+    bind = op.get_bind()
+    rows = sa.Table(
+        table,
+        sa.MetaData(),
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column(parent, sa.Integer),
+        sa.Column(column, sa.BigInteger)
+    )
+    select = sa.select([rows.c.id, rows.c[parent]]).order_by(rows.c[parent], rows.c[column], rows.c.id)
+    values = []
+    last_parent = position = None
+    for id_, parent_id in bind.execute(select):
+        position = position + step if parent_id == last_parent else first
+        last_parent = parent_id
+        values.append({'row_id': id_, 'position': position})
+    if values:
+        bind.execute(
+            rows.update().where(rows.c.id == sa.bindparam('row_id')).values({column: sa.bindparam('position')}),
+            values
+        )
+
+
+def upgrade():
+    for table, parent in (('card', 'column_id'), ('column', 'board_id')):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('index', new_column_name='rank', type_=sa.BigInteger, existing_type=sa.Integer)
+        number(table, parent, 'rank', RANK_GAP, RANK_GAP)
+
+
+def downgrade():
+    for table, parent in (('card', 'column_id'), ('column', 'board_id')):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('rank', new_column_name='index', type_=sa.Integer, existing_type=sa.BigInteger)
+        number(table, parent, 'index', 0, 1)
@@ -0,0 +1,27 @@
+"""board_deletion
+
+Revision ID: 8e4b6d2f0a15
+Revises: 7d3a5c1e9b42
+Create Date: 2026-10-17 14:38:05.219734
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4b6d2f0a15'
+down_revision = '7d3a5c1e9b42'
+
+
+def upgrade():
+    op.create_table(
+        'board_deletion',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('board_id', sa.Integer, nullable=False, unique=True),
+    )
+
+
+def downgrade():
+    op.drop_table('board_deletion')
@@ -0,0 +1,38 @@
+"""board last activity
+
+Revision ID: 9a5c3e7f1b26
+Revises: 8e4b6d2f0a15
+Create Date: 2026-10-18 09:21:47.330812
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9a5c3e7f1b26'
+down_revision = '8e4b6d2f0a15'
+
+
+def upgrade():
+    op.add_column('board', sa.Column('last_activity', sa.DateTime))
+
+    metadata = sa.MetaData()
+    board = sa.Table(
+        'board', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('last_activity', sa.DateTime)
+    )
+    history = sa.Table(
+        'history', metadata,
+        sa.Column('when', sa.DateTime),
+        sa.Column('board_id', sa.Integer)
+    )
+    last_activity = sa.select([sa.func.max(history.c.when)]).where(history.c.board_id == board.c.id)
+    op.get_bind().execute(board.update().values(last_activity=last_activity.as_scalar()))
+
+
+def downgrade():
+    with op.batch_alter_table('board') as batch_op:
+        batch_op.drop_column('last_activity')
@@ -0,0 +1,26 @@
+"""board deletion claim
+
+Revision ID: b4d8f2a6c013
+Revises: 9a5c3e7f1b26
+Create Date: 2026-10-19 10:12:31.604117
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4d8f2a6c013'
+down_revision = '9a5c3e7f1b26'
+
+
+def upgrade():
+    op.add_column('board_deletion', sa.Column('claimed_by', sa.Unicode(255)))
+    op.add_column('board_deletion', sa.Column('claimed_at', sa.DateTime))
+
+
+def downgrade():
+    with op.batch_alter_table('board_deletion') as batch_op:
+        batch_op.drop_column('claimed_at')
+        batch_op.drop_column('claimed_by')
@@ -243,12 +243,19 @@ class WSGIApp(wsgi.WSGIApp):
         self.application_path = conf['application']['path']
 
         # search_engine engine configuration
-        self.search_engine = SearchEngine(**conf['search'])
-        self._services.register('search_engine', self.search_engine)
+        self.search_options = dict(conf['search'])
+        self.search_engine = SearchEngine(**self.search_options)
+        # the components update the index through the queue, if activated
+        self.index_queue = self._services['index_queue']
+        self._services.register('search_engine', self.index_queue.wrap(self.search_engine))
         Card.update_schema(self.card_extensions)
 
         # Make assets_manager available to kansha-admin commands
         self.assets_manager = self._services['assets_manager']
+        self.push_notifications = self._services['push']
+        self.query_stats = self._services['query_stats']
+        self.profiler = self._services['profiler']
+        self.deletion_queue = self._services['deletion_queue']
 
         # other
         self.security = SecurityManager(conf['application']['crypto_key'])
@@ -291,20 +298,44 @@ class WSGIApp(wsgi.WSGIApp):
             request = webob.Request(environ)
             environ['QUERY_STRING'] += ('&' + request.params['state'])
             environ['REQUEST_METHOD'] = 'POST'
-        if self.debug:
-            perf = profile.Profile()
-            start = time.time()
-            ret = perf.runcall(super(WSGIApp, self).__call__, environ, start_response)
-            if time.time() - start > 1:
-                stats = pstats.Stats(perf)
-                stats.sort_stats('cumtime')
-                stats.print_stats(60)
-            return ret
-        else:
-            return super(WSGIApp, self).__call__(environ, start_response)
+        path = environ.get('PATH_INFO', '').split('/')
+        if len(path) == 4 and path[1:3] == ['push', 'board']:
+            # Answered outside of the sessions: don't hold a session lock while waiting
+            return self.push_notifications.handle_request(
+                environ, start_response, u'board/' + path[3].decode('utf-8'))
+        self.index_queue.start_worker(self)
+        self.deletion_queue.start_worker(self)
+        self.push_notifications.start_server()
+        self.query_stats.start()
+        self.profiler.start()
+        try:
+            if self.debug:
+                perf = profile.Profile()
+                start = time.time()
+                ret = perf.runcall(super(WSGIApp, self).__call__, environ, start_response)
+                if time.time() - start > 1:
+                    stats = pstats.Stats(perf)
+                    stats.sort_stats('cumtime')
+                    stats.print_stats(60)
+                return ret
+            else:
+                return super(WSGIApp, self).__call__(environ, start_response)
+        finally:
+            self.profiler.stop()
+            self.query_stats.stop('%s %s' % (environ.get('REQUEST_METHOD', 'GET'), environ.get('PATH_INFO', '/')))
+            # the index operations left by a failed request must not hold a connection of the index
+            self._services['search_engine'].cancel()
+            # The transaction is committed: the clients can be notified
+            self.push_notifications.flush()
+            # and the files of the deleted assets can go
+            self.deletion_queue.flush(self.assets_manager)
 
     def on_exception(self, request, response):
         exc_class, e = sys.exc_info()[:2]
+        # the transaction is rolled back
+        self.deletion_queue.cancel()
+        self.push_notifications.cancel()
+        self._services['search_engine'].cancel()
         for k, v in request.POST.items():
             if isinstance(v, cgi.FieldStorage):
                 request.POST[k] = u'Content not displayed'
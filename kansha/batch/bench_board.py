@@ -0,0 +1,176 @@
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+
+"""
+Measure the memory used by the boards, on generated boards.
+Registered as a nagare-admin command.
+Usage :
+nagare-admin bench-board [--sizes N,N...] [--top N] [--output FILE] <app name | config file>
+"""
+
+import gc
+import os
+import json
+import resource
+from datetime import datetime
+
+import pkg_resources
+
+from nagare import database, i18n, local, security
+from nagare.admin import util, command
+from nagare.namespaces import xhtml5
+
+from kansha.board.comp import Board
+from kansha.card.models import DataCard
+from kansha.card.view import render_card_summary
+from kansha.models import RANK_GAP
+from kansha.pickle import pickled_sizes
+from kansha.board import models as board_models
+from kansha.user.usermanager import UserManager
+from kansha.board.boardsmanager import BoardsManager
+
+
+def resident_size():
+    """Resident memory of the process, in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        # peak resident memory: only meaningful when it grows
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def create_board(app, user, size):
+    """Create a board with ``size`` cards, spread over its columns"""
+    template = board_models.create_template_todo()
+    boards_manager = app._services(
+        BoardsManager, app.app_title, '', app.theme, app.card_extensions)
+    board = boards_manager.create_board_from_template(template.id, user).data
+    columns = [column for column in board.columns if not column.archive]
+    labels = board.labels
+    now = datetime.utcnow()
+    for i in xrange(size):
+        column = columns[i % len(columns)]
+        card = DataCard(title=u'Card %d' % i, creation_date=now,
+                        rank=(i // len(columns) + 1) * RANK_GAP)
+        if i % 3 == 0:
+            card.labels = [labels[i % len(labels)]]
+        column.cards.append(card)
+    database.session.flush()
+    return board.id
+
+
+def open_board(app, board_id):
+    """Build the board as when a user opens it, and render its cards"""
+    board = app._services(Board, board_id, app.app_title, '', app.theme, app.card_extensions)
+    for column in board.columns:
+        for card_comp in column().cards:
+            render_card_summary(card_comp(), xhtml5.Renderer())
+    return board
+
+
+def measure(app, size, top):
+    """Resident and pickled bytes of a board of ``size`` cards"""
+    board_id = create_board(app, security.get_user(), size)
+    database.session.expire_all()
+    gc.collect()
+    before = resident_size()
+    board = open_board(app, board_id)
+    gc.collect()
+    resident = resident_size() - before
+    pickled, sizes = pickled_sizes(board)
+    sizes = sorted(sizes.iteritems(), key=lambda (name, size): -size)
+    database.session.expire_all()
+    return {
+        'cards': size,
+        'resident': resident,
+        'pickled': pickled,
+        'pickled_by_class': dict(sizes[:top])
+    }
+
+
+class BenchBoard(command.Command):
+
+    desc = 'Measure the resident memory and the session size of generated boards, rolled back afterwards.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+        optparser.add_option(
+            '--sizes',
+            dest='sizes',
+            default='100,1000,5000',
+            help='Comma separated numbers of cards of the boards (default 100,1000,5000)'
+        )
+        optparser.add_option(
+            '--top',
+            dest='top',
+            type='int',
+            default=20,
+            help='Number of classes reported, by decreasing pickled size (default 20)'
+        )
+        optparser.add_option(
+            '-o', '--output',
+            dest='output',
+            default=None,
+            help='Write the results, as JSON, in this file rather than on the standard output'
+        )
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        try:
+            sizes = [int(size) for size in options.sizes.split(',')]
+        except ValueError:
+            parser.error('--sizes must be comma separated numbers')
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        for (database_settings, populate) in databases:
+            database.set_metadata(*database_settings)
+        if not active_app:
+            return
+
+        with i18n.Locale('en', 'US'):
+            user_manager = UserManager()
+            username = u'benchmark_%d' % os.getpid()
+            data = user_manager.create_user(username, u'password', u'Benchmark', username + u'@localhost')
+            database.session.flush()
+            local.request = local.Thread()
+            security.set_user(user_manager.get_app_user(username, data))
+            security.set_manager(active_app.security)
+            try:
+                results = [measure(active_app, size, options.top) for size in sizes]
+            finally:
+                # nothing is kept
+                database.session.rollback()
+
+        output = json.dumps({'runs': results}, indent=2, sort_keys=True, separators=(',', ': '))
+        if options.output:
+            with open(options.output, 'w') as f:
+                f.write(output + '\n')
+        else:
+            print output
@@ -0,0 +1,100 @@
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+
+"""
+Benchmark the search engine of the application on generated cards.
+Registered as a nagare-admin command.
+Usage :
+nagare-admin bench-search [--sizes N,N...] [--searches N] [--seed N] [--output FILE] <app name | config file>
+"""
+
+import json
+
+import pkg_resources
+
+from nagare.admin import util, command
+
+from kansha.services.search import SearchEngine, benchmark
+
+
+class BenchSearch(command.Command):
+
+    desc = 'Benchmark the search engine of the application, in a temporary "benchmark" index.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+        optparser.add_option(
+            '--sizes',
+            dest='sizes',
+            default='1000,10000',
+            help='Comma separated numbers of cards to index and search (default 1000,10000)'
+        )
+        optparser.add_option(
+            '--searches',
+            dest='searches',
+            type='int',
+            default=200,
+            help='Number of searches of each kind (default 200)'
+        )
+        optparser.add_option(
+            '--seed',
+            dest='seed',
+            type='int',
+            default=0,
+            help='Seed of the generated cards, change it to get another corpus'
+        )
+        optparser.add_option(
+            '-o', '--output',
+            dest='output',
+            default=None,
+            help='Write the results, as JSON, in this file rather than on the standard output'
+        )
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        try:
+            sizes = [int(size) for size in options.sizes.split(',')]
+        except ValueError:
+            parser.error('--sizes must be comma separated numbers')
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        if active_app:
+            # same engine and options, another index
+            engine_options = dict(active_app.search_options, index='benchmark')
+            results = benchmark.suite(
+                lambda: SearchEngine(**engine_options), sizes, searches=options.searches,
+                updates=options.searches, seed=options.seed
+            )
+            results = {'engine': engine_options.get('engine', 'dummy'), 'seed': options.seed, 'runs': results}
+            output = json.dumps(results, indent=2, sort_keys=True, separators=(',', ': '))
+            if options.output:
+                with open(options.output, 'w') as f:
+                    f.write(output + '\n')
+            else:
+                print output
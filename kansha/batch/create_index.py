@@ -20,32 +20,187 @@
 """
 Create and (re)build the search index for cards.
 It is safe to run it anytime.
+With ``--shadow``, the index is rebuilt aside and replaces the current one
+at the end: the search keeps working meanwhile.
 Registered as a nagare-admin command.
 Usage :
-nagare-admin create-index <app name | config file>
+nagare-admin create-index [--batch-size N] [--from-id CARD_ID | --shadow] [--workers N [--benchmark]] <app name | config file>
 """
 
+import time
+import multiprocessing
+from itertools import izip
+
 import pkg_resources
 
 from nagare import database
 from nagare.admin import util, command
 
 from kansha.card.comp import Card
-from kansha.column.comp import Column
 from kansha.card.models import DataCard
-from kansha.services.actionlog import DummyActionLog
+from kansha.card.indexing import card_rows, build_documents
+from kansha.services.index_queue.models import DataIndexCapture
+
+
+def iter_card_batches(batch_size, from_id=0):
+    """Page through the cards, in id order
+
+    In:
+      - ``from_id`` -- start after this card id
+    Return:
+      - iterator of lists of ``card_rows``
+    """
+    q = card_rows()
+    while True:
+        # keyset pagination: each page is as cheap as the first one
+        batch = q.filter(DataCard.id > from_id).limit(batch_size).all()
+        if not batch:
+            break
+        yield batch
+        from_id = batch[-1][0]
+
+
+def card_ranges(batch_size, from_id=0):
+    """Split the cards after ``from_id`` in ranges of ``batch_size`` cards
+
+    Return:
+      - list of (first card id, last card id) tuples
+    """
+    q = database.session.query(DataCard.id).filter(DataCard.id > from_id).order_by(DataCard.id)
+    ids = [card_id for card_id, in q]
+    return [(ids[i], ids[min(i + batch_size, len(ids)) - 1]) for i in xrange(0, len(ids), batch_size)]
+
+
+def iter_documents(app, batch_size, from_id=0):
+    """Build the documents of the cards after ``from_id``, ``batch_size`` at a time
+
+    Return:
+      - iterator of (last card id, documents) tuples
+    """
+    for batch in iter_card_batches(batch_size, from_id):
+        documents = build_documents(app.card_extensions, app._services, batch)
+        # don't let the session grow with the loaded entities
+        database.session.expunge_all()
+        yield batch[-1][0], documents
+
+
+# State of the workers of the pool, inherited from the parent process
+_worker_app = None
+_worker_metadatas = ()
+
+
+def _init_worker():
+    # the connections inherited from the parent process can't be shared:
+    # each worker opens its own ones
+    for metadata in _worker_metadatas:
+        metadata.bind.dispose()
+
+
+def _build_range(card_range):
+    """Build, in a worker, the documents of the cards of ``card_range``"""
+    first, last = card_range
+    batch = card_rows().filter(DataCard.id.between(first, last)).all()
+    documents = build_documents(_worker_app.card_extensions, _worker_app._services, batch)
+    database.session.remove()
+    # sent back to the writer as plain data
+    return [(document._id, dict((name, getattr(document, name)) for name in document.fields))
+            for document in documents]
+
 
+def iter_documents_parallel(app, metadatas, workers, batch_size, from_id=0):
+    """Same as ``iter_documents``, with the documents built by a pool of ``workers`` processes
 
-# FIXME: too low level
-def rebuild_index(app):
-    # init index
-    action_log = DummyActionLog()
-    app.search_engine.create_collection([Card.schema])
-    for card in DataCard.query:
-        board_id = card.column.board.id
-        card = app._services(Card, card.id, app.card_extensions, action_log, lambda x: True, data=card)
-        card.add_to_index(app.search_engine, board_id)
-    app.search_engine.commit()
+    The batches are still yielded in card id order, so that the last card id is a valid checkpoint.
+
+    In:
+      - ``metadatas`` -- the SQLAlchemy metadatas of the application
+    """
+    global _worker_app, _worker_metadatas
+
+    ranges = card_ranges(batch_size, from_id)
+    database.session.remove()
+    _worker_app, _worker_metadatas = app, metadatas
+    pool = multiprocessing.Pool(workers, _init_worker)
+    try:
+        for (first, last), documents in izip(ranges, pool.imap(_build_range, ranges)):
+            yield last, [Card.schema(docid, **fields) for docid, fields in documents]
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def rebuild_index(app, batch_size=500, from_id=None, workers=1, metadatas=(), shadow=False):
+    """(Re)index all the cards, ``batch_size`` at a time
+
+    In:
+      - ``from_id`` -- resume after this card id, as reported by a previous run,
+                       instead of recreating the index
+      - ``workers`` -- number of processes building the documents
+      - ``metadatas`` -- the SQLAlchemy metadatas of the application, needed by the workers
+      - ``shadow`` -- build a new index and swap it with the current one at the end
+    """
+    search_engine = app.search_engine
+    if shadow:
+        # the cards indexed meanwhile by the index queue are replayed at the end
+        DataIndexCapture.open()
+        database.session.commit()
+        search_engine = app.search_engine.create_shadow([Card.schema])
+    elif from_id is None:
+        search_engine.create_collection([Card.schema])
+    if workers > 1:
+        batches = iter_documents_parallel(app, metadatas, workers, batch_size, from_id or 0)
+    else:
+        batches = iter_documents(app, batch_size, from_id or 0)
+    count = 0
+    start = time.time()
+    for last_id, documents in batches:
+        search_engine.add_documents(documents)
+        search_engine.commit()
+        count += len(documents)
+        if shadow:
+            print '%d cards indexed (%.0f cards/s)' % (count, count / (time.time() - start))
+        else:
+            print '%d cards indexed (%.0f cards/s), checkpoint: --from-id %d' % (
+                count, count / (time.time() - start), last_id)
+    if shadow:
+        swap_index(app, search_engine)
+
+
+def swap_index(app, shadow):
+    """Replay the captured updates in the ``shadow`` index and make it the live one"""
+    queue = app.index_queue
+    print '%d updates replayed' % queue.replay(shadow, app.card_extensions, app._services)
+    app.search_engine.swap(shadow)
+    # waits for the updates being applied, maybe to the previous index: nothing is captured afterwards
+    DataIndexCapture.close()
+    database.session.commit()
+    # the updates applied to the previous index during the swap
+    queue.replay(app.search_engine, app.card_extensions, app._services)
+    print 'Index swapped'
+
+
+def benchmark(app, batch_size=500, workers=1, metadatas=()):
+    """Measure how the documents building scales with the number of workers
+
+    The documents are built but not indexed.
+    """
+    counts = [1]
+    while counts[-1] * 2 <= workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != workers:
+        counts.append(workers)
+    reference = None
+    for count in counts:
+        if count > 1:
+            batches = iter_documents_parallel(app, metadatas, count, batch_size)
+        else:
+            batches = iter_documents(app, batch_size)
+        start = time.time()
+        cards = sum(len(documents) for __, documents in batches)
+        throughput = cards / (time.time() - start)
+        reference = reference or throughput
+        print '%d worker(s): %d cards, %.0f cards/s, speedup x%.1f' % (
+            count, cards, throughput, throughput / reference)
 
 
 class ReIndex(command.Command):
@@ -55,10 +210,49 @@ class ReIndex(command.Command):
     @staticmethod
     def set_options(optparser):
         optparser.usage += ' [application]'
+        optparser.add_option(
+            '--batch-size',
+            dest='batch_size',
+            type='int',
+            default=500,
+            help='Number of cards indexed at once'
+        )
+        optparser.add_option(
+            '--from-id',
+            dest='from_id',
+            type='int',
+            default=None,
+            help='Resume an interrupted indexing after this card id, as reported by the progress'
+        )
+        optparser.add_option(
+            '--shadow',
+            dest='shadow',
+            action='store_true',
+            default=False,
+            help='Build a new index and replace the current one at the end, instead of recreating it'
+        )
+        optparser.add_option(
+            '-w',
+            '--workers',
+            dest='workers',
+            type='int',
+            default=1,
+            help='Number of processes building the documents'
+        )
+        optparser.add_option(
+            '--benchmark',
+            dest='benchmark',
+            action='store_true',
+            default=False,
+            help='Only measure the documents building speed from 1 to WORKERS workers, without indexing'
+        )
 
     @staticmethod
     def run(parser, options, args):
 
+        if options.shadow and options.from_id is not None:
+            parser.error('--from-id can not resume a --shadow indexing')
+
         try:
             application = args[0]
         except IndexError:
@@ -79,5 +273,11 @@ class ReIndex(command.Command):
             app, cfgfile, conf, parser.error, data_path=data_path)
         for (database_settings, populate) in databases:
             database.set_metadata(*database_settings)
-        if active_app:
-            rebuild_index(active_app)
+        metadatas = [database_settings[0] for (database_settings, populate) in databases]
+        if active_app and options.benchmark:
+            benchmark(active_app, options.batch_size, options.workers, metadatas)
+        elif active_app:
+            if options.shadow and not active_app.index_queue.activated:
+                # only the updates applied by the queue are captured: the new index would miss the others
+                parser.error('--shadow needs the index_queue service: activate it in the configuration file')
+            rebuild_index(active_app, options.batch_size, options.from_id, options.workers, metadatas, options.shadow)
@@ -0,0 +1,64 @@
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+
+"""
+Apply the queued search index updates (see the ``index_queue`` service).
+Registered as a nagare-admin command.
+Usage :
+nagare-admin index-worker [--once] <app name | config file>
+"""
+
+import pkg_resources
+
+from nagare import database
+from nagare.admin import util, command
+
+
+class IndexWorker(command.Command):
+
+    desc = 'Apply the queued search index updates of the application.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+        optparser.add_option(
+            '--once',
+            dest='once',
+            action='store_true',
+            default=False,
+            help='Exit when the queue is empty'
+        )
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        for (database_settings, populate) in databases:
+            database.set_metadata(*database_settings)
+        if active_app:
+            active_app.index_queue.run(
+                active_app.search_engine, active_app.card_extensions, active_app._services, options.once)
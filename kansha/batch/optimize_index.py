@@ -0,0 +1,64 @@
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+
+"""
+Compact the search index, or configure its incremental merges.
+Registered as a nagare-admin command.
+Usage :
+nagare-admin optimize-index [--automerge N] <app name | config file>
+"""
+
+import time
+
+import pkg_resources
+
+from nagare.admin import util, command
+
+
+class OptimizeIndex(command.Command):
+
+    desc = 'Merge the segments of the search index of the application.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+        optparser.add_option(
+            '--automerge',
+            dest='automerge',
+            type='int',
+            default=None,
+            help='Set the incremental merge level applied on writes instead of merging now (SQLite engines)'
+        )
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        if active_app:
+            start = time.time()
+            active_app.search_engine.optimize(options.automerge)
+            print 'Index optimized in %.1fs' % (time.time() - start)
@@ -0,0 +1,57 @@
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+
+"""
+Answer the push notification requests of the browsers (see the ``push`` service).
+Registered as a nagare-admin command.
+Usage :
+nagare-admin push-server <app name | config file>
+"""
+
+import pkg_resources
+
+from nagare.admin import util, command
+
+
+class PushServer(command.Command):
+
+    desc = 'Answer the push notification requests of the browsers, from a single thread.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        if active_app:
+            push = active_app.push_notifications
+            if push.server != 'process' or push.broker_name == 'local':
+                # the versions published by the application processes would never reach this one
+                parser.error('set server = process and broker = socket in the push section of the configuration file')
+            push.serve()
@@ -0,0 +1,68 @@
+#--
+# Copyright (c) 2012-2015 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+
+"""
+Rebuild the denormalized card counters (votes, comments, assets, checklist items)
+from the actual data.
+It is safe to run it anytime.
+Registered as a nagare-admin command.
+Usage :
+nagare-admin rebuild-counters <app name | config file>
+"""
+
+import pkg_resources
+
+from nagare import database
+from nagare.admin import util, command
+
+from kansha.card.models import DataCardCounters
+from kansha.card.counters import insert_counters
+
+
+def rebuild_counters():
+    '''Recompute the counters of all the cards in two set based statements'''
+    database.session.execute(DataCardCounters.table.delete())
+    insert_counters()
+    database.session.commit()
+
+
+class RebuildCounters(command.Command):
+
+    desc = 'Rebuild the card counters of the application.'
+
+    @staticmethod
+    def set_options(optparser):
+        optparser.usage += ' [application]'
+
+    @staticmethod
+    def run(parser, options, args):
+
+        try:
+            application = args[0]
+        except IndexError:
+            application = 'kansha'
+
+        (cfgfile, app, dist, conf) = util.read_application(application,
+                                                           parser.error)
+        requirement = (
+            None if not dist
+            else pkg_resources.Requirement.parse(dist.project_name)
+        )
+        data_path = (
+            None if not requirement
+            else pkg_resources.resource_filename(requirement, '/data')
+        )
+
+        (active_app, databases) = util.activate_WSGIApp(
+            app, cfgfile, conf, parser.error, data_path=data_path)
+        for (database_settings, populate) in databases:
+            database.set_metadata(*database_settings)
+        if active_app:
+            rebuild_counters()
@@ -14,7 +14,7 @@ from nagare import security, component, i18n
 
 from kansha import events
 
-from .comp import Board, BOARD_PRIVATE, BOARD_PUBLIC
+from .comp import Board, BOARD_PRIVATE, BOARD_PUBLIC, BOARD_SHARED
 
 
 class BoardsManager(object):
@@ -53,7 +53,7 @@ class BoardsManager(object):
             user = security.get_user()
         template = self._services(
             Board, template_id, self.app_title, self.app_banner, self.theme,
-            self.card_extensions)
+            self.card_extensions, load_children=False)
         new_board = template.copy(user)
         new_board.archive_column = new_board.create_column(index=-1, title=i18n._(u'Archive'))
         new_board.archive_column.is_archive = True
@@ -75,43 +75,44 @@ class BoardsManager(object):
         self.my_boards = []
         self.guest_boards = []
         self.archived_boards = []
-        last_modifications = set()
-        for board_obj in self._services(Board.get_all_boards, user, self.app_title,
+        self.shared_boards = []
+        last_modifications = []
+        # the roles of the user and the last activities come with the boards
+        for board_obj in self._services(Board.get_user_boards, user, self.app_title,
                                         self.app_banner, self.theme,
                                         self.card_extensions,
                                         load_children=False):
+            board_comp = component.Component(board_obj)
+            if board_obj.data.visibility == BOARD_SHARED:
+                self.shared_boards.append(board_comp)
             if (security.has_permissions('manage', board_obj) or
                     security.has_permissions('edit', board_obj)):
-                board_comp = component.Component(board_obj)
                 if board_obj.archived:
                     self.archived_boards.append(board_comp)
                 else:
                     last_activity = board_obj.get_last_activity()
                     if last_activity is not None:
-                        last_modifications.add((last_activity, board_comp))
+                        last_modifications.append((last_activity, board_comp))
                     if security.has_permissions('manage', board_obj):
                         self.my_boards.append(board_comp)
                     elif security.has_permissions('edit', board_obj):
                         self.guest_boards.append(board_comp)
 
-        last_5 = sorted(last_modifications, reverse=True)[:5]
+        last_5 = sorted(last_modifications, key=lambda (modified, comp): modified, reverse=True)[:5]
         self.last_modified_boards = [comp for _modified, comp in last_5]
 
-        self.shared_boards = [
-            component.Component(board_obj) for board_obj in
-            self._services(Board.get_shared_boards, self.app_title,
-                           self.app_banner, self.theme,
-                           self.card_extensions,
-                           load_children=False)
-        ]
-
         public, private = Board.get_templates_for(user)
         self.templates = {'public': [(b.id, b.template_title) for b in public],
                           'private': [(b.id, b.template_title) for b in private]}
 
+    def forget_user_roles(self):
+        """The boards are kept in the session: their members can change before they are loaded again"""
+        for board in self.last_modified_boards + self.my_boards + self.guest_boards + self.shared_boards + \
+                self.archived_boards:
+            board().user_roles = {}
+
     def purge_archived_boards(self):
         for board in self.archived_boards:
-            board().load_children()
             board().delete()
         self.load_user_boards()
 
@@ -119,7 +120,6 @@ class BoardsManager(object):
         if event.is_kind_of(events.BoardAccessChanged):
             if event.is_(events.BoardDeleted):
                 board = event.emitter
-                board.load_children()
                 board.delete()
             return self.load_user_boards()
 
@@ -20,6 +20,10 @@ from nagare import component, log, security, var
 
 from kansha import title
 from kansha.card import Card
+from kansha.card.comp import ExtensionsPreloader
+from kansha.card.models import DataCard
+from kansha.card.indexing import card_rows, build_documents
+from kansha.models import rank_for
 from kansha.user import usermanager
 from kansha.services import ActionLog
 from kansha.column import comp as column
@@ -31,9 +35,10 @@ from kansha import events, exceptions, validator
 from kansha.board_card_filter import BoardCardFilter
 
 from .boardconfig import BoardConfig
+from .cloning import clone_board
 from .excel_export import ExcelExport
 from .templates import SaveTemplateTask
-from .models import DataBoard, BOARD_PRIVATE, BOARD_PUBLIC, BOARD_SHARED
+from .models import DataBoard, DataBoardChange, BOARD_PRIVATE, BOARD_PUBLIC, BOARD_SHARED
 
 
 # Votes authorizations
@@ -61,13 +66,15 @@ class Board(events.EventHandlerMixIn):
     background_max_size = 3 * 1024  # in Bytes
 
     def __init__(self, id_, app_title, app_banner, theme, card_extensions, search_engine_service,
-                 assets_manager_service, mail_sender_service, services_service,
-                 load_children=True, data=None):
+                 assets_manager_service, mail_sender_service, push_service, deletion_queue_service,
+                 services_service, load_children=True, data=None):
         """Initialization
 
         In:
           -- ``id_`` -- the id of the board in the database
           -- ``mail_sender_service`` -- Mail service, used to send mail
+          -- ``push_service`` -- Push notifications service, used to notify the other users of the changes
+          -- ``deletion_queue_service`` -- Deletion service, used to delete the board and its cards
           -- ``on_board_delete`` -- function to call when the board is deleted
         """
         self.model = 'columns'
@@ -79,6 +86,8 @@ class Board(events.EventHandlerMixIn):
         self._data = data
         self.assets_manager = assets_manager_service
         self.search_engine = search_engine_service
+        self.push = push_service
+        self.deletion_queue = deletion_queue_service
         self._services = services_service
         # Board extensions are not extracted yet, so
         # board itself implement their API.
@@ -94,6 +103,8 @@ class Board(events.EventHandlerMixIn):
         self.action_log = ActionLog(self)
 
         self.version = self.data.version
+        # changes not journaled yet, see ``add_change``
+        self.pending_changes = []
         self.modal = component.Component(popin.Empty())
         self.card_filter = self._services(BoardCardFilter, Card.schema, self.id,
                                           not self.show_archive)
@@ -101,6 +112,9 @@ class Board(events.EventHandlerMixIn):
 
         self.columns = []
         self.archive_column = None
+        # {username: None, or True if manager}, loaded with the board, until the home page is rendered
+        # or the members change
+        self.user_roles = {}
         if load_children:
             self.load_children()
 
@@ -192,21 +206,19 @@ class Board(events.EventHandlerMixIn):
     def copy(self, owner):
         """
         Create a new board that is a copy of self, without the archive.
-        Children must be loaded.
+        The columns and the cards are copied in a few statements per table.
         """
         new_data = self.data.copy()
         if self.data.background_image:
-            new_data.background_image = self.assets_manager.copy(self.data.background_image)
+            new_data.background_image = self.assets_manager.share(self.data.background_image)
         new_board = self._services(Board, new_data.id, self.app_title, self.app_banner, self.theme,
             self.card_extensions, load_children=False, data=new_data)
         new_board.add_member(owner, 'manager')
 
-        assert(self.columns or self.data.is_template)
-        cols = [col() for col in self.columns if not col().is_archive]
-        for column in cols:
-            new_column = new_board.create_column(-1, column.get_title())
-            new_column.update(column)
-
+        card_ids = clone_board(self.data, new_data, self.card_extensions, self._services, owner.data)
+        new_board.load_children()
+        new_board.index_cards(card_ids.values())
+        new_board.search_engine.commit()
         return new_board
 
     def on_event(self, comp, event):
@@ -236,18 +248,108 @@ class Board(events.EventHandlerMixIn):
 
         self.columns = columns
 
+    def load_cards(self, column):
+        """Build the cards of ``column``, along with the ones of the other columns shown
+
+        The extensions data of all these cards is bulk loaded when the first of them needs it.
+        """
+        preloader = ExtensionsPreloader(self.card_extensions)
+        for col in self.columns:
+            col = col()
+            if not col.cards_built and (col is column or self.show_archive or not col.is_archive):
+                col.build_cards(preloader)
+        if not column.cards_built:
+            # not added to the board yet
+            column.build_cards(preloader)
+
+    def add_change(self, op, card_id=None, column_id=None, index=None):
+        """Record a change of the board, journaled by the next ``increase_version``
+
+        In:
+          - ``op`` -- one of 'card_created', 'card_moved', 'card_archived', 'card_deleted',
+                      'card_edited', 'column_changed' (its cards) or 'columns_changed'
+        """
+        self.pending_changes.append(
+            {'op': op, 'card_id': card_id, 'column_id': column_id, 'index': index}
+        )
+
     def increase_version(self):
-        self.version += 1
-        self.data.increase_version()
-        return self.refresh_on_version_mismatch()
-
-    def refresh_on_version_mismatch(self):
-        refresh = False
-        if self.data.version - self.version != 0:
-            self.refresh()  # when does that happen?
-            self.version = self.data.version
-            refresh = True
-        return refresh
+        """Journal the pending changes and catch up with the ones of the other sessions
+
+        Return:
+          - True if changes of other sessions were applied (the columns must be rendered again)
+        """
+        changes, self.pending_changes = self.pending_changes, []
+        own_versions = self.data.increase_version(changes) if changes else ()
+        if own_versions:
+            self.push.publish(u'board/' + self.data.uri, self.data.version)
+        return self.refresh_on_version_mismatch(own_versions)
+
+    def refresh_on_version_mismatch(self, own_versions=()):
+        """Catch up with the changes made by the other sessions
+
+        Only the changed columns and cards are updated, unless the journal
+        doesn't go back to our version anymore.
+
+        In:
+          - ``own_versions`` -- versions of the changes of this session, already applied
+        Return:
+          - True if the board has been changed
+        """
+        version = self.data.version
+        if version == self.version:
+            return False
+        changes = DataBoardChange.get_since(self.data, self.version, version)
+        self.version = version
+        if changes is None:
+            self.refresh()
+            return True
+        changes = [change for change in changes if change.version not in own_versions]
+        if changes:
+            self.apply_changes(changes)
+        return bool(changes)
+
+    def apply_changes(self, changes):
+        """Update the columns and cards touched by the journaled ``changes``"""
+        if any(change.op == 'columns_changed' for change in changes):
+            self.sync_columns()
+        card_comps = {}
+        card_columns = {}
+        for col in self.columns:
+            for card_id, card_comp in col().get_loaded_cards().iteritems():
+                card_comps[card_id] = card_comp
+                card_columns[card_id] = col().db_id
+        to_sync = set()
+        to_refresh = set()
+        for change in changes:
+            if change.op == 'card_edited':
+                to_refresh.add(change.card_id)
+            else:
+                to_sync.add(change.column_id)
+                to_sync.add(card_columns.get(change.card_id))
+        for col in self.columns:
+            if col().db_id in to_sync:
+                col().sync_cards(card_comps)
+        for card_id in to_refresh:
+            card_comp = card_comps.get(card_id)
+            # cards being edited are refreshed when their editor is closed
+            if card_comp is not None and isinstance(card_comp(), Card):
+                card_comp().refresh()
+
+    def sync_columns(self):
+        """Put the columns in the database order, reusing the existing components"""
+        col_comps = dict((col().db_id, col) for col in self.columns)
+        columns = []
+        for c in self.data.columns:
+            col_comp = col_comps.get(c.id)
+            if col_comp is None:
+                col_comp = component.Component(self._services(
+                    column.Column, c.id, self, self.card_extensions,
+                    self.action_log, self.card_filter, data=c))
+            if col_comp().is_archive:
+                self.archive_column = col_comp()
+            columns.append(col_comp)
+        self.columns = columns
 
     def refresh(self):
         log.info('sync')
@@ -327,6 +429,7 @@ class Board(events.EventHandlerMixIn):
             self.card_extensions, self.action_log, self.card_filter)
         self.columns.insert(
             index, component.Component(col_obj))
+        self.add_change('columns_changed')
         self.increase_version()
         return col_obj
 
@@ -340,6 +443,7 @@ class Board(events.EventHandlerMixIn):
         self.columns.remove(col_comp)
         self.data.delete_column(col_comp().data)
         col_comp().delete()
+        self.add_change('columns_changed')
         self.increase_version()
         return popin.Empty()
 
@@ -377,6 +481,8 @@ class Board(events.EventHandlerMixIn):
             card.add_to_index(self.search_engine, self.id, update=True)
             self.search_engine.commit()
             session.flush()
+            # journaled by the rendering, see ``increase_version``
+            self.add_change('card_moved', card.db_id, dest.db_id, data['index'])
         else:
             orig.append_card(card_comp())
 
@@ -390,11 +496,12 @@ class Board(events.EventHandlerMixIn):
                 found = col
             else:
                 cols.append(col)
+        # only the moved column is written
+        found().data.rank = rank_for([col().data for col in cols], data['index'])
         cols.insert(data['index'], found)
-        for i, col in enumerate(cols):
-            col().change_index(i)
         self.columns = cols
         session.flush()
+        self.add_change('columns_changed')
 
     @property
     def visibility(self):
@@ -436,21 +543,49 @@ class Board(events.EventHandlerMixIn):
         self.card_filter.exclude_archived(not value)
 
     def archive_cards(self, cards, from_column):
-        """Archive card
+        """Archive cards, in a few statements
 
         In:
             - ``cards`` -- cards to archive, from the same column
         """
-        for card in cards:
-            self.archive_column.append_card(card)
-            values = {'column_id': from_column.id, 'column': from_column.get_title(),
-                      'card': card.get_title()}
-            card.action_log.add_history(security.get_user(), u'card_archive', values)
-            # reindex it
-            card.add_to_index(self.search_engine, self.id, update=True)
-        self.search_engine.commit(True)
+        values = {'column_id': from_column.id, 'column': from_column.get_title()}
+        self._move_cards(cards, from_column, self.archive_column, u'card_archive', values)
+
+    def move_cards(self, cards, from_column, to_column):
+        """Move cards at the end of another column, in a few statements
+
+        In:
+            - ``cards`` -- cards to move, from the same column
+        Return:
+            - the moved cards, no more than ``to_column`` can hold
+        """
+        values = {'from': from_column.get_title(), 'to': to_column.get_title()}
+        cards = self._move_cards(cards, from_column, to_column, u'card_move', values)
+        from_column.remove_cards(cards)
+        return cards
+
+    def _move_cards(self, cards, from_column, to_column, action, values):
+        cards = to_column.append_cards(cards)
+        self.action_log.add_histories(
+            security.get_user(), action, [(card, dict(values, card=card.get_title())) for card in cards]
+        )
+        # reindex them, in case they have been moved to or from the archive column
+        self.index_cards([card.db_id for card in cards])
+        # wait for the index only if it is needed to filter the cards
+        self.search_engine.commit(self.card_filter.is_active)
         self.card_filter.reload_search()
+        self.add_change('column_changed', column_id=from_column.db_id)
+        self.add_change('column_changed', column_id=to_column.db_id)
         self.increase_version()
+        return cards
+
+    def index_cards(self, card_ids):
+        """Update the index documents of the cards ``card_ids``, in one batch. Commit afterwards."""
+        batch = card_rows().filter(DataCard.id.in_(card_ids)).all() if card_ids else []
+        if batch:
+            self.search_engine.add_documents(
+                build_documents(self.card_extensions, self._services, batch), replace=True
+            )
 
     ####### For future board extension
 
@@ -463,6 +598,8 @@ class Board(events.EventHandlerMixIn):
         if weighting_type != WEIGHTING_FREE:
             # reinitialize card weights?
             self.data.reset_card_weights()
+            # cards cache their weight
+            self.refresh()
 
     @property
     def weights(self):
@@ -483,19 +620,11 @@ class Board(events.EventHandlerMixIn):
         return self.emit_event(comp, events.BoardDeleted)
 
     def delete(self):
-        """Deletes the board.
-           Children must be loaded.
-        """
-        assert(self.columns)  # at least, contains the archive
-        for column in self.columns:
-            column().delete(purge=True)
-        self.data.delete_history()
-        self.data.delete_members()
-        if self.data.background_image:
-            self.assets_manager.delete(self.data.background_image)
-        session.refresh(self.data)
-        self.data.delete()
-
+        """Deletes the board, in a few statements per table.
+           Big boards may only be hidden, to be deleted in background (see the ``deletion_queue`` service).
+        """
+        self.deletion_queue.delete_board(self.data, self.card_extensions, self._services, self.search_engine)
+        self._data = None
         return True
 
     def archive(self, comp=None):
@@ -533,8 +662,10 @@ class Board(events.EventHandlerMixIn):
         return self._data
 
     def __getstate__(self):
-        self._data = None
-        return self.__dict__
+        state = self.__dict__.copy()
+        state['_data'] = None
+        state['user_roles'] = {}
+        return state
 
     def allow_comments(self, v):
         """Changes permission to add comments
@@ -584,6 +715,7 @@ class Board(events.EventHandlerMixIn):
         else:
             board_member = None
         self.data.remove_member(board_member.data)
+        self.user_roles = {}
         if comp:
             self.emit_event(comp, events.BoardLeft)
         return True
@@ -606,6 +738,8 @@ class Board(events.EventHandlerMixIn):
         Return:
          - True if user is member of the board
         """
+        if user.username in self.user_roles:
+            return self.user_roles[user.username] is not None
         return self.data.has_member(user.data)
 
     def has_manager(self, user):
@@ -616,6 +750,8 @@ class Board(events.EventHandlerMixIn):
         Return:
          - True if user is manager of the board
         """
+        if user.username in self.user_roles:
+            return bool(self.user_roles[user.username])
         return self.data.has_manager(user.data)
 
     def add_member(self, new_member, role='member'):
@@ -626,6 +762,7 @@ class Board(events.EventHandlerMixIn):
          - ``role`` -- role's member (manager or member)
         """
         self.data.add_member(new_member.data, role)
+        self.user_roles = {}
 
     def remove_pending(self, member):
         # remove from pending list
@@ -639,12 +776,14 @@ class Board(events.EventHandlerMixIn):
         self.managers = [p for p in self.managers if p() != manager]
         # remove manager from data part
         self.data.remove_member(manager.data)
+        self.user_roles = {}
 
     def remove_member(self, member):
         # remove from members list
         self.members = [p for p in self.members if p() != member]
         # remove member from data part
         self.data.remove_member(member.data)
+        self.user_roles = {}
 
     def remove_board_member(self, member):
         """Remove member from board
@@ -666,6 +805,7 @@ class Board(events.EventHandlerMixIn):
                          'manager': self.remove_manager,
                          'member': self.remove_member}
         remove_method[member.role](member)
+        self.user_roles = {}
 
     def change_role(self, member, new_role):
         """Change member's role
@@ -679,6 +819,7 @@ class Board(events.EventHandlerMixIn):
             raise exceptions.KanshaException(_("Can't remove last manager"))
 
         self.data.change_role(member.data, new_role)
+        self.user_roles = {}
         self.update_members()
 
     def remove_invitation(self, email):
@@ -743,7 +884,7 @@ class Board(events.EventHandlerMixIn):
         return results
 
     def get_last_activity(self):
-        return self.action_log.get_last_activity()
+        return self.data.last_activity
 
     def get_available_user_ids(self):
         """Return list of member
@@ -792,20 +933,20 @@ class Board(events.EventHandlerMixIn):
         self.data.title_color = value or u''
 
     @classmethod
-    def get_all_boards(cls, user, app_title, app_banner, theme, card_extensions,
-                       services_service, load_children=False):
-        """Return all boards the user is member of."""
-        return [services_service(cls, data.id, app_title, app_banner, theme, card_extensions,
-                                 data=data, load_children=load_children)
-                for data in DataBoard.get_all_boards(user.data)]
+    def get_user_boards(cls, user, app_title, app_banner, theme, card_extensions,
+                        services_service, load_children=False):
+        """Return the boards the user is member of and the shared boards, in a constant number of queries
 
-    @classmethod
-    def get_shared_boards(cls, app_title, app_banner, theme, card_extensions,
-                          services_service, load_children=False):
-        """Return all boards the user is member of."""
-        return [services_service(cls, data.id, app_title, app_banner, theme, card_extensions,
-                                 data=data, load_children=load_children)
-                for data in DataBoard.get_shared_boards()]
+        Return:
+          - list of Board instances, that know the role of the user until their ``user_roles`` are cleared
+        """
+        boards = []
+        for data, manager in DataBoard.get_user_boards(user.data):
+            board = services_service(cls, data.id, app_title, app_banner, theme, card_extensions,
+                                     data=data, load_children=load_children)
+            board.user_roles[user.username] = manager
+            boards.append(board)
+        return boards
 
     @staticmethod
     def get_templates_for(user):
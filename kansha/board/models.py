@@ -11,14 +11,19 @@
 import uuid
 import urllib
 
-from elixir import using_options
+import sqlalchemy as sa
+from sqlalchemy import func
+from elixir import using_options, using_table_options
 from elixir import ManyToOne, OneToMany, OneToOne
-from elixir import Field, Unicode, Integer, Boolean, UnicodeText
+from sqlalchemy.orm import aliased, lazyload, subqueryload, subqueryload_all
+from elixir import Field, Unicode, Integer, Boolean, UnicodeText, DateTime
 
 from kansha.models import Entity
 from nagare.database import session
-from kansha.user.models import DataUser
+from kansha.user.models import DataUser, DataToken
+from kansha.card.models import DataCard
 from kansha.column.models import DataColumn
+from kansha.services.actionlog.models import DataHistory
 # provisional until we have board extensions
 from kansha.card_addons.label import DataLabel
 # provisional until we have board extensions
@@ -49,11 +54,12 @@ class DataBoard(Entity):
      - ``pending`` -- invitations pending for new members (use token)
      - ``archive`` -- display archive column ? (0 false, 1 true)
      - ``archived`` -- is board archived ?
+     - ``last_activity`` -- date of the last entry of the history, maintained by ``DataHistory``
     """
     using_options(tablename='board')
     title = Field(Unicode(255))
     is_template = Field(Boolean, default=False)
-    columns = OneToMany('DataColumn', order_by="index",
+    columns = OneToMany('DataColumn', order_by=['rank', 'id'],
                         cascade='delete', lazy='subquery')
     # provisional
     labels = OneToMany('DataLabel', order_by='index')
@@ -74,6 +80,7 @@ class DataBoard(Entity):
     title_color = Field(Unicode(255))
     show_archive = Field(Integer, default=0)
     archived = Field(Boolean, default=False)
+    last_activity = Field(DateTime)
 
     # provisional
     weight_config = OneToOne('DataBoardWeightConfig')
@@ -122,14 +129,60 @@ class DataBoard(Entity):
         return (l for l in self.labels if l.title == title).next()
 
     def delete_history(self):
-        for event in self.history:
-            session.delete(event)
+        DataHistory.query.filter_by(board=self).delete(synchronize_session=False)
+
+    def count_cards(self):
+        q = session.query(func.count(DataCard.id)).join(DataCard.column)
+        return q.filter(DataColumn.board == self).scalar()
+
+    def hide(self):
+        """Make the board unreachable by anyone, until it is actually deleted"""
+        self.delete_members()
+        session.expire(self, ['board_members'])
+        self.visibility = BOARD_PRIVATE
+        self.archived = True
         session.flush()
 
-    def increase_version(self):
-        self.version += 1
+    def purge(self):
+        """Delete the board and its data, with a few statements per table.
+
+        Its cards must be deleted first (see ``kansha.card.deletion``).
+
+        Return:
+          - the files of the assets manager to delete, once the deletion is committed
+        """
+        session.flush()
+        files = [self.background_image] if self.background_image else []
+        self.delete_history()
+        self.delete_members()
+        DataBoardChange.query.filter_by(board=self).delete(synchronize_session=False)
+        DataLabel.delete_labels(self)
+        DataBoardWeightConfig.query.filter_by(board=self).delete(synchronize_session=False)
+        DataToken.query.filter_by(board=self).delete(synchronize_session=False)
+        DataColumn.query.filter_by(board=self).delete(synchronize_session=False)
+        DataBoard.query.filter_by(id=self.id).delete(synchronize_session=False)
+        session.expunge(self)
+        return files
+
+    def increase_version(self, changes=()):
+        """Increase the version by one per change and journal the changes
+
+        In:
+          - ``changes`` -- list of dicts with the ``DataBoardChange`` fields
+        Return:
+          - the versions of the journaled changes
+        """
+        count = len(changes) or 1
+        # done in SQL to not lose concurrent updates
+        self.version = DataBoard.version + count
+        session.flush()
         if self.version > 2147483600:
-            self.version = 1
+            # the journal of the other sessions is then incomplete: they reload the board
+            self.version = count
+            session.flush()
+        versions = range(self.version - len(changes) + 1, self.version + 1)
+        DataBoardChange.journal(self, zip(versions, changes))
+        return versions
 
     @property
     def url(self):
@@ -147,20 +200,28 @@ class DataBoard(Entity):
         self.background_image = image or u''
 
     @classmethod
-    def get_all_boards(cls, user):
-        """Return all boards the user is member of."""
-        query = session.query(cls).join(DataMembership)
-        query = query.filter(cls.is_template == False, DataMembership.user == user)
-        return query.order_by(cls.title)
+    def get_user_boards(cls, user):
+        """Return the boards the user is member of and the shared boards, with the role of the user, in one query
 
-    @classmethod
-    def get_shared_boards(cls):
-        query = session.query(cls).filter(cls.visibility == BOARD_SHARED)
-        return query.order_by(cls.title)
+        Their members and their invitations are loaded with a few more queries, whatever the number of boards.
+
+        In:
+         - ``user`` -- DataUser instance
+        Return:
+         - list of (DataBoard instance, None if the user is not a member else True if he is a manager),
+           ordered by title
+        """
+        membership = aliased(DataMembership)
+        q = session.query(cls, membership.manager)
+        q = q.outerjoin(membership, sa.and_(membership.board_id == cls.id, membership.user == user))
+        q = q.filter(cls.is_template == False)
+        q = q.filter(sa.or_(membership.id != None, cls.visibility == BOARD_SHARED))
+        q = q.options(lazyload('columns'), subqueryload_all('board_members.user'), subqueryload('pending'))
+        return q.order_by(cls.title).all()
 
     @classmethod
     def get_templates_for(cls, user, public_value):
-        q = cls.query
+        q = cls.query.options(lazyload('columns'), subqueryload_all('board_members.user'))
         q = q.filter(cls.archived == False)
         q = q.filter(cls.is_template == True)
         q = q.order_by(cls.title)
@@ -261,6 +322,59 @@ DEFAULT_LABELS = (
 )
 
 
+class DataBoardChange(Entity):
+    """Journal of the changes of a board, for the sessions to catch up
+
+     - ``version`` -- version of the board after the change
+     - ``op`` -- kind of change
+     - ``card_id``, ``column_id``, ``index`` -- what changed and where, depending on the kind
+    """
+    using_options(tablename='board_change')
+    board = ManyToOne('DataBoard', ondelete='cascade', required=True)
+    version = Field(Integer, nullable=False)
+    op = Field(Unicode(32), nullable=False)
+    card_id = Field(Integer)
+    column_id = Field(Integer)
+    index = Field(Integer)
+    using_table_options(sa.Index('board_change_ix', 'board_id', 'version'))
+
+    # changes kept per board
+    JOURNAL_LENGTH = 200
+
+    @classmethod
+    def journal(cls, board, changes):
+        """Append changes to the journal of the board, dropping the oldest ones
+
+        In:
+          - ``changes`` -- list of (version, dict of the other fields)
+        """
+        if not changes:
+            return
+        for version, change in changes:
+            cls(board=board, version=version, **change)
+        q = cls.query.filter(cls.board == board)
+        q = q.filter(cls.version <= changes[-1][0] - cls.JOURNAL_LENGTH)
+        q.delete(synchronize_session=False)
+        session.flush()
+
+    @classmethod
+    def get_since(cls, board, version, until):
+        """Return the changes from ``version`` (excluded) to ``until`` (included)
+        or None if some of them are not in the journal anymore
+        """
+        if until == version:
+            return []
+        if until < version:
+            # the version wrapped around
+            return None
+        q = cls.query.filter(cls.board == board)
+        q = q.filter(cls.version > version).filter(cls.version <= until)
+        changes = q.order_by(cls.version).all()
+        if len(changes) != until - version:
+            return None
+        return changes
+
+
 def create_template_empty():
     board = DataBoard(title=u'Empty board', is_template=True, visibility=1)
     board.weight_config = DataBoardWeightConfig()
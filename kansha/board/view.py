@@ -103,6 +103,11 @@ def render_Board(self, h, comp, *args):
             h << comp.render(h, 'switch')
         with h.div(class_='bbody'):
             h << comp.render(h.AsyncRenderer(), self.model)
+    if self.push.activated:
+        h << h.script('YAHOO.kansha.app.listenBoardChanges(%s, %d)' % (
+            ajax.py2js(h.request.application_url + '/push/board/' + self.data.uri),
+            self.version
+        ))
     return h.root
 
 
@@ -796,4 +801,6 @@ def render_userboards(self, h, comp, *args):
     h << h.script('YAHOO.kansha.app.hideOverlay();'
                   'function reload_boards() { %s; }' % h.AsyncRenderer().a.action(ajax.Update(action=self.load_user_boards, render=0)).get('onclick'))
 
+    # the roles were loaded with the boards for this rendering
+    self.forget_user_roles()
     return h.root
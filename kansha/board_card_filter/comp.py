@@ -10,6 +10,8 @@
 
 # TODO: make it a board extension
 
+from kansha.board.models import DataBoard
+
 
 class BoardCardFilter(object):
 
@@ -33,13 +35,20 @@ class BoardCardFilter(object):
             # do not query archived cards if archive column is hidden
             if self._exclude_archived:
                 condition &= (self.card_schema.archived == False)
-            self.card_matches = set(doc._id for (_, doc) in self.search_engine.search(condition, 1000))
+            # the cards not matched are hidden: all the matching cards are needed, not the most relevant ones
+            size = max(DataBoard.get(self.board_id).count_cards(), 1)
+            self.card_matches = set(doc._id for (_, doc) in self.search_engine.search(condition, size))
             # make the difference between empty search and no results
             if not self.card_matches:
                 self.card_matches.add(None)
         else:
             self.card_matches = set()
 
+    @property
+    def is_active(self):
+        """Is the user filtering the cards with a search?"""
+        return bool(self.last_search)
+
     def reset(self):
         self.last_search = ''
         self.card_matches = set()
@@ -9,12 +9,14 @@
 # --
 
 import dateutil.parser
+from datetime import date
 
-from nagare import component, security
+from nagare import component, i18n, security
 
 from kansha import title
 from kansha import events
 from kansha.services.search import schema
+from kansha.cardextension import CardExtension
 from kansha.services.actionlog.messages import render_event
 
 from .models import DataCard
@@ -33,6 +35,31 @@ class NewCard(object):
         self.needs_refresh = not self.needs_refresh
 
 
+class ExtensionsPreloader(object):
+
+    """Bulk loads the extensions data of many cards, when the first of them builds an extension
+
+    The cards whose summary is served from the render cache never build their
+    extensions: nothing is loaded when all of them are.
+    """
+
+    def __init__(self, card_extensions):
+        self.card_extensions = card_extensions
+        self.cards = []
+        self.preloaded = None
+
+    def add(self, card):
+        """Add ``card`` (DataCard instance) to the cards to load"""
+        self.cards.append(card)
+
+    def pop(self, card_id):
+        """Return the extensions data of the card ``card_id``, as a dict {extension class: value}"""
+        if self.preloaded is None:
+            self.preloaded = self.card_extensions.preload(self.cards)
+            self.cards = None
+        return self.preloaded.pop(card_id, {})
+
+
 class Card(events.EventHandlerMixIn):
 
     """Card component
@@ -43,12 +70,14 @@ class Card(events.EventHandlerMixIn):
                            schema.Boolean('archived'))
 
     def __init__(self, id_, card_extensions, action_log, card_filter,
-                 services_service, data=None):
+                 services_service, render_cache_service, data=None, preloader=None):
         """Initialization
 
         In:
             - ``id_`` -- the id of the card in the database
             - ``column`` -- father
+            - ``render_cache_service`` -- cache of the card renderings
+            - ``preloader`` -- ``ExtensionsPreloader`` shared with the other cards of the board, if any
         """
         self.db_id = id_
         self.id = 'card_' + str(self.db_id)
@@ -56,9 +85,14 @@ class Card(events.EventHandlerMixIn):
         self.action_log = action_log.for_card(self)
         self.card_filter = card_filter
         self._services = services_service
+        self.render_cache = render_cache_service
         self._data = data
-        self.extensions = ()
+        # the card editor is open
+        self.editing = False
         self.refresh()
+        if preloader is not None:
+            preloader.add(self.data)
+        self.preloader = preloader
 
     def add_to_index(self, search_engine, board_id, update=False):
         data = {'docid': self.id,
@@ -88,16 +122,48 @@ class Card(events.EventHandlerMixIn):
         for (name, my_extension), (name2, other_extension) in extensions:
             assert(name == name2)  # should never raise
             my_extension().update(other_extension())
+        self.data.increase_version()
 
     def refresh(self):
         """Refresh the sub components
         """
+        # version of the data the sub components are built from
+        self.version = self.data.version
         self.title = component.Component(
             title.EditableTitle(self.get_title)).on_answer(self.set_title)
-        self.extensions = [
-            (name, component.Component(extension))
-            for name, extension in self.card_extensions.instantiate_items(self, self.action_log, self._services)
-        ]
+        # {name: extension component}, built on first use
+        self._extensions = {}
+        # extensions data bulk loaded with the other cards, see ``extension``
+        self.preloader = None
+        self.preloaded = {}
+
+    def extension(self, name):
+        """Return the component of the extension ``name``, built on first use"""
+        extension = self._extensions.get(name)
+        if extension is None:
+            if self.preloader is not None:
+                self.preloaded = self.preloader.pop(self.db_id)
+                self.preloader = None
+            extension = self._extensions[name] = component.Component(
+                self.card_extensions.instantiate_item(name, self, self.action_log, self._services))
+            # preloaded data is only valid for the first instantiation
+            self.preloaded.pop(self.card_extensions[name], None)
+        return extension
+
+    def release_extensions(self):
+        """Forget the extension components, unless they are being edited"""
+        if not self.editing:
+            self._extensions = {}
+
+    @property
+    def extensions(self):
+        """Return the components of all the extensions, as (name, component) pairs"""
+        return [(name, self.extension(name)) for name in self.card_extensions.keys()]
+
+    def _overriding_extensions(self, method):
+        """Return the components of the extensions which override ``method`` of CardExtension"""
+        return [self.extension(name) for name, klass in self.card_extensions.items()
+                if getattr(klass, method).im_func is not getattr(CardExtension, method).im_func]
 
     @property
     def data(self):
@@ -109,23 +175,27 @@ class Card(events.EventHandlerMixIn):
         return self._data
 
     def __getstate__(self):
-        self._data = None
-        return self.__dict__
+        # the card stays in use: only its pickled state is trimmed
+        state = self.__dict__.copy()
+        state['_data'] = None
+        state['preloader'] = None
+        state['preloaded'] = {}
+        # outside of the editor, the views of the extensions are stateless: rebuild them when needed
+        if not self.editing:
+            state['_extensions'] = {}
+        return state
 
     @property
     def archived(self):
         return self.data.archived
 
-    @property
-    def index(self):
-        return self.data.index
-
     def can_edit(self, user):
         """
         Has the user the permission to edit this card?
         """
-        # if self.extensions is empty, ``all`` returns True, which is what we expect.
-        return all(extension().has_permission_on_card(user, 'edit') for __, extension in self.extensions)
+        # if no extension restricts the permissions, ``all`` returns True, which is what we expect.
+        return all(extension().has_permission_on_card(user, 'edit')
+                   for extension in self._overriding_extensions('has_permission_on_card'))
 
     def set_title(self, title):
         """Set title
@@ -136,6 +206,25 @@ class Card(events.EventHandlerMixIn):
         values = {'from': self.data.title, 'to': title}
         self.action_log.add_history(security.get_user(), u'card_title', values)
         self.data.title = title
+        self.data.increase_version()
+
+    def render_cache_key(self):
+        """Key of the cached rendering of the card on the board
+
+        The writes of the extensions, and the profile changes of the members, increase
+        the card version: the key is computed without building the extensions.
+
+        Return:
+            - a tuple
+        """
+        can_edit = security.has_permissions('edit', self)
+        # the due date badge depends on the current date
+        return (self.db_id, self.data.version, i18n.get_locale().language, can_edit, date.today())
+
+    @property
+    def is_up_to_date(self):
+        """Are the sub components built from the current version of the card?"""
+        return self.version == self.data.version
 
     def get_title(self):
         """Get title
@@ -160,6 +249,9 @@ class Card(events.EventHandlerMixIn):
             extension().new_card_position(start)
 
     def emit_event(self, comp, kind, data=None):
-        if kind == events.PopinClosed:
+        if kind == events.CardClicked:
+            self.editing = True
+        elif kind == events.PopinClosed:
+            self.editing = False
             kind = events.CardEditorClosed
         return super(Card, self).emit_event(comp, kind, data)
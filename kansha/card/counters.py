@@ -0,0 +1,55 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+"""
+Set-based computation of the card counters from the actual data.
+"""
+
+import sqlalchemy as sa
+
+from nagare import database
+
+from kansha.card_addons.vote.models import DataVote
+from kansha.card_addons.comment.models import DataComment
+from kansha.card_addons.gallery.models import DataAsset
+from kansha.card_addons.checklist.models import DataChecklist, DataChecklistItem
+
+from .models import DataCard, DataCardCounters
+
+
+COLUMNS = ('card_id', 'votes', 'comments', 'assets', 'checklist_items', 'checklist_items_done')
+
+
+def _count(table, *criteria):
+    q = sa.select([sa.func.count()]).select_from(table)
+    return q.where(sa.and_(*criteria)).as_scalar()
+
+
+def count_select(card_ids=None):
+    '''Select of the counters, in the order of ``COLUMNS``, of the cards ``card_ids`` or of all the cards'''
+    card_id = DataCard.table.c.id
+    items = DataChecklistItem.table.join(DataChecklist.table)
+    item_of_card = DataChecklist.table.c.card_id == card_id
+    counts = sa.select([
+        card_id,
+        _count(DataVote.table, DataVote.table.c.card_id == card_id),
+        _count(DataComment.table, DataComment.table.c.card_id == card_id),
+        _count(DataAsset.table, DataAsset.table.c.card_id == card_id),
+        _count(items, item_of_card),
+        _count(items, item_of_card, DataChecklistItem.table.c.done == sa.true()),
+    ])
+    if card_ids is not None:
+        counts = counts.where(card_id.in_(card_ids))
+    return counts
+
+
+def insert_counters(card_ids=None):
+    '''Insert the counters of the cards ``card_ids`` or of all the cards, in one statement'''
+    database.session.execute(DataCardCounters.table.insert().from_select(COLUMNS, count_select(card_ids)))
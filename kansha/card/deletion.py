@@ -0,0 +1,57 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+"""
+Set-based deletion of the cards and of the data of their extensions.
+"""
+
+from nagare import database
+
+from kansha.cardextension import CardExtension
+from kansha.services.actionlog import DummyActionLog
+from kansha.services.actionlog.models import DataHistory
+
+from .comp import Card
+from .models import DataCard
+
+
+def delete_cards(card_extensions, services_service, card_ids):
+    """Delete cards, their history and the data of their extensions, with a few statements per table
+
+    Extensions that don't implement ``delete_cards`` are cleaned up from the card components.
+
+    In:
+      - ``card_ids`` -- list of card ids
+    Return:
+      - the files of the assets manager to delete, once the deletion is committed
+    """
+    if not card_ids:
+        return []
+    database.session.flush()
+    files = []
+    slow_extensions = []
+    for name, extension in card_extensions.iteritems():
+        deleted = extension.delete_cards(card_ids)
+        if deleted is not None:
+            files.extend(deleted)
+        elif extension.delete.im_func is not CardExtension.delete.im_func:
+            slow_extensions.append(name)
+
+    if slow_extensions:
+        action_log = DummyActionLog()
+        for data in DataCard.query.filter(DataCard.id.in_(card_ids)):
+            card = services_service(Card, data.id, card_extensions, action_log, lambda x: True, data=data)
+            for name in slow_extensions:
+                card.extension(name)().delete()
+        database.session.flush()
+
+    DataHistory.delete_cards(card_ids)
+    DataCard.delete_cards(card_ids)
+    return files
@@ -0,0 +1,63 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2015 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+"""
+Bulk building of the search index documents of the cards.
+"""
+
+from nagare import database
+
+from kansha.column.models import DataColumn
+from kansha.services.actionlog import DummyActionLog
+
+from .comp import Card
+from .models import DataCard
+
+
+def card_rows():
+    """Query of the (card id, title, board id, archived) rows the documents are built from"""
+    q = database.session.query(DataCard.id, DataCard.title, DataColumn.board_id, DataColumn.archive)
+    return q.join(DataCard.column).order_by(DataCard.id)
+
+
+def build_documents(card_extensions, services_service, batch):
+    """Build the documents of a batch of cards, with one query per indexed extension
+
+    Extensions that don't implement ``get_indexables`` are indexed from the card components.
+
+    In:
+      - ``batch`` -- list of ``card_rows``
+    Return:
+      - the documents, in the order of ``batch``
+    """
+    card_ids = [card_id for card_id, __, __, __ in batch]
+    documents = dict(
+        (card_id, Card.schema(docid='card_' + str(card_id), title=title, board_id=board_id, archived=archived))
+        for card_id, title, board_id, archived in batch
+    )
+    slow_extensions = []
+    for name, extension in card_extensions.iteritems():
+        field = extension.get_schema_def()
+        if field is None:
+            continue
+        values = extension.get_indexables(card_ids)
+        if values is None:
+            slow_extensions.append(name)
+            continue
+        for card_id, value in values.iteritems():
+            setattr(documents[card_id], field.name, value)
+
+    if slow_extensions:
+        action_log = DummyActionLog()
+        for data in DataCard.query.filter(DataCard.id.in_(card_ids)):
+            card = services_service(Card, data.id, card_extensions, action_log, lambda x: True, data=data)
+            for name in slow_extensions:
+                card.extension(name)().update_document(documents[data.id])
+    return [documents[card_id] for card_id in card_ids]
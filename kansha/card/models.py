@@ -8,8 +8,10 @@
 # this distribution.
 #--
 
-from elixir import using_options
-from elixir import ManyToMany, ManyToOne
+import sqlalchemy as sa
+from sqlalchemy.orm.util import identity_key
+from elixir import using_options, using_table_options
+from elixir import ManyToMany, ManyToOne, OneToOne
 from elixir import Field, Integer, DateTime, UnicodeText
 from nagare.database import session
 import datetime
@@ -22,26 +24,103 @@ class DataCard(Entity):
 
     using_options(tablename='card')
     title = Field(UnicodeText)
-    index = Field(Integer)
+    # position in the column, see ``kansha.models.rank_for``
+    rank = Field(sa.BigInteger)
     creation_date = Field(DateTime, default=datetime.datetime.utcnow)
+    # bumped on every change of the card or of its extensions data
+    version = Field(Integer, default=0, server_default='0')
     column = ManyToOne('DataColumn')
+    counters = OneToOne('DataCardCounters', inverse='card', lazy='joined',
+                        cascade='all, delete-orphan')
 
     def update(self, other):
         self.title = other.title
-        self.index = other.index
+        self.rank = other.rank
         session.flush()
 
     @property
     def archived(self):
         return self.column.archive
 
+    def increase_version(self):
+        '''Mark the card as changed, so that its cached renderings are not used anymore'''
+        # done in SQL to not lose concurrent updates
+        self.version = DataCard.version + 1
+        session.flush()
+
+    @classmethod
+    def delete_cards(cls, card_ids):
+        '''Delete the cards and their counters, in a few statements.
+
+        The data of their extensions and their history must be deleted first.
+
+        In:
+          - ``card_ids`` -- list of card ids
+        '''
+        if not card_ids:
+            return
+        session.flush()
+        DataCardCounters.query.filter(DataCardCounters.card_id.in_(card_ids)).delete(synchronize_session=False)
+        cls.query.filter(cls.id.in_(card_ids)).delete(synchronize_session=False)
+        # forget the deleted cards loaded in the session
+        for card_id in card_ids:
+            card = session.identity_map.get(identity_key(cls, card_id))
+            if card is not None:
+                session.expunge(card)
+
+    @classmethod
+    def increase_versions(cls, card_ids):
+        '''Bulk version of ``increase_version``'''
+        if not card_ids:
+            return
+        q = cls.query.filter(cls.id.in_(card_ids))
+        q.update({cls.version: cls.version + 1}, synchronize_session=False)
+
+    def get_counter(self, name):
+        '''Return the value of the counter ``name`` or None if the card has no counters yet'''
+        return getattr(self.counters, name) if self.counters else None
+
+    def increment_counters(self, **deltas):
+        '''Add the deltas to the card counters, in the current transaction.
+
+        Usage:
+            card.increment_counters(votes=1)
+            card.increment_counters(checklist_items=-3, checklist_items_done=-1)
+        '''
+        # cards created before counters existed have none: readers count
+        # by themselves until ``rebuild-counters`` is run
+        if self.counters is not None:
+            for name, delta in deltas.iteritems():
+                if not delta:
+                    continue
+                # done in SQL to not lose concurrent updates
+                setattr(self.counters, name, getattr(DataCardCounters, name) + delta)
+        self.increase_version()
+
+
+class DataCardCounters(Entity):
+    '''Denormalized per card counters, used to render card badges.
+
+    They are maintained by the card extensions when they write and can be
+    rebuilt from scratch with the ``rebuild-counters`` command.
+    '''
+
+    using_options(tablename='card_counters')
+    card = ManyToOne('DataCard', ondelete='cascade', required=True)
+    votes = Field(Integer, default=0, server_default='0', nullable=False)
+    comments = Field(Integer, default=0, server_default='0', nullable=False)
+    assets = Field(Integer, default=0, server_default='0', nullable=False)
+    checklist_items = Field(Integer, default=0, server_default='0', nullable=False)
+    checklist_items_done = Field(Integer, default=0, server_default='0', nullable=False)
+    using_table_options(sa.UniqueConstraint('card_id', name='card_counters_ix'))
+
 
 class DummyDataCard(object):
 
     def __init__(self, title='dummy card', creation_date=datetime.datetime.utcnow()):
         self.title = title
         self.creation_date = creation_date
-        self.index = 0
+        self.rank = 0
 
     def update(self, other):
         print 'update!'
@@ -49,3 +128,12 @@ class DummyDataCard(object):
     @property
     def archived(self):
         return False
+
+    def increase_version(self):
+        pass
+
+    def get_counter(self, name):
+        return None
+
+    def increment_counters(self, **deltas):
+        pass
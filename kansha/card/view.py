@@ -8,18 +8,56 @@
 # this distribution.
 # --
 
+import copy
+from functools import partial
+
 from nagare.i18n import _
 from nagare import ajax, component, presentation, security, var
 
 from kansha import events
+from kansha.toolbox import popin
 
 from .comp import Card, NewCard
 
 
+def slot_id(card_id, model=0):
+    """Id of the element wrapping the card ``card_id`` rendered with ``model``"""
+    return 'card_%s_%s' % (card_id, model or 'slot')
+
+
+def render_card_slot(h, card_comp, model=0):
+    """Render the card in an element of constant id, target of the actions addressing the card by id"""
+    card = card_comp()
+    if isinstance(card, popin.Popin):
+        card = card.get_business_object()
+    return h.div(card_comp.render(h.AsyncRenderer(), model), id=slot_id(card.db_id, model))
+
+
+def render_card_by_id(column_comp, card_id, model, h):
+    """Render the slot of the card ``card_id``, after one of its actions"""
+    card_comp = column_comp().find_card(column_comp, card_id)
+    if card_comp is None:
+        # moved by another session: the next refresh of the board shows it
+        return h.div(id=slot_id(card_id, model))
+    return render_card_slot(h, card_comp, model)
+
+
+def card_update(h, column_comp, card, model=0, action=lambda: None):
+    """Action rendering the card again, addressing it by id
+
+    The session only keeps the components of the cards being edited: the
+    other ones are rebuilt on demand and must not be bound to the actions.
+    """
+    update = ajax.Update(action=action,
+                         render=partial(render_card_by_id, column_comp, card.db_id, model),
+                         component_to_update=slot_id(card.db_id, model))
+    return h.a.action(update).get('onclick')
+
+
 @presentation.render_for(Card, 'no_dnd')
 def render_card_no_dnd(self, h, comp, *args):
     """No DnD wrapping of the card"""
-    return comp.render(h.AsyncRenderer())
+    return render_card_slot(h, comp)
 
 
 @presentation.render_for(Card, 'new')
@@ -38,34 +76,73 @@ def render_card_new(self, h, comp, *args):
 def render(self, h, comp, *args):
     """Render the card"""
 
-    extensions = self.extensions
-
     card_id = h.generate_id()
-
-    onclick = h.a.action(self.emit_event, comp, events.CardClicked, comp).get('onclick').replace('return', "")
+    column = self.emit_event(comp, events.ColumnNeeded)
+    if column is None:
+        # shown under its editor
+        onclick = h.a.action(self.emit_event, comp, events.CardClicked, comp).get('onclick')
+        reload_card = h.a.action(ajax.Update()).get('onclick')
+    else:
+        onclick = card_update(h, column, self, action=partial(column().open_card, column, self.db_id))
+        reload_card = card_update(h, column, self)
+    onclick = onclick.replace('return', "")
     with h.div(id=self.id, class_='card ' + self.card_filter(self)):
         with h.div(id=card_id, onclick=onclick):
-            with h.div(class_='headers'):
-                h << [extension.render(h, 'header') for _name, extension in extensions]
-            with h.div(class_='covers'):
-                with h.div(class_='title'):
-                    h << self.title.render(h, 'readonly')
-                h << [extension.render(h, 'cover') for _name, extension in extensions]
-            with h.div(class_='badges'):
-                h << [extension.render(h, 'badge') for _name, extension in extensions]
+            h << render_card_summary(self, h)
     if self.card_filter(self):
         h << component.Component(self.card_filter)
 
     h << h.script(
         "YAHOO.kansha.reload_cards[%s]=function() {%s}""" % (
             ajax.py2js(self.id),
-            h.a.action(ajax.Update()).get('onclick')
+            reload_card
         )
     )
 
     return h.root
 
 
+def render_card_summary(self, h):
+    """Render the headers, covers and badges of the card
+
+    They are served from the render cache when the card didn't change.
+    As the cached trees are shared by all the sessions, these views must not
+    register any action.
+    """
+    key = self.render_cache_key()
+    sections = self.render_cache.get(key)
+    if sections is not None:
+        # inserted in the page, a tree is moved: the cached ones are copied, not parsed again
+        return [copy.deepcopy(section) for section in sections]
+
+    extensions = self.extensions
+    sections = []
+
+    r = h.new()
+    with r.div(class_='headers'):
+        r << [extension.render(r, 'header') for _name, extension in extensions]
+    sections.append(r.root)
+
+    r = h.new()
+    with r.div(class_='covers'):
+        with r.div(class_='title'):
+            r << self.title.render(r, 'readonly')
+        r << [extension.render(r, 'cover') for _name, extension in extensions]
+    sections.append(r.root)
+
+    r = h.new()
+    with r.div(class_='badges'):
+        r << [extension.render(r, 'badge') for _name, extension in extensions]
+    sections.append(r.root)
+
+    # don't share a rendering of outdated sub components
+    if self.is_up_to_date:
+        self.render_cache.set(key, tuple(copy.deepcopy(section) for section in sections))
+    # no action refers to them: don't keep the extension components of every card of the board
+    self.release_extensions()
+    return sections
+
+
 @presentation.render_for(Card, model='readonly')
 def render(self, h, comp, *args):
     """Render the card read-only"""
@@ -119,20 +196,28 @@ def render_card_delete(self, h, comp, model):
 @presentation.render_for(Card, 'calendar')
 def render_in_calendar(self, h, comp, *args):
     # TODO should be in due_date extension
-    due_date = dict(self.extensions)['due_date']().due_date
+    due_date = self.extension('due_date')().due_date
     if due_date:
         due_date = ajax.py2js(due_date, h)
         parent_title = self.emit_event(comp, events.ParentTitleNeeded) or ''
+        column = self.emit_event(comp, events.ColumnNeeded)
         card = u'{title:%s, editable:true, allDay: true, start: %s, _id: %s}' % (
             ajax.py2js(u'{} ({})'.format(self.data.title, parent_title), h).decode('utf-8'),
             due_date, ajax.py2js(self.id, h))
-        clicked_cb = h.a.action(
-            lambda: self.emit_event(comp, events.CardClicked, comp)
-        ).get('onclick')
+        if column is None:
+            # shown under its editor
+            clicked_cb = h.a.action(
+                lambda: self.emit_event(comp, events.CardClicked, comp)
+            ).get('onclick')
+            card_dropped = self.card_dropped
+        else:
+            clicked_cb = card_update(h, column, self, 'calendar',
+                                     action=partial(column().open_card, column, self.db_id))
+            card_dropped = partial(column().card_dropped, column, self.db_id)
 
         dropped_cb = h.a.action(
             ajax.Update(
-                action=self.card_dropped,
+                action=card_dropped,
                 render=lambda render: '',
                 with_request=True
             )
@@ -155,7 +240,7 @@ def render_card_dnd(self, h, comp, *args):
     if self.data is not None:
         id_ = h.generate_id('dnd')
         with h.div(id=id_, class_='card-dnd-wrapper'):
-            h << comp.render(h.AsyncRenderer())
+            h << render_card_slot(h, comp)
             h << h.script('YAHOO.kansha.dnd.initCard(%s)' % ajax.py2js(id_))
     return h.root
 
@@ -95,8 +95,9 @@ class ChecklistItem(object):
 
     def set_done(self):
         '''toggle done status'''
-        self.data.done = self.done = not self.done
+        self.done = not self.done
         item = self.data
+        item.set_done(self.done)
         data = {'item': self.get_title(),
                 'list': item.checklist.title,
                 'card': item.checklist.card.title}
@@ -221,6 +222,10 @@ class Checklists(CardExtension):
     def update_document(self, document):
         document.checklists = u'\n'.join(cl.to_indexable() for cl in self.data)
 
+    @classmethod
+    def get_indexables(cls, card_ids):
+        return DataChecklist.get_indexables_by_cards(card_ids)
+
     @property
     def data(self):
         return DataChecklist.get_by_card(self.card.data)
@@ -234,11 +239,17 @@ class Checklists(CardExtension):
 
     @property
     def total_items(self):
-        return DataChecklist.total_items(self.card.data)
+        total = self.card.data.get_counter('checklist_items')
+        if total is None:
+            return DataChecklist.total_items(self.card.data)
+        return total
 
     @property
     def total_items_done(self):
-        return DataChecklist.total_items_done(self.card.data)
+        done = self.card.data.get_counter('checklist_items_done')
+        if done is None:
+            return DataChecklist.total_items_done(self.card.data)
+        return done
 
     def delete_checklist(self, index):
         cl = self.checklists.pop(index)()
@@ -258,6 +269,16 @@ class Checklists(CardExtension):
         for checklist in self.ck_cache.values():
             checklist.delete()
 
+    @classmethod
+    def delete_cards(cls, card_ids):
+        DataChecklist.delete_cards(card_ids)
+        return ()
+
+    @classmethod
+    def clone_cards(cls, card_ids, board, services_service):
+        DataChecklist.clone_cards(card_ids)
+        return True
+
     def add_checklist(self):
         clist = DataChecklist(card=self.card.data)
         database.session.flush()
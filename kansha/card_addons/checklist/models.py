@@ -15,7 +15,7 @@ from elixir import ManyToOne
 from elixir import OneToMany
 from elixir import Unicode
 from elixir import using_options
-from sqlalchemy import func
+from sqlalchemy import func, select
 from sqlalchemy.ext.orderinglist import ordering_list
 
 from nagare import database
@@ -40,6 +40,64 @@ class DataChecklist(Entity):
         q = q.order_by(cls.index)
         return q.all()
 
+    @classmethod
+    def get_indexables_by_cards(cls, card_ids):
+        '''Return a dict {card id: indexable text of its checklists}, in one query'''
+        q = database.session.query(cls.card_id, cls.id, cls.title, DataChecklistItem.title)
+        q = q.outerjoin(cls.items).filter(cls.card_id.in_(card_ids))
+        q = q.order_by(cls.card_id, cls.index, cls.id, DataChecklistItem.index)
+        checklists = {}
+        current = None
+        for card_id, checklist_id, title, item_title in q:
+            if (card_id, checklist_id) != current:
+                current = (card_id, checklist_id)
+                checklists.setdefault(card_id, []).append([title] if title else [])
+            if item_title:
+                checklists[card_id][-1].append(item_title)
+        return dict(
+            (card_id, u'\n'.join(u'\n'.join(titles) for titles in card_checklists))
+            for card_id, card_checklists in checklists.iteritems()
+        )
+
+    @classmethod
+    def delete_cards(cls, card_ids):
+        '''Delete the checklists of the cards and their items, with one statement per table'''
+        checklists = select([cls.id]).where(cls.card_id.in_(card_ids))
+        q = DataChecklistItem.query.filter(DataChecklistItem.checklist_id.in_(checklists))
+        q.delete(synchronize_session=False)
+        cls.query.filter(cls.card_id.in_(card_ids)).delete(synchronize_session=False)
+
+    @classmethod
+    def clone_cards(cls, card_ids):
+        '''Copy the checklists of the cards and their items, undone, with two queries and two ``executemany``
+
+        In:
+          - ``card_ids`` -- dict {id of a copied card: id of its copy}
+        '''
+        q = database.session.query(cls.id, cls.card_id, cls.title, cls.index)
+        checklists = q.filter(cls.card_id.in_(card_ids.keys())).order_by(cls.card_id, cls.index, cls.id).all()
+        if not checklists:
+            return
+        database.session.execute(
+            cls.table.insert(),
+            [{'card_id': card_ids[card_id], 'title': title, 'index': index} for __, card_id, title, index in checklists]
+        )
+        # inserted in order: the copies of the checklists of a card are in the same order
+        copies = {}
+        q = database.session.query(cls.id, cls.card_id).filter(cls.card_id.in_(card_ids.values()))
+        for checklist_id, card_id in q.order_by(cls.index, cls.id):
+            copies.setdefault(card_id, []).append(checklist_id)
+        checklist_ids = {}
+        for checklist_id, card_id, __, __ in checklists:
+            checklist_ids[checklist_id] = copies[card_ids[card_id]].pop(0)
+
+        q = database.session.query(DataChecklistItem.checklist_id, DataChecklistItem.title, DataChecklistItem.index)
+        q = q.filter(DataChecklistItem.checklist_id.in_(checklist_ids.keys()))
+        rows = [{'checklist_id': checklist_ids[checklist_id], 'title': title, 'index': index, 'done': False}
+                for checklist_id, title, index in q]
+        if rows:
+            database.session.execute(DataChecklistItem.table.insert(), rows)
+
     def update(self, other):
         self.title = other.title
         self.index = other.index
@@ -48,6 +106,7 @@ class DataChecklist(Entity):
                                                 index=item.index,
                                                 done=False))
         database.session.flush()
+        self.card.increment_counters(checklist_items=len(other.items))
 
     def __unicode__(self):
         titles = [item.title for item in self.items if item.title]
@@ -64,6 +123,7 @@ class DataChecklist(Entity):
 
     def add_item(self, item):
         self.items.append(item)
+        self.card.increment_counters(checklist_items=1)
         return item
 
     def insert_item(self, index, item):
@@ -75,10 +135,16 @@ class DataChecklist(Entity):
     def delete_item(self, item):
         self.remove_item(item)
         item.delete()
+        self.card.increment_counters(checklist_items=-1,
+                                     checklist_items_done=-1 if item.done else 0)
 
     def purge(self):
+        done = 0
         for item in self.items:
+            done += 1 if item.done else 0
             item.delete()
+        self.card.increment_counters(checklist_items=-len(self.items),
+                                     checklist_items_done=-done)
 
     @staticmethod
     def total_items(card):
@@ -115,3 +181,8 @@ class DataChecklistItem(Entity):
         q = cls.query.join(DataChecklist).filter(DataChecklist.card == card).filter(
             DataChecklistItem.done == True)
         return q.with_entities(func.count()).scalar()
+
+    def set_done(self, done):
+        if bool(done) != bool(self.done):
+            self.checklist.card.increment_counters(checklist_items_done=1 if done else -1)
+        self.done = done
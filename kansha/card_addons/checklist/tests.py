@@ -116,4 +116,24 @@ test list 2
 test item 3
 test item 4''')
 
+    def test_get_indexables(self):
+        doc = self.card.schema(docid=None)
+        ck = self.extension.add_checklist()
+        ck.set_title(u'test list')
+        ck.add_item_from_str(u'test item')
+        ck = self.extension.add_checklist()
+        ck.add_item_from_str(u'test item 2')
+        self.extension.update_document(doc)
+        indexables = Checklists.get_indexables([self.card.db_id])
+        self.assertEqual(indexables, {self.card.db_id: doc.checklists})
 
+    def test_counters(self):
+        ck = self.extension.add_checklist()
+        ck.add_item_from_str(u'test')
+        ck.add_item_from_str(u'test2')
+        ck.items[0]().set_done()
+        self.assertEqual(self.card.data.get_counter('checklist_items'), 2)
+        self.assertEqual(self.card.data.get_counter('checklist_items_done'), 1)
+        ck.delete_index(0)
+        self.assertEqual(self.extension.total_items, 1)
+        self.assertEqual(self.extension.total_items_done, 0)
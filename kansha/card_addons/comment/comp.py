@@ -148,6 +148,12 @@ class Comments(CardExtension):
         self.load_children()
         document.comments = u'\n'.join(comment().text for comment in self.comments)
 
+    @classmethod
+    def get_indexables(cls, card_ids):
+        texts = DataComment.get_texts_by_cards(card_ids)
+        return dict((card_id, u'\n'.join(text or u'' for text in card_texts))
+                    for card_id, card_texts in texts.iteritems())
+
     @property
     def data(self):
         return DataComment.get_by_card(self.card.data)
@@ -178,6 +184,7 @@ class Comments(CardExtension):
             session.flush()
             data = {'comment': v.strip(), 'card': self.card.get_title()}
             self.action_log.add_history(security.get_user(), u'card_add_comment', data)
+            self.card.data.increment_counters(comments=1)
             self.comments.insert(0, self._create_comment_component(comment))
 
     def delete_comment(self, comp):
@@ -190,15 +197,24 @@ class Comments(CardExtension):
         comment = comp()
         DataComment.get(comment.db_id).delete()
         session.flush()
+        self.card.data.increment_counters(comments=-1)
 
     def delete(self):
         self.comments = []
         for comment in self.data:
             comment.delete()
 
+    @classmethod
+    def delete_cards(cls, card_ids):
+        DataComment.delete_cards(card_ids)
+        return ()
+
     @property
     def num_comments(self):
-        return DataComment.total_comments(self.card.data)
+        num_comments = self.card.data.get_counter('comments')
+        if num_comments is None:
+            return DataComment.total_comments(self.card.data)
+        return num_comments
 
 
 @excel_export.get_extension_title_for(Comments)
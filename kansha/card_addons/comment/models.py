@@ -33,6 +33,20 @@ class DataComment(Entity):
         q = q.order_by(cls.creation_date.desc())
         return q
 
+    @classmethod
+    def delete_cards(cls, card_ids):
+        cls.query.filter(cls.card_id.in_(card_ids)).delete(synchronize_session=False)
+
+    @classmethod
+    def get_texts_by_cards(cls, card_ids):
+        '''Return a dict {card id: list of comment texts, newest first}, in one query'''
+        q = cls.query.with_entities(cls.card_id, cls.comment)
+        q = q.filter(cls.card_id.in_(card_ids))
+        texts = {}
+        for card_id, text in q.order_by(cls.creation_date.desc()):
+            texts.setdefault(card_id, []).append(text)
+        return texts
+
     @classmethod
     def total_comments(cls, card):
         q = cls.query
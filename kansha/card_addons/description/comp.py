@@ -36,6 +36,12 @@ class CardDescription(CardExtension):
             - ``card`` -- the card
         """
         super(CardDescription, self).__init__(card, action_log, configurator)
+        self._text = self.get_preloaded()
+
+    @classmethod
+    def preload(cls, cards):
+        descriptions = DataCardDescription.get_by_cards([card.id for card in cards])
+        return dict((card.id, descriptions.get(card.id) or u'') for card in cards)
 
     @staticmethod
     def get_schema_def():
@@ -45,8 +51,14 @@ class CardDescription(CardExtension):
         desc = self.text
         document.description = clean_text(desc) if desc else u''
 
+    @classmethod
+    def get_indexables(cls, card_ids):
+        descriptions = DataCardDescription.get_by_cards(card_ids)
+        return dict((card_id, clean_text(desc)) for card_id, desc in descriptions.iteritems() if desc)
+
     def update(self, other):
         self.data.update(other.data)
+        self._text = None
 
     @property
     def data(self):
@@ -57,11 +69,14 @@ class CardDescription(CardExtension):
 
     @property
     def text(self):
-        return self.data.description
+        if self._text is None:
+            return self.data.description
+        return self._text
 
     @text.setter
     def text(self, text):
-        self.data.description = text
+        self.data.description = self._text = text
+        self.card.data.increase_version()
 
     def change_text(self, text):
         """Edit the description
@@ -85,6 +100,17 @@ class CardDescription(CardExtension):
 
     def delete(self):
         self.data.delete()
+        self._text = None
+
+    @classmethod
+    def delete_cards(cls, card_ids):
+        DataCardDescription.delete_cards(card_ids)
+        return ()
+
+    @classmethod
+    def clone_cards(cls, card_ids, board, services_service):
+        DataCardDescription.clone_cards(card_ids)
+        return True
 
 
 @excel_export.get_extension_title_for(CardDescription)
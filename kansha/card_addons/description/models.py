@@ -39,3 +39,26 @@ class DataCardDescription(Entity):
         q = cls.query
         q = q.filter_by(card=card)
         return q.first()
+
+    @classmethod
+    def delete_cards(cls, card_ids):
+        cls.query.filter(cls.card_id.in_(card_ids)).delete(synchronize_session=False)
+
+    @classmethod
+    def clone_cards(cls, card_ids):
+        '''Copy the descriptions of the cards, with one query and one ``executemany``
+
+        In:
+          - ``card_ids`` -- dict {id of a copied card: id of its copy}
+        '''
+        q = cls.query.with_entities(cls.card_id, cls.description).filter(cls.card_id.in_(card_ids.keys()))
+        rows = [{'card_id': card_ids[card_id], 'description': value} for card_id, value in q]
+        if rows:
+            session.execute(cls.table.insert(), rows)
+
+    @classmethod
+    def get_by_cards(cls, card_ids):
+        '''Return a dict {card id: description} for cards that have a description'''
+        q = cls.query.with_entities(cls.card_id, cls.description)
+        q = q.filter(cls.card_id.in_(card_ids))
+        return dict(q)
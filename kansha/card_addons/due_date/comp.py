@@ -38,9 +38,16 @@ class DueDate(CardExtension):
             - ``card`` -- the object card
         """
         super(DueDate, self).__init__(card, action_log, configurator)
-        self.due_date = self.get_value()
+        self.due_date = self.get_preloaded(False)
+        if self.due_date is False:
+            self.due_date = self.get_value()
         self.calendar = None
 
+    @classmethod
+    def preload(cls, cards):
+        due_dates = DataCardDueDate.get_by_cards([card.id for card in cards])
+        return dict((card.id, due_dates.get(card.id)) for card in cards)
+
     def _init_calendar(self):
         if self.calendar is None or self.calendar().is_hidden:
             calendar = calendar_widget.Calendar(self.due_date, allow_none=True)
@@ -60,6 +67,7 @@ class DueDate(CardExtension):
         '''Set the value to a new date (or None)'''
         self.data.due_date = value
         self.due_date = value
+        self.card.data.increase_version()
 
     def new_card_position(self, value):
         self.set_value(value)
@@ -89,6 +97,16 @@ class DueDate(CardExtension):
     def delete(self):
         self.data.delete()
 
+    @classmethod
+    def delete_cards(cls, card_ids):
+        DataCardDueDate.delete_cards(card_ids)
+        return ()
+
+    @classmethod
+    def clone_cards(cls, card_ids, board, services_service):
+        DataCardDueDate.clone_cards(card_ids)
+        return True
+
 
 @excel_export.get_extension_title_for(DueDate)
 def get_extension_title_DueDate(card_extension):
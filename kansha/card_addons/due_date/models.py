@@ -11,6 +11,7 @@
 from elixir import ManyToOne
 from elixir import Field, Date
 from elixir import using_options
+from nagare.database import session
 
 from kansha.models import Entity
 
@@ -26,3 +27,26 @@ class DataCardDueDate(Entity):
         q = cls.query
         q = q.filter_by(card=card)
         return q.first()
+
+    @classmethod
+    def delete_cards(cls, card_ids):
+        cls.query.filter(cls.card_id.in_(card_ids)).delete(synchronize_session=False)
+
+    @classmethod
+    def clone_cards(cls, card_ids):
+        '''Copy the due dates of the cards, with one query and one ``executemany``
+
+        In:
+          - ``card_ids`` -- dict {id of a copied card: id of its copy}
+        '''
+        q = cls.query.with_entities(cls.card_id, cls.due_date).filter(cls.card_id.in_(card_ids.keys()))
+        rows = [{'card_id': card_ids[card_id], 'due_date': value} for card_id, value in q]
+        if rows:
+            session.execute(cls.table.insert(), rows)
+
+    @classmethod
+    def get_by_cards(cls, card_ids):
+        '''Return a dict {card id: due date} for cards that have a due date'''
+        q = cls.query.with_entities(cls.card_id, cls.due_date)
+        q = q.filter(cls.card_id.in_(card_ids))
+        return dict(q)
@@ -50,12 +50,29 @@ class Gallery(CardExtension):
         self.comp_id = str(random.randint(10000, 100000))
         self.model = 'view'
         self.cropper = component.Component()
+        self._cover = self.get_preloaded()
+
+    @classmethod
+    def preload(cls, cards):
+        card_ids = [card.id for card in cards]
+        # only keep the filenames, assets are fetched back from the session identity map
+        covers = dict((card_id, asset.filename)
+                      for card_id, asset in DataAsset.get_covers(card_ids).iteritems())
+        return dict((card_id, covers.get(card_id, u'')) for card_id in card_ids)
+
+    def _reset_preloaded(self):
+        self._cover = None
 
     @property
     def num_assets(self):
-        return DataAsset.count_for(self.card.data)
+        num_assets = self.card.data.get_counter('assets')
+        if num_assets is None:
+            return DataAsset.count_for(self.card.data)
+        return num_assets
 
     def load_assets(self):
+        # assets may be edited from now on
+        self._reset_preloaded()
         if not self.assets:
             for asset_data in DataAsset.get_all(self.card.data):
                 self.create_asset(asset_data)
@@ -74,6 +91,7 @@ class Gallery(CardExtension):
                 self.assets.remove(a)
                 break
         DataAsset.remove(self.card.data, asset.filename)
+        self._reset_preloaded()
         # asset.delete()
         self.assets_manager.delete(asset.filename)
 
@@ -84,6 +102,15 @@ class Gallery(CardExtension):
         DataAsset.remove_all(self.card.data)
         self.assets = []
 
+    @classmethod
+    def delete_cards(cls, card_ids):
+        return DataAsset.delete_cards(card_ids)
+
+    @classmethod
+    def clone_cards(cls, card_ids, board, services_service):
+        DataAsset.clone_cards(card_ids, security.get_user().data, services_service['assets_manager'].share)
+        return True
+
     def update(self, other):
         other.load_assets()
         for asset_comp in other.assets:
@@ -131,6 +158,7 @@ class Gallery(CardExtension):
                                           metadata={'filename': file_info['filename'], 'content-type': file_info['content_type']})
         data = {'file': file_info['filename'], 'card': self.card.get_title()}
         self.action_log.add_history(user, u'card_add_file', data)
+        self._reset_preloaded()
         return self.create_asset(DataAsset.add(fileid, self.card.data, user.data))
 
     def add_assets(self, new_files):
@@ -161,6 +189,8 @@ class Gallery(CardExtension):
         """
         self.assets_manager.create_cover(asset.filename, left, top, width, height)
         DataAsset.set_cover(self.card.data, asset.data)
+        self.card.data.increase_version()
+        self._reset_preloaded()
         for a in self.assets:
             a().is_cover = False
         asset.is_cover = True
@@ -177,7 +207,10 @@ class Gallery(CardExtension):
         self.model = 'view'
 
     def get_cover(self):
-        cover_data = DataAsset.get_cover(self.card.data)
+        if self._cover is None:
+            cover_data = DataAsset.get_cover(self.card.data)
+        else:
+            cover_data = DataAsset.get_by_filename(self._cover) if self._cover else None
         if not cover_data:
             return None
 
@@ -190,6 +223,8 @@ class Gallery(CardExtension):
           - ``asset`` -- The asset
         """
         DataAsset.remove_cover(self.card.data)
+        self.card.data.increase_version()
+        self._reset_preloaded()
         asset.is_cover = False
         self.model = 'view'
 
@@ -13,6 +13,7 @@ import datetime
 from nagare.database import session
 
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from elixir import ManyToOne, Field, Unicode, DateTime, using_options
 
 from kansha.models import Entity
@@ -35,24 +36,64 @@ class DataAsset(Entity):
     def count_for(cls, card):
         return cls.get_all(card).with_entities(func.count()).scalar()
 
+    @classmethod
+    def get_covers(cls, card_ids):
+        '''Return a dict {card id: cover asset} for cards that have a cover'''
+        q = cls.query.options(joinedload('author'))
+        q = q.filter(cls.cover_id.in_(card_ids))
+        return dict((asset.cover_id, asset) for asset in q)
+
     @classmethod
     def add(cls, filename, card, author):
         asset = cls(filename=filename, card=card, author=author,
                    creation_date=datetime.datetime.utcnow())
         session.add(asset)
         session.flush()
+        card.increment_counters(assets=1)
         return asset
 
     @classmethod
     def remove(cls, card, filename):
         file = cls.get_by_filename(filename)
         file.delete()
+        card.increment_counters(assets=-1)
 
     @classmethod
     def remove_all(cls, card):
         q = cls.query
         q = q.filter_by(card=card)
-        q.delete()
+        card.increment_counters(assets=-q.delete())
+
+    @classmethod
+    def delete_cards(cls, card_ids):
+        '''Delete the assets of the cards, in one statement.
+
+        Return:
+          - the files of the deleted assets
+        '''
+        q = cls.query.filter(cls.card_id.in_(card_ids))
+        filenames = [filename for filename, in q.with_entities(cls.filename)]
+        q.delete(synchronize_session=False)
+        return filenames
+
+    @classmethod
+    def clone_cards(cls, card_ids, author, share):
+        '''Copy the assets of the cards, with one query and one ``executemany``
+
+        In:
+          - ``card_ids`` -- dict {id of a copied card: id of its copy}
+          - ``author`` -- DataUser instance, author of the copies
+          - ``share`` -- function returning the file of the copy of a file
+        '''
+        now = datetime.datetime.utcnow()
+        q = session.query(cls.filename, cls.card_id, cls.cover_id).filter(cls.card_id.in_(card_ids.keys()))
+        rows = [
+            {'filename': share(filename), 'creation_date': now, 'card_id': card_ids[card_id],
+             'cover_id': card_ids.get(cover_id), 'author_username': author.username, 'author_source': author.source}
+            for filename, card_id, cover_id in q
+        ]
+        if rows:
+            session.execute(cls.table.insert(), rows)
 
     @classmethod
     def get_cover(cls, card):
@@ -15,6 +15,7 @@ from nagare import component, var, i18n
 from kansha.toolbox import overlay
 from kansha.board import excel_export
 from kansha.services.search import schema
+from kansha.card.models import DataCard
 from kansha.cardextension import CardExtension
 
 from .models import DataLabel
@@ -66,6 +67,7 @@ class Label(object):
           - ``v`` -- the color of the label as hex string (ex. '#CECECE')
         """
         self.data.color = v
+        self._increase_cards_version()
 
     def get_title(self):
         return self.data.title
@@ -77,6 +79,11 @@ class Label(object):
             - ``title`` -- new title
         """
         self.data.title = title
+        self._increase_cards_version()
+
+    def _increase_cards_version(self):
+        # the label is shown on all these cards
+        DataCard.increase_versions([card.id for card in self.data.cards])
 
     def add(self, card):
         self.data.add(card.data)
@@ -105,7 +112,12 @@ class CardLabels(CardExtension):
         """
         super(CardLabels, self).__init__(card, action_log, configurator)
         self.comp_id = str(random.randint(10000, 100000))
-        self.labels = [Label(label) for label in self.data]
+        self.labels = [Label(label) for label in self.get_preloaded(self.data)]
+
+    @classmethod
+    def preload(cls, cards):
+        labels = DataLabel.get_by_cards([card.id for card in cards])
+        return dict((card.id, labels.get(card.id, [])) for card in cards)
 
     @staticmethod
     def get_schema_def():
@@ -114,6 +126,12 @@ class CardLabels(CardExtension):
     def update_document(self, document):
         document.labels = u' '.join(label.get_title() for label in self.labels)
 
+    @classmethod
+    def get_indexables(cls, card_ids):
+        labels = DataLabel.get_by_cards(card_ids)
+        return dict((card_id, u' '.join(label.title for label in card_labels))
+                    for card_id, card_labels in labels.iteritems())
+
     @property
     def data(self):
         return DataLabel.get_by_card(self.card.data)
@@ -150,12 +168,23 @@ class CardLabels(CardExtension):
             label.add(self.card)
             self.labels.append(label)
             self.labels.sort(key=lambda l: l.index)
+        self.card.data.increase_version()
 
     def delete(self):
         for label in self.labels:
             label.remove(self.card)
         self.labels = []
 
+    @classmethod
+    def delete_cards(cls, card_ids):
+        DataLabel.delete_cards(card_ids)
+        return ()
+
+    @classmethod
+    def clone_cards(cls, card_ids, board, services_service):
+        DataLabel.clone_cards(card_ids, board)
+        return True
+
 
 @excel_export.get_extension_title_for(CardLabels)
 def get_extension_title_CardDescription(card_extension):
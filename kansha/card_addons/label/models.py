@@ -11,8 +11,11 @@
 from elixir import using_options
 from elixir import ManyToOne, ManyToMany
 from elixir import Field, Unicode, Integer
+from sqlalchemy import select
+from nagare.database import session
 
 from kansha.models import Entity
+from kansha.card.models import DataCard
 
 
 class DataLabel(Entity):
@@ -38,8 +41,54 @@ class DataLabel(Entity):
     def add(self, card):
         self.cards.append(card)
 
+    @classmethod
+    def delete_cards(cls, card_ids):
+        '''Remove the cards from their labels, in one statement'''
+        cards = cls.table_cards()
+        session.execute(cards.delete().where(cards.c.card_id.in_(card_ids)))
+
+    @classmethod
+    def clone_cards(cls, card_ids, board):
+        '''Put the copies of the cards in the labels of ``board`` with the same titles as theirs,
+        with one query and one ``executemany``
+
+        In:
+          - ``card_ids`` -- dict {id of a copied card: id of its copy}
+        '''
+        labels = dict((title, label_id) for label_id, title in
+                      session.query(cls.id, cls.title).filter(cls.board == board))
+        cards = cls.table_cards()
+        q = select([cards.c.card_id, cls.table.c.title]).where(cards.c.label_id == cls.table.c.id)
+        q = q.where(cards.c.card_id.in_(card_ids.keys()))
+        rows = set((card_ids[card_id], labels[title]) for card_id, title in session.execute(q) if title in labels)
+        if rows:
+            session.execute(cards.insert(), [{'card_id': card_id, 'label_id': label_id} for card_id, label_id in rows])
+
+    @classmethod
+    def delete_labels(cls, board):
+        '''Delete the labels of the board, with one statement per table'''
+        labels = select([cls.id]).where(cls.board_id == board.id)
+        cards = cls.table_cards()
+        session.execute(cards.delete().where(cards.c.label_id.in_(labels)))
+        cls.query.filter_by(board=board).delete(synchronize_session=False)
+
+    @classmethod
+    def table_cards(cls):
+        '''The association table of the labels and the cards'''
+        return cls.cards.property.secondary
+
     @classmethod
     def get_by_card(cls, card):
         q = cls.query
         q = q.filter(cls.cards.contains(card))
         return q.order_by(cls.index)
+
+    @classmethod
+    def get_by_cards(cls, card_ids):
+        '''Return a dict {card id: ordered list of labels} for cards that have labels'''
+        q = session.query(cls, DataCard.id).join(cls.cards)
+        q = q.filter(DataCard.id.in_(card_ids))
+        labels = {}
+        for label, card_id in q.order_by(cls.index):
+            labels.setdefault(card_id, []).append(label)
+        return labels
@@ -85,8 +85,11 @@ class CardMembers(CardExtension):
             overlay.Overlay(lambda r: (r.i(class_='ico-btn icon-user-plus')),
                             lambda r: component.Component(self).render(r, model='add_member_overlay'), dynamic=True, cls='card-overlay'))
         self.new_member = component.Component(usermanager.NewMember(self.autocomplete_method), model='add_members')
-        self.members = [component.Component(usermanager.UserManager.get_app_user(data=membership.user))
-                        for membership in DataMembership.get_for_card(self.card.data)]
+        users = self.get_preloaded()
+        if users is None:
+            users = [membership.user for membership in DataMembership.get_for_card(self.card.data)]
+        self.members = [component.Component(usermanager.UserManager.get_app_user(data=user))
+                        for user in users]
 
         self.see_all_members = component.Component(
             overlay.Overlay(lambda r: component.Component(self).render(r, model='more_users'),
@@ -94,6 +97,11 @@ class CardMembers(CardExtension):
                             dynamic=False, cls='card-overlay'))
         self._favorites = []
 
+    @classmethod
+    def preload(cls, cards):
+        users = DataMembership.get_users_by_cards([card.id for card in cards])
+        return dict((card.id, users.get(card.id, [])) for card in cards)
+
     def autocomplete_method(self, value):
         """ """
         available_user_ids = self.get_available_user_ids()
@@ -142,10 +150,12 @@ class CardMembers(CardExtension):
             values = {'user_id': member.username, 'user': member.fullname, 'card': self.card.get_title()}
             self.action_log.add_history(security.get_user(), u'card_add_member', values)
             self.members.append(component.Component(member))
+        self.card.data.increase_version()
 
     def remove_member(self, username):
         """Remove member username from card member"""
         DataMembership.remove_card_member(self.card.data, username)
+        self.card.data.increase_version()
         for member in self.members:
             if member().username == username:
                 self.members.remove(member)
@@ -162,3 +172,8 @@ class CardMembers(CardExtension):
 
     def delete(self):
         DataCardMembership.purge(self.card.data)
+
+    @classmethod
+    def delete_cards(cls, card_ids):
+        DataCardMembership.delete_cards(card_ids)
+        return ()
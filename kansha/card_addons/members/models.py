@@ -8,9 +8,10 @@
 #--
 
 from nagare import database
-from sqlalchemy import func
+from sqlalchemy import event, func
 import sqlalchemy as sa
 from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.orm.attributes import get_history
 from elixir import (ManyToOne, ManyToMany, OneToMany, using_options, Field, Boolean, Integer,
                     using_table_options)
 
@@ -32,8 +33,11 @@ class DataCardMembership(Entity):
 
     @classmethod
     def purge(cls, card):
-        for member in cls.query.filter_by(card=card):
-            member.delete()
+        cls.delete_cards([card.id])
+
+    @classmethod
+    def delete_cards(cls, card_ids):
+        cls.query.filter(cls.card_id.in_(card_ids)).delete(synchronize_session=False)
 
 
 class DataMembership(Entity):
@@ -52,6 +56,17 @@ class DataMembership(Entity):
     def get_for_card(cls, card):
         return cls.query.join(DataCardMembership).filter(DataCardMembership.card == card)
 
+    @classmethod
+    def get_users_by_cards(cls, card_ids):
+        '''Return a dict {card id: list of member users} for cards that have members'''
+        q = database.session.query(DataCardMembership.card_id, DataUser)
+        q = q.join(DataCardMembership.membership, DataMembership.user)
+        q = q.filter(DataCardMembership.card_id.in_(card_ids))
+        users = {}
+        for card_id, user in q:
+            users.setdefault(card_id, []).append(user)
+        return users
+
     @classmethod
     def search(cls, board, user):
         return cls.get_by(board=board, user=user)  # at most one
@@ -124,3 +139,19 @@ class DataMembership(Entity):
         if ms:
             ms.manager = manager
             database.session.flush()
+
+
+def increase_cards_versions(mapper, connection, user):
+    '''The badges of the cards show the names and the avatars of their members:
+    their renderings are outdated when a member changes their profile.'''
+    if not any(get_history(user, name).has_changes() for name in ('fullname', 'picture')):
+        return
+    memberships = sa.select([DataMembership.id]).where(sa.and_(
+        DataMembership.user_username == user.username,
+        DataMembership.user_source == user.source))
+    cards = sa.select([DataCardMembership.card_id]).where(DataCardMembership.membership_id.in_(memberships))
+    connection.execute(
+        DataCard.table.update().where(DataCard.table.c.id.in_(cards)).values(version=DataCard.table.c.version + 1))
+
+
+event.listen(DataUser, 'after_update', increase_cards_versions)
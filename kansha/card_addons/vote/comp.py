@@ -30,7 +30,10 @@ class Votes(CardExtension):
 
     def count_votes(self):
         '''Returns number of votes for a card'''
-        return DataVote.count_votes(self.card.data)
+        nb_votes = self.card.data.get_counter('votes')
+        if nb_votes is None:
+            return DataVote.count_votes(self.card.data)
+        return nb_votes
 
     def toggle(self):
         '''Add a vote to the current card.
@@ -41,8 +44,10 @@ class Votes(CardExtension):
         user = security.get_user()
         if self.has_voted():
             DataVote.get_vote(self.card.data, user.data).delete()
+            self.card.data.increment_counters(votes=-1)
         else:
             DataVote.new(card=self.card.data, user=user.data)
+            self.card.data.increment_counters(votes=1)
 
     def has_voted(self):
         '''Check if the current user already vote for this card'''
@@ -52,6 +57,11 @@ class Votes(CardExtension):
     def delete(self):
         DataVote.purge(self.card.data)
 
+    @classmethod
+    def delete_cards(cls, card_ids):
+        DataVote.delete_cards(card_ids)
+        return ()
+
 
 # FIXME: redesign security from scratch
 @when(common.Rules.has_permission, "user and perm == 'vote' and isinstance(subject, Votes)")
@@ -62,5 +62,8 @@ class DataVote(Entity):
 
     @classmethod
     def purge(cls, card):
-        for vote in cls.query.filter_by(card=card):
-            vote.delete()
+        cls.delete_cards([card.id])
+
+    @classmethod
+    def delete_cards(cls, card_ids):
+        cls.query.filter(cls.card_id.in_(card_ids)).delete(synchronize_session=False)
@@ -25,3 +25,9 @@ class VoteTest(CardExtensionTestCase):
         self.extension.toggle()
         self.assertEqual(self.extension.count_votes(), 0)
         self.assertFalse(self.extension.has_voted())
+
+    def test_counters(self):
+        self.extension.toggle()
+        self.assertEqual(self.card.data.get_counter('votes'), 1)
+        self.extension.toggle()
+        self.assertEqual(self.card.data.get_counter('votes'), 0)
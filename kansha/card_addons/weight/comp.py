@@ -42,12 +42,21 @@ class CardWeightEditor(CardExtension):
         """
         CardExtension.__init__(self, card, action_log, configurator)
         self.card = card
-        self.weight = editor.Property(str(self.data.weight or u''))
+        self.weight_value = self.get_preloaded()
+        if self.weight_value is None:
+            self.weight_value = self.data.weight
+        self.weight = editor.Property(str(self.weight_value or u''))
         self.weight.validate(self.validate_weight)
         self.action_button = component.Component(self, 'action_button')
 
+    @classmethod
+    def preload(cls, cards):
+        weights = DataCardWeight.get_by_cards([card.id for card in cards])
+        return dict((card.id, weights.get(card.id) or 0) for card in cards)
+
     def update(self, other):
         self.data.update(other.data)
+        self.weight_value = self.data.weight
         self.weight(str(self.data.weight) or u'')
 
     @property
@@ -79,7 +88,8 @@ class CardWeightEditor(CardExtension):
         success = False
         if self.weight.error is None:
             values = {'from': self.data.weight, 'to': self.weight.value, 'card': self.card.get_title()}
-            self.data.weight = self.weight.value
+            self.data.weight = self.weight_value = self.weight.value
+            self.card.data.increase_version()
             self.action_log.add_history(security.get_user(), u'card_weight', values)
             success = True
         return success
@@ -87,6 +97,16 @@ class CardWeightEditor(CardExtension):
     def delete(self):
         self.data.delete()
 
+    @classmethod
+    def delete_cards(cls, card_ids):
+        DataCardWeight.delete_cards(card_ids)
+        return ()
+
+    @classmethod
+    def clone_cards(cls, card_ids, board, services_service):
+        DataCardWeight.clone_cards(card_ids)
+        return True
+
 
 @excel_export.get_extension_title_for(CardWeightEditor)
 def get_extension_title_CardWeightEditor(card_extension):
@@ -32,6 +32,8 @@ class DataBoardWeightConfig(Entity):
         q = session.query(DataCardWeight).join(DataCard).join(DataColumn)
         for cw in q.filter(DataColumn.board == self.board):
             cw.weight = 0
+        cards = session.query(DataCard.id).join(DataColumn).filter(DataColumn.board == self.board)
+        DataCard.increase_versions([card_id for card_id, in cards])
 
     def total_weight(self):
         q = session.query(func.sum(DataCardWeight.weight)).join(DataCard).join(DataColumn)
@@ -61,3 +63,26 @@ class DataCardWeight(Entity):
         q = cls.query
         q = q.filter_by(card=card)
         return q.first()
+
+    @classmethod
+    def delete_cards(cls, card_ids):
+        cls.query.filter(cls.card_id.in_(card_ids)).delete(synchronize_session=False)
+
+    @classmethod
+    def clone_cards(cls, card_ids):
+        '''Copy the weights of the cards, with one query and one ``executemany``
+
+        In:
+          - ``card_ids`` -- dict {id of a copied card: id of its copy}
+        '''
+        q = cls.query.with_entities(cls.card_id, cls.weight).filter(cls.card_id.in_(card_ids.keys()))
+        rows = [{'card_id': card_ids[card_id], 'weight': value} for card_id, value in q]
+        if rows:
+            session.execute(cls.table.insert(), rows)
+
+    @classmethod
+    def get_by_cards(cls, card_ids):
+        '''Return a dict {card id: weight} for cards that have a weight'''
+        q = cls.query.with_entities(cls.card_id, cls.weight)
+        q = q.filter(cls.card_id.in_(card_ids))
+        return dict(q)
@@ -57,8 +57,8 @@ def render_CardWeightEditor_edit(self, h, comp, *args):
 
 @presentation.render_for(CardWeightEditor, 'badge')
 def render_CardWeightEditor_badge(self, h, comp, *args):
-    if self.data.weight:
+    if self.weight_value:
         with h.span(class_='badge'):
             h << h.span(h.i(class_='icon-star-empty'), ' ',
-                        self.data.weight, class_='label', title=_(u'Weight'))
+                        self.weight_value, class_='label', title=_(u'Weight'))
     return h.root
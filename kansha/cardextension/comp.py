@@ -13,6 +13,9 @@ from kansha.events import EventHandlerMixIn
 
 
 class CardExtension(plugin.Plugin, EventHandlerMixIn):
+    '''The header, cover and badge views are cached with the card: the writes of
+    an extension must increase the card version (``DataCard.increase_version``).'''
+
     CATEGORY = 'card-extension'
 
     def __init__(self, card, action_log, configurator=None):
@@ -31,18 +34,71 @@ class CardExtension(plugin.Plugin, EventHandlerMixIn):
         ie: return schema.Text for a text field'''
         return None
 
+    @classmethod
+    def preload(cls, cards):
+        '''Bulk load, in a few queries, the data needed to build and render
+        (header, cover and badge models) this extension for all the given cards.
+
+        In:
+          - ``cards`` -- list of DataCard instances, usually all the cards of a board
+        Return:
+          - a dict {card id: value} or None if the extension does not support preloading
+        '''
+        return None
+
+    def get_preloaded(self, default=None):
+        '''Return the value bulk loaded by ``preload`` for the card, or ``default``.
+        Only meaningful at initialization time.'''
+        return self.card.preloaded.get(self.__class__, default)
+
     def update_document(self, document):
         '''Add extension value to document that will be indexed'''
         pass
 
+    @classmethod
+    def get_indexables(cls, card_ids):
+        '''Bulk version of ``update_document``, used to (re)build the index.
+
+        In:
+          - ``card_ids`` -- list of card ids
+        Return:
+          - a dict {card id: value of the ``get_schema_def`` field}, missing cards get the
+            default value of the field, or None if the extension does not support it
+        '''
+        return None
+
     def delete(self):
         '''Happens when a card is deleted, use it to clean up files for example'''
         pass
 
+    @classmethod
+    def delete_cards(cls, card_ids):
+        '''Bulk version of ``delete``, used to delete many cards at once, in a few statements.
+
+        In:
+          - ``card_ids`` -- list of card ids
+        Return:
+          - the files of the assets manager to delete once the deletion is committed,
+            or None if the extension does not support it (then ``delete`` is called card by card)
+        '''
+        return None
+
     def update(self, other):
         '''Copy state and data from other on self.'''
         pass
 
+    @classmethod
+    def clone_cards(cls, card_ids, board, services_service):
+        '''Bulk version of ``update``, used to copy all the cards of a board at once, in a few statements.
+
+        In:
+          - ``card_ids`` -- dict {id of a copied card: id of its copy}
+          - ``board`` -- DataBoard instance of the copies
+        Return:
+          - True, or None if the extension does not support it (then ``update`` is called card by card)
+        '''
+        return None
+
     def new_card_position(self, value):
         '''Happens when a card is moved on the board'''
         pass
@@ -52,3 +52,4 @@ class DummyParent(object):
     def __init__(self):
         self.action_log = DummyActionLog()
         self.data = None
+        self.preloaded = {}
@@ -9,6 +9,7 @@
 #--
 
 from nagare.i18n import _
+from nagare.database import session
 from nagare import component, editor, i18n, security, var, validator as nagare_validator
 
 from kansha import title
@@ -26,7 +27,7 @@ class Column(events.EventHandlerMixIn):
     """
 
     def __init__(self, id_, board, card_extensions, action_log, card_filter,
-                 search_engine_service, services_service, data=None):
+                 search_engine_service, deletion_queue_service, services_service, data=None):
         """Initialization
 
         In:
@@ -40,29 +41,120 @@ class Column(events.EventHandlerMixIn):
         self.action_log = action_log
         self.card_filter = card_filter
         self.search_engine = search_engine_service
+        self.deletion_queue = deletion_queue_service
         self.card_extensions = card_extensions
         self.body = component.Component(self, 'body')
         self.title = component.Component(
             title.EditableTitle(self.get_title)).on_answer(self.set_title)
         self.card_counter = component.Component(CardsCounter(self))
         self._cards = None
+        # {card id: component} of the cards being edited, the only ones kept in the session
+        self._open_cards = {}
         self.new_card = component.Component(
             NewCard(self))
 
     @property
     def cards(self):
         if self._cards is None:
-            self._cards = [
-                component.Component(
-                    self._services(
-                        Card, c.id,
-                        self.card_extensions,
-                        self.action_log,
-                        self.card_filter,
-                        data=c))
-                for c in self.data.cards]
+            # built with the cards of the other columns, to bulk load their data together
+            self.board.load_cards(self)
         return self._cards
 
+    @property
+    def cards_built(self):
+        return self._cards is not None
+
+    def build_cards(self, preloader=None):
+        """Build the card components, reusing the ones being edited
+
+        In:
+          - ``preloader`` -- ``ExtensionsPreloader`` of the new cards, if any
+        """
+        cards = []
+        for data in self.data.cards:
+            card_comp = self._open_cards.get(data.id)
+            if card_comp is None:
+                card_comp = component.Component(
+                    self._services(Card, data.id, self.card_extensions, self.action_log,
+                                   self.card_filter, data=data, preloader=preloader))
+            cards.append(card_comp)
+        self._cards = cards
+        self._open_cards = {}
+
+    @staticmethod
+    def get_card(card_comp):
+        """Return the card of a card component, even if it is being edited"""
+        card = card_comp()
+        if isinstance(card, popin.Popin):
+            card = card.get_business_object()
+        return card
+
+    def get_loaded_cards(self):
+        """Return the card components already built, by card id"""
+        return dict((self.get_card(card_comp).db_id, card_comp) for card_comp in self._cards or ())
+
+    def get_open_cards(self):
+        """Return the components of the cards being edited, by card id"""
+        card_comps = self._open_cards if self._cards is None else self.get_loaded_cards()
+        return dict((card_id, card_comp) for card_id, card_comp in card_comps.iteritems()
+                    if self.get_card(card_comp).editing)
+
+    def find_card(self, comp, card_id):
+        """Return the component of the card ``card_id``
+
+        In:
+          - ``comp`` -- the component of the column, receiving the events of the card
+          - ``card_id`` -- the database id of the card
+        Return:
+          - the card component, or None if the card is not in the column anymore
+        """
+        for card_comp in self.cards:
+            if self.get_card(card_comp).db_id == card_id:
+                return card_comp.on_answer(self.handle_event, comp)
+        return None
+
+    def open_card(self, comp, card_id):
+        """Open the editor of the card ``card_id``
+
+        The actions of the cards address them by id, as the session
+        only keeps the components of the cards being edited.
+        """
+        card_comp = self.find_card(comp, card_id)
+        if card_comp is not None and isinstance(card_comp(), Card):
+            card_comp().emit_event(card_comp, events.CardClicked, card_comp)
+
+    def card_dropped(self, comp, card_id, request, response):
+        """The card ``card_id`` has been dropped on a new date (calendar view)"""
+        card_comp = self.find_card(comp, card_id)
+        if card_comp is not None:
+            self.get_card(card_comp).card_dropped(request, response)
+
+    def sync_cards(self, card_comps):
+        """Put the cards in the database order, after changes made by other sessions
+
+        In:
+          - ``card_comps`` -- card components of the board by card id, reused when possible
+        """
+        if self._cards is None:
+            # not built yet: nothing to catch up with
+            return
+        cards = []
+        for data in self.data.cards:
+            card_comp = card_comps.get(data.id)
+            if card_comp is None:
+                card_comp = component.Component(
+                    self._services(Card, data.id, self.card_extensions,
+                                   self.action_log, self.card_filter, data=data))
+            cards.append(card_comp)
+        self._cards = cards
+
+    def prefetch_cards_data(self):
+        """Load the data of all the cards in one query
+
+        The cards then find it in the session identity map instead of querying it one by one.
+        """
+        return self.data.cards
+
     def update(self, other):
         self.data.update(other.data)
         cards_to_index = []
@@ -76,7 +168,8 @@ class Column(events.EventHandlerMixIn):
     def index_cards(self, cards, update=False):
         for card in cards:
             card.add_to_index(self.search_engine, self.board.id, update=update)
-        self.search_engine.commit(True)
+        # wait for the index only if it is needed to filter the cards
+        self.search_engine.commit(self.card_filter.is_active)
 
     def actions(self, action, comp):
         if action == 'empty':
@@ -92,6 +185,8 @@ class Column(events.EventHandlerMixIn):
             return
         card = self.create_card(title)
         if card:
+            # journaled when the board increases its version
+            self.board.add_change('card_created', card.db_id, self.db_id)
             self.index_cards([card])
             self.emit_event(comp, events.SearchIndexUpdated)
             self.card_filter.reset()
@@ -102,6 +197,8 @@ class Column(events.EventHandlerMixIn):
             card_comp.becomes(popin.Popin(card_comp, 'edit'))
         elif event.is_(events.ParentTitleNeeded):
             return self.get_title()
+        elif event.is_(events.ColumnNeeded):
+            return comp
         elif event.is_(events.CardEditorClosed):
             card_bo = event.emitter
             slot = event.data
@@ -109,8 +206,10 @@ class Column(events.EventHandlerMixIn):
             # if card has been edited, reindex
             if security.has_permissions('edit', card_bo):
                 card_bo.add_to_index(self.search_engine, self.board.id, update=True)
-                self.search_engine.commit(True)
+                self.search_engine.commit(self.card_filter.is_active)
                 self.emit_event(comp, events.SearchIndexUpdated)
+                self.board.add_change('card_edited', card_bo.db_id)
+                self.board.increase_version()
             card_bo.refresh()
         elif event.is_(events.CardArchived):
             self.remove_card_by_id(event.last_relay.id)
@@ -124,8 +223,12 @@ class Column(events.EventHandlerMixIn):
         return self._data
 
     def __getstate__(self):
-        self._data = None
-        return self.__dict__
+        state = self.__dict__.copy()
+        state['_data'] = None
+        # the other cards are rebuilt on demand
+        state['_cards'] = None
+        state['_open_cards'] = self.get_open_cards()
+        return state
 
     def set_title(self, title):
         """Set title
@@ -162,10 +265,7 @@ class Column(events.EventHandlerMixIn):
 
     def remove_card_comp(self, card):
         self.cards.remove(card)
-        business = card()
-        if isinstance(business, popin.Popin):
-            business = business.get_business_object()
-        self.data.remove_card(business.data)
+        self.data.remove_card(self.get_card(card).data)
 
     def remove_card_by_id(self, card_id):
         """Remove card and return corresponding Component."""
@@ -201,34 +301,49 @@ class Column(events.EventHandlerMixIn):
         In:
             - ``card`` -- card to delete
         """
-        self.cards.pop(card.index)
-        values = {'column_id': self.id, 'column': self.get_title(), 'card': card.get_title()}
-        card.action_log.add_history(
-            security.get_user(),
-            u'card_delete', values)
-        self.search_engine.delete_document(card.schema, card.id)
+        self.delete_cards([card])
+
+    def delete_cards(self, cards):
+        """Delete cards and all their data, in a few statements
+
+        In:
+            - ``cards`` -- cards of this column to delete
+        """
+        card_ids = set(card.db_id for card in cards)
+        self._cards = [card_comp for card_comp in self.cards if self.get_card(card_comp).db_id not in card_ids]
+        self.deletion_queue.delete_cards(sorted(card_ids), self.card_extensions, self._services, self.search_engine)
         self.search_engine.commit()
-        card.delete()
-        self.data.delete_card(card.data)
+        session.expire(self.data, ['cards'])
+        self.board.add_change('column_changed', column_id=self.db_id)
+        self.board.increase_version()
 
     def purge_cards(self):
-        for card_comp in self.cards:
-            card = card_comp()
-            values = {'column_id': self.id, 'column': self.get_title(), 'card': card.get_title()}
-            card.action_log.add_history(
-                security.get_user(),
-                u'card_delete', values)
-            card.delete()
-            self.search_engine.delete_document(card.schema, card.id)
-        del self.cards[:]
-        self.search_engine.commit()
-        self.data.purge_cards()
+        self.delete_cards([card_comp() for card_comp in self.cards])
 
     def append_card(self, card):
         # TODO: when column extensions are introduced, generalize this
         if self.card_counter().check_add(card) and self.data.append_card(card.data):
             self.cards.append(component.Component(card))
 
+    def append_cards(self, cards):
+        """Move cards of other columns at the end of this one, in a few statements
+
+        In:
+            - ``cards`` -- cards to move
+        Return:
+            - the moved cards, no more than the column can hold
+        """
+        if self.nb_max_cards:
+            cards = cards[:max(self.nb_max_cards - self.count_cards, 0)]
+        self.data.append_cards([card.data for card in cards])
+        self.cards.extend(component.Component(card) for card in cards)
+        return cards
+
+    def remove_cards(self, cards):
+        """Forget the components of cards moved to other columns"""
+        card_ids = set(card.db_id for card in cards)
+        self._cards = [card_comp for card_comp in self.cards if self.get_card(card_comp).db_id not in card_ids]
+
     def create_card(self, text=''):
         """Create a new card
 
@@ -250,14 +365,6 @@ class Column(events.EventHandlerMixIn):
                 u'card_create', values)
             return card_obj
 
-    def change_index(self, new_index):
-        """Change index of the column
-
-        In:
-            - ``index`` -- new index
-        """
-        self.data.index = new_index
-
     def set_nb_cards(self, nb_cards):
         self.data.nb_max_cards = int(nb_cards) if nb_cards else None
 
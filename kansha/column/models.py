@@ -10,16 +10,16 @@
 
 from datetime import datetime
 
+import sqlalchemy as sa
 from sqlalchemy import func
 from elixir import using_options
 from elixir import ManyToOne, OneToMany
 from elixir import Field, Unicode, Integer, Boolean
-from sqlalchemy.ext.orderinglist import ordering_list
 
 from nagare.database import session
 
-from kansha.card.models import DataCard
-from kansha.models import Entity
+from kansha.card.models import DataCard, DataCardCounters
+from kansha.models import Entity, RANK_GAP, rank_for
 
 
 class DataColumn(Entity):
@@ -27,16 +27,19 @@ class DataColumn(Entity):
     """
     using_options(tablename='column')
     title = Field(Unicode(200))
-    index = Field(Integer)
+    # position in the board, see ``kansha.models.rank_for``
+    rank = Field(sa.BigInteger)
     nb_max_cards = Field(Integer)
     archive = Field(Boolean, default=False)
-    cards = OneToMany('DataCard', order_by='index',  # cascade='delete',
-                      collection_class=ordering_list('index'), lazy='subquery')
+    # moving a card only writes its rank: keep ``cards`` ordered through
+    # ``insert_card``, ``append_card`` and ``remove_card``
+    cards = OneToMany('DataCard', order_by=['rank', 'id'],  # cascade='delete',
+                      lazy='subquery')
     board = ManyToOne('DataBoard', colname='board_id')
 
     def update(self, other):
         self.title = other.title
-        self.index = other.index
+        self.rank = other.rank
         self.nb_max_cards = other.nb_max_cards
         session.flush()
 
@@ -51,17 +54,14 @@ class DataColumn(Entity):
         Return:
             - created DataColumn instance
         """
-        q = cls.query
-        q = q.filter(cls.index >= index)
-        q = q.filter(cls.board == board)
-        q.update({'index': cls.index + 1})
-        col = cls(title=title, index=index, board=board, nb_max_cards=nb_cards, archive=archive)
-        # session.add(col)
+        col = cls(title=title, rank=rank_for(board.columns, index), nb_max_cards=nb_cards, archive=archive)
+        board.columns.insert(index, col)
         session.flush()
         return col
 
     def create_card(self, title, user):
-        card = DataCard(title=title, creation_date=datetime.now())
+        card = DataCard(title=title, creation_date=datetime.now(),
+                        rank=rank_for(self.cards, len(self.cards)), counters=DataCardCounters())
         self.cards.append(card)
         session.flush()
         return card
@@ -73,23 +73,49 @@ class DataColumn(Entity):
     def insert_card(self, index, card):
         done = False
         if card not in self.cards:
+            card.rank = rank_for(self.cards, index)
             self.cards.insert(index, card)
             session.flush()
             done = True
         return done
 
+    def append_cards(self, cards):
+        """Move cards of other columns at the end of this one, in one statement
+
+        In:
+            - ``cards`` -- DataCard instances
+        """
+        cards = [card for card in cards if card.column_id != self.id]
+        if not cards:
+            return
+        columns = set(card.column for card in cards if card.column is not None)
+        first = rank_for(self.cards, len(self.cards))
+        session.flush()
+        table = DataCard.table
+        session.execute(
+            table.update().where(table.c.id == sa.bindparam('card_id')).values(
+                column_id=self.id, rank=sa.bindparam('card_rank'), version=table.c.version + 1
+            ),
+            [{'card_id': card.id, 'card_rank': first + i * RANK_GAP} for i, card in enumerate(cards)]
+        )
+        # the cards and the collections loaded in the session are outdated
+        for card in cards:
+            session.expire(card)
+        for column in columns | {self}:
+            session.expire(column, ['cards'])
+
     def delete_card(self, card):
         self.remove_card(card)
         card.delete()
 
     def purge_cards(self):
-        for card in self.cards:
-            card.delete()
+        DataCard.delete_cards([card.id for card in self.cards])
+        session.expire(self, ['cards'])
 
     def append_card(self, card):
         done = False
         if card not in self.cards:
-            card.index = None
+            card.rank = rank_for(self.cards, len(self.cards))
             self.cards.append(card)
             session.flush()
             done = True
@@ -99,20 +125,13 @@ class DataColumn(Entity):
     def delete_column(cls, column):
         """Delete column
 
-        Delete a given column, re-index other columns and delete all cards
-        of the column
+        Delete a given column and all the cards of the column
 
         In:
             - ``column`` -- DataColumn instance to delete
         """
-        index = column.index
-        board = column.board
         column.delete()
         session.flush()
-        q = cls.query
-        q = q.filter(cls.index >= index)
-        q = q.filter(cls.board == board)
-        q.update({'index': cls.index - 1})
 
     def get_cards_count(self):
         q = DataCard.query.filter(DataCard.column_id == self.id)
@@ -12,6 +12,7 @@ from nagare.i18n import _
 from nagare import ajax, component, presentation, security, var
 
 from kansha.toolbox import popin
+from kansha.card.view import render_card_slot
 
 from .comp import CardsCounter, Column, NewColumnEditor
 
@@ -39,7 +40,7 @@ def render_content(self, h, comp, model):
 
 @presentation.render_for(Column, 'calendar')
 def render_column_calendar(self, h, comp, *args):
-    return [card.render(h.AsyncRenderer(), 'calendar') for card in self.cards]
+    return [render_card_slot(h, card.on_answer(self.handle_event, comp), 'calendar') for card in self.cards]
 
 
 @presentation.render_for(Column, 'new')
@@ -140,6 +141,7 @@ def render_column_dnd(self, h, comp, *args):
 def render_column_body(self, h, comp, *args):
     model = 'dnd' if security.has_permissions('edit', self) else "no_dnd"
     id_ = h.generate_id()
+    self.prefetch_cards_data()
     with h.div(class_='list-body', id=id_):
         h << [card.on_answer(self.handle_event, comp).render(h, model=model) for card in self.cards]
         h << h.script("YAHOO.kansha.dnd.initTargetCard(%s)" % ajax.py2js(id_))
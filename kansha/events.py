@@ -174,6 +174,11 @@ class ParentTitleNeeded(Event):
     pass
 
 
+class ColumnNeeded(Event):
+    """The emitter card needs the component of its column, to address its actions to it."""
+    pass
+
+
 class NewTemplateRequested(Event):
     """
     The user requested that a new template is created from the emitter.
@@ -22,6 +22,7 @@ from datetime import datetime, timedelta
 from nagare import local, security
 from nagare.database import session
 
+from kansha.models import RANK_GAP
 from kansha.user import usermanager
 from kansha.board import boardsmanager
 from kansha.security import SecurityManager
@@ -29,6 +30,10 @@ from kansha.card.models import DataCard
 from kansha.card_addons.vote import DataVote
 from kansha.board import models as board_models
 from kansha.services.mail import DummyMailSender
+from kansha.services.render_cache import DummyRenderCache
+from kansha.services.push.service import DummyPushNotifications
+from kansha.services.index_queue.service import DummyIndexQueue
+from kansha.services.deletion_queue.service import DummyDeletionQueue
 from kansha.services.search.dummyengine import DummySearchEngine
 from kansha.services.services_repository import ServicesRepository
 from kansha.services.dummyassetsmanager.dummyassetsmanager import DummyAssetsManager
@@ -114,6 +119,10 @@ def create_services():
     _services.register('assets_manager', DummyAssetsManager())
     _services.register('mail_sender', DummyMailSender())
     _services.register('search_engine', DummySearchEngine(None))
+    _services.register('render_cache', DummyRenderCache())
+    _services.register('push', DummyPushNotifications())
+    _services.register('index_queue', DummyIndexQueue())
+    _services.register('deletion_queue', DummyDeletionQueue())
     return _services
 
 
@@ -154,7 +163,7 @@ def create_default_cards(board, user):
              DataCard(title=u"Finished with a card? Delete it.", creation_date=datetime.utcnow()),
              ]
     for i, c in enumerate(cards):
-        c.index = i
+        c.rank = (i + 1) * RANK_GAP
     column_1.cards = cards
     column_1.nb_max_cards = len(cards)
 
@@ -166,7 +175,7 @@ def create_default_cards(board, user):
                  title=u'To learn more tricks, check out the manual.', creation_date=datetime.utcnow()),
              DataCard(title=u"Use as many boards as you want.", creation_date=datetime.utcnow())]
     for i, c in enumerate(cards):
-        c.index = i
+        c.rank = (i + 1) * RANK_GAP
     column_2.cards = cards
     column_2.nb_max_cards = len(cards) + 2
     session.refresh(board)
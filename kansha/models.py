@@ -22,3 +22,34 @@ class Entity(EntityBase, pickle.UnpicklableMixin):
     @classmethod
     def exists(cls, **kw):
         return cls.query.filter_by(**kw).count() > 0
+
+
+# gap between the ranks of consecutive items, when they are numbered
+RANK_GAP = 1 << 16
+
+
+def rank_for(items, index):
+    """Return the rank of an item inserted at ``index`` in ``items``
+
+    The ranks leave room between the items, so that an insertion only writes
+    the inserted item. When there is no room left at ``index`` (after about
+    16 insertions at the same place), the ranks of ``items`` are spread again.
+
+    In:
+      - ``items`` -- the entities, ordered by their ``rank`` attribute
+      - ``index`` -- the position of the new item
+    """
+    index = max(0, min(index, len(items)))
+    if not items:
+        return RANK_GAP
+    if all(item.rank is not None for item in items[max(index - 1, 0):index + 1]):
+        if index == 0:
+            return items[0].rank - RANK_GAP
+        if index == len(items):
+            return items[-1].rank + RANK_GAP
+        before, after = items[index - 1].rank, items[index].rank
+        if after - before > 1:
+            return (before + after) // 2
+    for i, item in enumerate(items, 1):
+        item.rank = i * RANK_GAP
+    return index * RANK_GAP + RANK_GAP // 2
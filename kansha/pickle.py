@@ -9,7 +9,9 @@
 
 from __future__ import absolute_import
 
+import types
 import pickle
+import cStringIO
 
 from nagare import database
 
@@ -31,3 +33,48 @@ class UnpicklableMixin(object):
         raise pickle.PicklingError(
             'This object is not picklable: {!r}'.format(self)
         )
+
+
+class SizePickler(pickle.Pickler):
+    """Pickler which counts the bytes written for the instances of each class
+
+    The bytes of an object are counted for its class, except those of the
+    other instances it refers to: they are counted for their own classes.
+    """
+
+    def __init__(self, file, protocol=pickle.HIGHEST_PROTOCOL):
+        pickle.Pickler.__init__(self, file, protocol)
+        self.file = file
+        # {class name: bytes}
+        self.sizes = {}
+        # bytes of the nested instances, for each instance being pickled
+        self._nested = []
+
+    def save(self, obj):
+        # ``__class__`` of the instances of the old style classes too
+        cls = getattr(obj, '__class__', type(obj))
+        if isinstance(obj, (type, types.ClassType)) or (cls.__module__ == '__builtin__') or (id(obj) in self.memo):
+            return pickle.Pickler.save(self, obj)
+        start = self.file.tell()
+        self._nested.append(0)
+        try:
+            pickle.Pickler.save(self, obj)
+        finally:
+            nested = self._nested.pop()
+        size = self.file.tell() - start
+        name = '%s.%s' % (cls.__module__, cls.__name__)
+        self.sizes[name] = self.sizes.get(name, 0) + size - nested
+        if self._nested:
+            self._nested[-1] += size
+
+
+def pickled_sizes(obj):
+    """Return the pickled size of ``obj``, as stored in a session, and its bytes by class
+
+    Return:
+      - (total bytes, {class name: bytes})
+    """
+    f = cStringIO.StringIO()
+    pickler = SizePickler(f)
+    pickler.dump(obj)
+    return f.tell(), pickler.sizes
@@ -44,6 +44,14 @@ class ActionLog(object):
             user.data, action, data
         )
 
+    def add_histories(self, user, action, cards):
+        '''Bulk version of ``add_history``, for ``cards``: a list of (card, data)'''
+        DataHistory.add_histories(
+            self.board.data,
+            [(card.db_id, data) for card, data in cards],
+            user.data, action
+        )
+
     def delete_card(self):
         if not self._card:
             return
@@ -74,6 +82,9 @@ class DummyActionLog(ActionLog):
     def add_history(self, user, action, data):
         pass
 
+    def add_histories(self, user, action, cards):
+        pass
+
     def get_last_activity(self):
         return []
 
@@ -63,8 +63,28 @@ class DataHistory(Entity):
         when = datetime.utcnow()
         data = cls(
             when=when, action=action, board=board, card=card, user=user, data=data)
+        if board is not None:
+            board.last_activity = when
         database.session.flush()
 
+    @classmethod
+    def add_histories(cls, board, cards, user, action):
+        '''Bulk version of ``add_history``, with one ``executemany``
+
+        In:
+          - ``cards`` -- list of (card id, data)
+        '''
+        when = datetime.utcnow()
+        rows = [
+            {'when': when, 'action': action, 'data': dict(data, action=action), 'board_id': board.id,
+             'card_id': card_id, 'user_username': user.username, 'user_source': user.source}
+            for card_id, data in cards
+        ]
+        if rows:
+            board.last_activity = when
+            database.session.flush()
+            database.session.execute(cls.table.insert(), rows)
+
     @classmethod
     def get_events(cls, board, hours=None):
         '''board to None means "everything".'''
@@ -96,6 +116,8 @@ class DataHistory(Entity):
 
     @classmethod
     def purge(cls, card):
-        q = database.session.query(cls).filter(cls.card == card)
-        for log in q:
-            log.delete()
+        cls.delete_cards([card.id])
+
+    @classmethod
+    def delete_cards(cls, card_ids):
+        cls.query.filter(cls.card_id.in_(card_ids)).delete(synchronize_session=False)
@@ -36,6 +36,16 @@ class AssetsManager(Service):
         Return:
             - copied file id'''
 
+    def share(self, file_id):
+        '''Copy a file from its file_id, sharing its data with the source when possible.
+        Only the metadata and the cover of the copy can be changed afterwards.
+
+        In:
+            - ``file_id`` -- file id of the source file
+        Return:
+            - copied file id'''
+        return self.copy(file_id)
+
     def save(self, data, file_id=None, metadata={}):
         """Save data, metadata and return an id
 
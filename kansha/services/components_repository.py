@@ -31,6 +31,28 @@ class CardExtensions(plugins.Plugins):
         Return items as CardExtension instances for given card.
         """
         return [
-            (name, services_service(klass, card, action_log, self.CONFIGURATORS.get(name)))
-            for name, klass in self.items()
+            (name, self.instantiate_item(name, card, action_log, services_service))
+            for name in self.keys()
         ]
+
+    def instantiate_item(self, name, card, action_log, services_service):
+        """
+        Return the item ``name`` as a CardExtension instance for given card.
+        """
+        return services_service(self[name], card, action_log, self.CONFIGURATORS.get(name))
+
+    def preload(self, cards):
+        """
+        Bulk load extensions data for the given cards (DataCard instances).
+        Return a dict {card id: {extension class: value}}.
+        """
+        preloaded = dict((card.id, {}) for card in cards)
+        if not cards:
+            return preloaded
+        for name, klass in self.items():
+            values = klass.preload(cards)
+            if values is None:
+                continue
+            for card_id, value in values.iteritems():
+                preloaded[card_id][klass] = value
+        return preloaded
@@ -0,0 +1,16 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+'''
+Set-based deletion of the boards and of the cards.
+
+Big boards can be hidden right away and deleted in background, in chunked
+transactions, by a worker thread of the application or by the
+``deletion-worker`` command.
+'''
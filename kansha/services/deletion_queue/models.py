@@ -0,0 +1,68 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from elixir import using_options
+from elixir import Field, Integer, Unicode, DateTime
+
+from nagare import database
+
+from kansha.models import Entity
+
+
+class DataBoardDeletion(Entity):
+    '''Queue of the hidden boards to delete.
+
+    Not a foreign key: the board is deleted before its entry.
+    '''
+    using_options(tablename='board_deletion')
+
+    # seconds after which the board of a silent worker can be claimed by another one
+    CLAIM_TIMEOUT = 300
+
+    board_id = Field(Integer, unique=True, nullable=False)
+    claimed_by = Field(Unicode(255))
+    claimed_at = Field(DateTime)
+
+    @classmethod
+    def add(cls, board_id):
+        '''Queue a board, in the current transaction'''
+        database.session.execute(cls.table.insert(), {'board_id': board_id})
+
+    @classmethod
+    def claim(cls, worker):
+        '''Claim the oldest queued board not being deleted by another worker, in the current transaction
+
+        The claim is renewed by each call: the board stays claimed by ``worker`` while it drains it.
+
+        Return:
+          - the id of the claimed board, or None
+        '''
+        c = cls.table.c
+        now = datetime.utcnow()
+        claimable = sa.or_(c.claimed_by == None, c.claimed_by == worker,
+                           c.claimed_at < now - timedelta(seconds=cls.CLAIM_TIMEOUT))
+        candidates = database.session.query(c.id, c.board_id).filter(claimable).order_by(c.id).limit(10)
+        for entry_id, board_id in candidates.all():
+            # compare and set: another worker may have claimed it since it was read
+            claim = cls.table.update().where(c.id == entry_id).where(claimable)
+            if database.session.execute(claim.values(claimed_by=worker, claimed_at=now)).rowcount:
+                return board_id
+        return None
+
+    @classmethod
+    def remove(cls, board_id):
+        database.session.execute(cls.table.delete().where(cls.table.c.board_id == board_id))
+
+    @classmethod
+    def count(cls):
+        return database.session.query(cls.id).count()
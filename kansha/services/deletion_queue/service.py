@@ -0,0 +1,188 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import os
+import copy
+import time
+import socket
+import threading
+
+from nagare import database, log
+
+from kansha.card.comp import Card
+from kansha.card.models import DataCard
+from kansha.board.models import DataBoard
+from kansha.column.models import DataColumn
+from kansha.card.deletion import delete_cards
+
+from ..services_repository import Service
+from .models import DataBoardDeletion
+
+
+class DeletionQueue(Service):
+    '''
+    Deletion of the boards and of the cards, with a few statements per table.
+
+    The files of the deleted assets are deleted when the current request is
+    over (see ``flush``), once the transaction is committed, unless it is
+    rolled back (see ``cancel``).
+
+    When activated, the boards of ``min_cards`` cards or more are hidden right
+    away and actually deleted by ``drain``, ``chunk_size`` cards per
+    transaction, either by a thread of each application process
+    (``worker = thread``) or by the ``kansha-admin deletion-worker`` command
+    (``worker = process``). Each worker claims the board it deletes.
+    '''
+
+    LOAD_PRIORITY = 10
+    CONFIG_SPEC = {
+        'activated': 'boolean(default=False)',
+        'worker': 'option("thread", "process", default="thread")',
+        'period': 'float(default=10)',
+        'min_cards': 'integer(default=1000)',
+        'chunk_size': 'integer(default=500)'
+    }
+
+    def __init__(self, config_filename, error, activated, worker, period, min_cards, chunk_size):
+        super(DeletionQueue, self).__init__(config_filename, error)
+        self.activated = activated
+        self.worker = worker
+        self.period = period
+        self.min_cards = min_cards
+        self.chunk_size = chunk_size
+        self._outbox = threading.local()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _defer(self, files):
+        if not hasattr(self._outbox, 'files'):
+            self._outbox.files = []
+        self._outbox.files.extend(files)
+
+    def flush(self, assets_manager):
+        '''Actually delete the files of the assets deleted by the current request'''
+        files = getattr(self._outbox, 'files', None)
+        if files:
+            self._outbox.files = []
+            for file_id in files:
+                assets_manager.delete(file_id)
+
+    def cancel(self):
+        '''Keep the files of the current request, its transaction is rolled back'''
+        self._outbox.files = []
+
+    def delete_cards(self, card_ids, card_extensions, services_service, search_engine):
+        '''Delete cards and all their data. The search engine is not committed.'''
+        for card_id in card_ids:
+            search_engine.delete_document(Card.schema, 'card_' + str(card_id))
+        self._defer(delete_cards(card_extensions, services_service, card_ids))
+
+    def delete_board(self, board, card_extensions, services_service, search_engine):
+        '''Delete a board and all its data, or only hide it if it is deleted in background
+
+        In:
+          - ``board`` -- DataBoard instance
+        '''
+        if self.activated and board.count_cards() >= self.min_cards:
+            board.hide()
+            DataBoardDeletion.add(board.id)
+        else:
+            # in the current transaction, but without unbounded IN lists
+            deleted = False
+            while not deleted:
+                deleted, files = self.purge(board.id, card_extensions, services_service, search_engine,
+                                            self.chunk_size)
+                self._defer(files)
+            search_engine.commit()
+
+    @staticmethod
+    def purge(board_id, card_extensions, services_service, search_engine, chunk_size=None):
+        '''Delete the cards of a board, at most ``chunk_size`` of them, then the board once it has no cards left
+
+        The search engine is not committed.
+
+        Return:
+          - (True if the board is deleted, files of the assets manager to delete once the deletion is committed)
+        '''
+        q = database.session.query(DataCard.id).join(DataCard.column)
+        q = q.filter(DataColumn.board_id == board_id).order_by(DataCard.id)
+        if chunk_size:
+            q = q.limit(chunk_size)
+        card_ids = [card_id for card_id, in q]
+        for card_id in card_ids:
+            search_engine.delete_document(Card.schema, 'card_' + str(card_id))
+        files = delete_cards(card_extensions, services_service, card_ids)
+        if chunk_size and len(card_ids) == chunk_size:
+            return False, files
+        board = DataBoard.get(board_id)
+        if board is not None:
+            files.extend(board.purge())
+        DataBoardDeletion.remove(board_id)
+        return True, files
+
+    def drain(self, card_extensions, services_service, search_engine, assets_manager):
+        '''Delete a chunk of the oldest queued board not claimed by another worker and commit
+
+        Return:
+          - True if a board was claimed
+        '''
+        board_id = DataBoardDeletion.claim(u'%s:%d' % (socket.gethostname(), os.getpid()))
+        if board_id is None:
+            return False
+        __, files = self.purge(board_id, card_extensions, services_service, search_engine, self.chunk_size)
+        search_engine.commit()
+        database.session.commit()
+        for file_id in files:
+            assets_manager.delete(file_id)
+        return True
+
+    def run(self, search_engine, card_extensions, services_service, once=False):
+        '''Delete the queued boards, forever or until none is left if ``once``
+
+        In:
+          - ``search_engine`` -- the search engine of the application, not wrapped by the index queue
+        '''
+        # own connections to the index and own operations, queued if the index queue is activated
+        search_engine = services_service['index_queue'].wrap(copy.copy(search_engine))
+        assets_manager = services_service['assets_manager']
+        while True:
+            try:
+                drained = self.drain(card_extensions, services_service, search_engine, assets_manager)
+            except Exception:
+                log.exception('Board deletion failed')
+                database.session.rollback()
+                search_engine.cancel()
+                drained = False
+            finally:
+                database.session.remove()
+            if not drained:
+                if once:
+                    break
+                time.sleep(self.period)
+
+    def start_worker(self, app):
+        '''Start the worker thread of the application process, if configured'''
+        if self.activated and self.worker == 'thread' and self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self.run, name='deletion-worker',
+                        args=(app.search_engine, app.card_extensions, app._services)
+                    )
+                    self._thread.daemon = True
+                    self._thread.start()
+
+
+class DummyDeletionQueue(DeletionQueue):
+    '''For use in unit tests.'''
+
+    def __init__(self, activated=False, min_cards=1000, chunk_size=500):
+        super(DummyDeletionQueue, self).__init__('', None, activated=activated, worker='process', period=1,
+                                                 min_cards=min_cards, chunk_size=chunk_size)
@@ -8,6 +8,8 @@
 # this distribution.
 #--
 
+import uuid
+
 from nagare import log
 import pkg_resources
 
@@ -24,6 +26,9 @@ class DummyAssetsManager(AssetsManager):
         log.debug("%s" % metadata)
         return 'mock_id'
 
+    def copy(self, file_id):
+        return unicode(uuid.uuid4())
+
     def load(self, file_id):
         log.debug("Load Image")
         package = pkg_resources.Requirement.parse('kansha')
@@ -0,0 +1,16 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+'''
+Queue of the search index updates, applied out of the web requests.
+
+The cards to reindex are written to an outbox table, in the transaction of
+their changes, and the outbox is drained by a worker thread of the
+application or by the ``index-worker`` command.
+'''
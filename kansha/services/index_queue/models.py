@@ -0,0 +1,103 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+from elixir import using_options
+from elixir import Field, Integer
+from sqlalchemy import select
+
+from nagare import database
+
+from kansha.models import Entity
+
+
+class DataIndexUpdate(Entity):
+    '''Outbox of the cards to (re)index.
+
+    Not a foreign key: deleted cards must be removed from the index.
+    '''
+    using_options(tablename='index_update')
+
+    card_id = Field(Integer, index=True, nullable=False)
+
+    @classmethod
+    def add(cls, card_ids):
+        '''Queue cards, in the current transaction'''
+        if card_ids:
+            database.session.execute(cls.table.insert(), [{'card_id': card_id} for card_id in card_ids])
+
+    @classmethod
+    def get_batch(cls, size):
+        '''Return the oldest ``size`` updates, as (id, card id) tuples'''
+        q = database.session.query(cls.id, cls.card_id)
+        return q.order_by(cls.id).limit(size).all()
+
+    @classmethod
+    def remove(cls, ids):
+        '''Remove the updates ``ids``
+
+        Not a range: an update of a lower id can be committed after the batch is read.
+        '''
+        database.session.execute(cls.table.delete().where(cls.table.c.id.in_(ids)))
+
+    @classmethod
+    def count(cls):
+        return database.session.query(cls.id).count()
+
+
+class DataIndexCapture(Entity):
+    '''Cards indexed while the index is rebuilt in a shadow collection.
+
+    The capture is open while a row without card id exists: then the updates
+    applied by the queue workers are recorded here, to be replayed in the
+    shadow collection.
+    '''
+    using_options(tablename='index_capture')
+
+    card_id = Field(Integer, nullable=True)
+
+    @classmethod
+    def open(cls):
+        database.session.execute(cls.table.delete())
+        database.session.execute(cls.table.insert(), {'card_id': None})
+
+    @classmethod
+    def record(cls, update_ids):
+        '''Record the queued updates ``update_ids``, if the capture is open
+
+        The open capture is locked until the end of the transaction: ``close``
+        waits for the updates being applied.
+        '''
+        capture = cls.table
+        opened = database.session.execute(
+            capture.update().where(capture.c.card_id == None).values(card_id=None)
+        ).rowcount
+        if opened:
+            update = DataIndexUpdate.table
+            updates = select([update.c.card_id]).where(update.c.id.in_(update_ids))
+            database.session.execute(capture.insert().from_select(['card_id'], updates))
+
+    @classmethod
+    def get_batch(cls, size):
+        '''Return the oldest ``size`` captured updates, as (id, card id) tuples'''
+        q = database.session.query(cls.id, cls.card_id).filter(cls.card_id != None)
+        return q.order_by(cls.id).limit(size).all()
+
+    @classmethod
+    def remove(cls, ids):
+        '''Remove the captured updates ``ids``'''
+        database.session.execute(cls.table.delete().where(cls.table.c.id.in_(ids)))
+
+    @classmethod
+    def close(cls):
+        '''Stop capturing, once the transactions recording updates are over
+
+        The updates captured so far are left to be replayed.
+        '''
+        database.session.execute(cls.table.delete().where(cls.table.c.card_id == None))
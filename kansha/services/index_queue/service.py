@@ -0,0 +1,198 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import copy
+import time
+import threading
+
+from nagare import database, log
+
+from kansha.card.comp import Card
+from kansha.card.models import DataCard
+from kansha.card.indexing import card_rows, build_documents
+
+from ..services_repository import Service
+from .models import DataIndexUpdate, DataIndexCapture
+
+
+class QueuedSearchEngine(object):
+    '''Search engine whose index updates are queued to the outbox.
+
+    With ``commit(sync=True)``, the index is updated right away too, for
+    the users waiting for the results of their search.
+    '''
+
+    def __init__(self, search_engine):
+        self.search_engine = search_engine
+        # operations of each thread, until committed: the engine is shared by the requests of the process
+        self._local = threading.local()
+
+    # be persistence friendly
+    def __getstate__(self):
+        return self.search_engine
+
+    def __setstate__(self, search_engine):
+        self.__init__(search_engine)
+
+    @property
+    def _operations(self):
+        if not hasattr(self._local, 'operations'):
+            self._local.operations = []
+        return self._local.operations
+
+    def add_document(self, document):
+        self._operations.append(('add_document', document._id, (document,)))
+
+    def update_document(self, document):
+        self._operations.append(('update_document', document._id, (document,)))
+
+    def add_documents(self, documents, replace=False):
+        for document in documents:
+            self._operations.append(('add_documents', document._id, ([document], replace)))
+
+    def delete_document(self, schema, docid):
+        self._operations.append(('delete_document', docid, (schema, docid)))
+
+    def commit(self, sync=False):
+        operations = self._operations
+        self._local.operations = []
+        # card documents ids are 'card_<card id>'
+        DataIndexUpdate.add(sorted(set(int(docid.split('_', 1)[1]) for __, docid, __ in operations)))
+        if sync and operations:
+            for method, __, args in operations:
+                getattr(self.search_engine, method)(*args)
+            self.search_engine.commit(True)
+
+    def cancel(self):
+        self._local.operations = []
+        # the transaction of a sync commit that failed
+        self.search_engine.cancel()
+
+    def search(self, query, size=20, snippets=False):
+        return self.search_engine.search(query, size, snippets)
+
+
+class IndexQueue(Service):
+    '''
+    Queue of the search index updates.
+
+    When activated, the components are given a ``QueuedSearchEngine`` and the
+    queued updates are applied by ``drain``, in batches, either by a thread of
+    each application process (``worker = thread``) or by the
+    ``kansha-admin index-worker`` command (``worker = process``).
+
+    While ``create-index --shadow`` rebuilds the index, the applied updates are
+    also captured, to be replayed in the new index (see ``replay``).
+    '''
+
+    LOAD_PRIORITY = 10
+    CONFIG_SPEC = {
+        'activated': 'boolean(default=False)',
+        'worker': 'option("thread", "process", default="thread")',
+        'period': 'float(default=1)',
+        'batch_size': 'integer(default=500)'
+    }
+
+    def __init__(self, config_filename, error, activated, worker, period, batch_size):
+        super(IndexQueue, self).__init__(config_filename, error)
+        self.activated = activated
+        self.worker = worker
+        self.period = period
+        self.batch_size = batch_size
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def wrap(self, search_engine):
+        '''Return the search engine the components must use'''
+        return QueuedSearchEngine(search_engine) if self.activated else search_engine
+
+    def drain(self, search_engine, card_extensions, services_service):
+        '''Apply a batch of queued updates to the index and commit them
+
+        Repeated updates of a card are applied once.
+
+        Return:
+          - the number of updates applied
+        '''
+        updates = DataIndexUpdate.get_batch(self.batch_size)
+        if not updates:
+            return 0
+        update_ids = [update_id for update_id, __ in updates]
+        # captured before being applied: if the index is swapped meanwhile, they are replayed in the new one
+        DataIndexCapture.record(update_ids)
+        DataIndexUpdate.remove(update_ids)
+        # updates applied twice, if we crash now, are harmless
+        self.apply(search_engine, card_extensions, services_service, set(card_id for __, card_id in updates))
+        database.session.commit()
+        return len(updates)
+
+    def replay(self, search_engine, card_extensions, services_service):
+        """Apply the captured updates to ``search_engine``, until none is left
+
+        Return:
+          - the number of updates applied
+        """
+        count = 0
+        while True:
+            updates = DataIndexCapture.get_batch(self.batch_size)
+            if not updates:
+                return count
+            self.apply(search_engine, card_extensions, services_service, set(card_id for __, card_id in updates))
+            DataIndexCapture.remove([capture_id for capture_id, __ in updates])
+            database.session.commit()
+            count += len(updates)
+
+    @staticmethod
+    def apply(search_engine, card_extensions, services_service, card_ids):
+        """Reindex the cards ``card_ids`` and commit. Cards that no longer exist are removed."""
+        batch = card_rows().filter(DataCard.id.in_(card_ids)).all()
+        for card_id in card_ids.difference(card_id for card_id, __, __, __ in batch):
+            search_engine.delete_document(Card.schema, 'card_' + str(card_id))
+        search_engine.add_documents(build_documents(card_extensions, services_service, batch), replace=True)
+        search_engine.commit()
+
+    def run(self, search_engine, card_extensions, services_service, once=False):
+        '''Drain the queue, forever or until it is empty if ``once``'''
+        # own connections to the index
+        search_engine = copy.copy(search_engine)
+        while True:
+            try:
+                drained = self.drain(search_engine, card_extensions, services_service)
+            except Exception:
+                log.exception('Search index update failed')
+                database.session.rollback()
+                search_engine.cancel()
+                drained = 0
+            finally:
+                database.session.remove()
+            if drained < self.batch_size:
+                if once:
+                    break
+                time.sleep(self.period)
+
+    def start_worker(self, app):
+        '''Start the worker thread of the application process, if configured'''
+        if self.activated and self.worker == 'thread' and self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self.run, name='index-worker',
+                        args=(app.search_engine, app.card_extensions, app._services)
+                    )
+                    self._thread.daemon = True
+                    self._thread.start()
+
+
+class DummyIndexQueue(IndexQueue):
+    '''For use in unit tests.'''
+
+    def __init__(self, activated=False):
+        super(DummyIndexQueue, self).__init__('', None, activated=activated, worker='process',
+                                              period=1, batch_size=500)
@@ -0,0 +1,189 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import os
+import sys
+import time
+import bisect
+import random
+import threading
+
+from nagare import component
+
+from .services_repository import Service
+
+
+# upper bounds of the buckets of the render durations, in milliseconds
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float('inf'))
+
+
+class Profiler(Service):
+    '''
+    Sampling profiler for the production servers.
+
+    A ``rate`` of the requests are profiled: the stacks of their threads are
+    sampled ``frequency`` times per second by a background thread, and the
+    renderings of their components are timed, by class and model.
+
+    Every ``period`` seconds, the counts of the process are written in
+    ``output_dir``:
+      - ``profile-<pid>.stacks``: the collapsed stacks and their number of
+        samples, as expected by ``flamegraph.pl``
+      - ``profile-<pid>.renders``: by component class and model, the number
+        of renderings in each bucket of duration
+    '''
+
+    LOAD_PRIORITY = 10
+    CONFIG_SPEC = {
+        'activated': 'boolean(default=False)',
+        'rate': 'float(default=0.01)',
+        'frequency': 'integer(default=100)',
+        'period': 'integer(default=60)',
+        'output_dir': 'string(default="")'
+    }
+
+    def __init__(self, config_filename, error, activated, rate, frequency, period, output_dir):
+        super(Profiler, self).__init__(config_filename, error)
+        self.activated = activated
+        self.rate = rate
+        self.interval = 1.0 / frequency
+        self.period = period
+        self.output_dir = output_dir
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # ids of the threads of the profiled requests
+        self._threads = set()
+        self._wake_up = threading.Event()
+        self._sampler = None
+        # {collapsed stack: samples}
+        self.stacks = {}
+        # {(class name, model): [renderings by bucket]}
+        self.renders = {}
+        # {code object: frame name}
+        self._names = {}
+        self._written = time.time()
+        if activated:
+            self._time_renders()
+
+    def _time_renders(self):
+        '''Time the renderings of the components of the profiled requests'''
+        render = component.Component.render.im_func
+        if getattr(render, 'profiler', None) is not None:
+            # already timed by another instance of the service
+            render.profiler = self
+            return
+
+        def timed_render(comp, renderer, *args, **kw):
+            profiler = timed_render.profiler
+            if not getattr(profiler._local, 'profiled', False):
+                return render(comp, renderer, *args, **kw)
+            start = time.time()
+            try:
+                return render(comp, renderer, *args, **kw)
+            finally:
+                model = args[0] if args else kw.get('model', 0)
+                if model == 0:
+                    # the current model of the component
+                    model = getattr(comp, 'model', None)
+                profiler.record(comp().__class__.__name__, model, time.time() - start)
+        timed_render.profiler = self
+        component.Component.render = timed_render
+
+    def record(self, class_name, model, duration):
+        '''Count a rendering of ``duration`` seconds'''
+        bucket = bisect.bisect_left(BUCKETS, duration * 1000)
+        with self._lock:
+            counts = self.renders.setdefault((class_name, model or None), [0] * len(BUCKETS))
+            counts[bucket] += 1
+
+    def _name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            package = os.path.basename(os.path.dirname(code.co_filename))
+            name = self._names[code] = '%s.%s:%s' % (package, module, code.co_name)
+        return name
+
+    def collapse(self, frame):
+        '''Stack of ``frame``, from the root, as ``root;caller;callee``'''
+        names = []
+        while frame is not None:
+            names.append(self._name(frame.f_code))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _sample(self):
+        while True:
+            with self._lock:
+                threads = list(self._threads)
+                if not threads:
+                    self._wake_up.clear()
+            if not threads:
+                self._wake_up.wait()
+                continue
+            frames = sys._current_frames()
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stack = self.collapse(frame)
+                    with self._lock:
+                        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            del frames
+            time.sleep(self.interval)
+
+    def start(self):
+        '''Profile the current request, with a probability of ``rate``'''
+        if not self.activated or random.random() >= self.rate:
+            return
+        self._local.profiled = True
+        with self._lock:
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name='profiler')
+                self._sampler.daemon = True
+                self._sampler.start()
+            self._threads.add(threading.current_thread().ident)
+            self._wake_up.set()
+
+    def stop(self):
+        '''End of the current request, write the counts if it's time'''
+        if not getattr(self._local, 'profiled', False):
+            return
+        self._local.profiled = False
+        with self._lock:
+            self._threads.discard(threading.current_thread().ident)
+        if time.time() - self._written > self.period:
+            self.write()
+
+    def write(self):
+        '''Write the counts of the process in ``output_dir``'''
+        self._written = time.time()
+        with self._lock:
+            stacks = sorted(self.stacks.iteritems())
+            renders = sorted(self.renders.iteritems())
+        path = os.path.join(self.output_dir or os.getcwd(), 'profile-%d' % os.getpid())
+        with open(path + '.stacks.tmp', 'w') as f:
+            for stack, samples in stacks:
+                f.write('%s %d\n' % (stack, samples))
+        with open(path + '.renders.tmp', 'w') as f:
+            labels = ['<=%gms' % bound for bound in BUCKETS[:-1]] + ['>%gms' % BUCKETS[-2]]
+            f.write('component\tmodel\t%s\n' % '\t'.join(labels))
+            for (class_name, model), counts in renders:
+                f.write('%s\t%s\t%s\n' % (class_name, model or '', '\t'.join(str(count) for count in counts)))
+        os.rename(path + '.stacks.tmp', path + '.stacks')
+        os.rename(path + '.renders.tmp', path + '.renders')
+
+
+class DummyProfiler(Profiler):
+    '''For use in unit tests.'''
+
+    def __init__(self, rate=1.0, frequency=100, output_dir=''):
+        super(DummyProfiler, self).__init__(
+            '', None, activated=True, rate=rate, frequency=frequency, period=3600, output_dir=output_dir
+        )
@@ -0,0 +1,23 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+'''
+Push notifications of changes to the browsers, over long-poll or Server-Sent Events.
+
+The messages are dispatched between processes by plugin based brokers.
+Available plugins are registered as entry points in distribution.
+'''
+
+import pkg_resources
+
+
+def Broker(broker='local', **config):
+    entry = pkg_resources.load_entry_point(
+        'kansha', 'push.brokers', broker)
+    return entry(**config)
@@ -0,0 +1,262 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+'''
+Benchmark of the fan-out of the push notifications in a process:
+
+    python -m kansha.services.push.benchmark [subscribers [boards]]
+
+Each subscriber is a thread waiting on a board, as a long-poll or
+Server-Sent Events request would.
+
+Benchmark of the push server, answering real connections from its single thread:
+
+    python -m kansha.services.push.benchmark server [subscribers [longpoll|sse]]
+
+Benchmark of the WSGI push endpoint (``server = wsgi``), served with the other
+requests by a server of a fixed number of threads:
+
+    python -m kansha.services.push.benchmark endpoint [subscribers [max_waiters]]
+'''
+
+import sys
+import json
+import time
+import Queue
+import select
+import socket
+import urllib2
+import resource
+import threading
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+from .hub import Hub
+from .server import PushServer
+from .service import PushNotifications
+
+
+def fan_out(subscribers, boards=1, timeout=60):
+    '''Publish a new version of ``boards`` boards followed by ``subscribers`` waiting threads
+
+    Return:
+      - the number of woken subscribers and the time, in seconds, from the
+        publication to the last wake up
+    '''
+    hub = Hub()
+    woken = []
+    lock = threading.Lock()
+
+    def subscriber(channel):
+        version = hub.wait(channel, 0, timeout)
+        end = time.time()
+        if version is not None:
+            with lock:
+                woken.append(end)
+
+    # keep the memory of the threads low
+    threading.stack_size(256 * 1024)
+    try:
+        threads = [
+            threading.Thread(target=subscriber, args=(u'board/%d' % (i % boards),))
+            for i in xrange(subscribers)
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+    finally:
+        threading.stack_size(0)
+    while hub.count_waiters() < subscribers:
+        time.sleep(0.01)
+
+    start = time.time()
+    for i in xrange(boards):
+        hub.dispatch(u'board/%d' % i, 1)
+    for thread in threads:
+        thread.join(timeout)
+    return len(woken), (max(woken) - start) if woken else None
+
+
+def server(subscribers, stream=False, timeout=10):
+    '''Open ``subscribers`` connections waiting on a board to the push server, then publish a version
+
+    Return:
+      - the number of notified subscribers, the number of threads of the process while they
+        wait and the time, in seconds, from the publication to the last notification
+    '''
+    # both ends of the connections are in this process
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = 2 * subscribers + 100
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (needed if hard == resource.RLIM_INFINITY else min(needed, hard), hard))
+
+    hub = Hub()
+    push_server = PushServer(hub, '127.0.0.1', 0, timeout, timeout)
+    thread = threading.Thread(target=push_server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    request = 'GET /push/board/1?version=0 HTTP/1.1\r\nHost: localhost\r\n%s\r\n' % (
+        'Accept: text/event-stream\r\n' if stream else '')
+    notification = '"version": 1'
+    clients = {}
+    woken = []
+    try:
+        for __ in xrange(subscribers):
+            client = socket.create_connection(push_server.address, timeout)
+            client.sendall(request)
+            clients[client.fileno()] = client
+        deadline = time.time() + timeout
+        while hub.count_waiters() < subscribers and time.time() < deadline:
+            time.sleep(0.01)
+        threads = threading.active_count()
+
+        poll = select.poll()
+        for fd in clients:
+            poll.register(fd, select.POLLIN)
+        answers = dict.fromkeys(clients, '')
+        pending = set(clients)
+
+        start = time.time()
+        hub.dispatch(u'board/1', 1)
+        deadline = start + timeout
+        while pending and time.time() < deadline:
+            for fd, __ in poll.poll(max(0, deadline - time.time()) * 1000):
+                data = clients[fd].recv(4096)
+                answers[fd] += data
+                if notification in answers[fd]:
+                    woken.append(time.time())
+                if not data or notification in answers[fd]:
+                    poll.unregister(fd)
+                    pending.discard(fd)
+    finally:
+        for client in clients.itervalues():
+            client.close()
+        push_server.shutdown()
+        thread.join(timeout)
+    return len(woken), threads, (max(woken) - start) if woken else None
+
+
+class PooledWSGIServer(WSGIServer):
+    '''WSGI server answering the requests with a fixed number of threads, as the production servers do'''
+
+    def __init__(self, server_address, handler, threads):
+        WSGIServer.__init__(self, server_address, handler)
+        self.requests = Queue.Queue()
+        for __ in xrange(threads):
+            thread = threading.Thread(target=self.work)
+            thread.daemon = True
+            thread.start()
+
+    def process_request(self, request, client_address):
+        self.requests.put((request, client_address))
+
+    def work(self):
+        while True:
+            request, client_address = self.requests.get()
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+def endpoint(subscribers, max_waiters=5, threads=10, timeout=5):
+    '''Send ``subscribers`` long-poll requests to the push endpoint, then a regular request, then publish a version
+
+    Return:
+      - the number of notified subscribers, the number of refused ones, the time, in seconds,
+        to answer the regular request and the time from the publication to the last notification
+    '''
+    push = PushNotifications('', None, activated=True, broker='local', socket_dir='', server='wsgi',
+                             host='127.0.0.1', port=0, timeout=timeout, stream_duration=timeout,
+                             max_waiters=max_waiters, retry_delay=1)
+
+    def app(environ, start_response):
+        if environ['PATH_INFO'].startswith('/push/'):
+            return push.handle_request(environ, start_response, u'board/1')
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return ['OK']
+
+    server = PooledWSGIServer(('127.0.0.1', 0), QuietHandler, threads)
+    server.set_app(app)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:%d' % server.server_port
+
+    woken = []
+    refused = []
+    lock = threading.Lock()
+
+    def subscriber():
+        try:
+            # queued behind the waiting requests when the threads of the server are exhausted
+            answer = urllib2.urlopen(url + '/push/board/1?version=0', timeout=timeout * 10).read()
+            end = time.time()
+            if json.loads(answer)['version'] is not None:
+                with lock:
+                    woken.append(end)
+        except urllib2.HTTPError as e:
+            if e.code == 503:
+                with lock:
+                    refused.append(e.headers.get('Retry-After'))
+        except IOError:
+            pass
+
+    clients = [threading.Thread(target=subscriber) for __ in xrange(subscribers)]
+    try:
+        for client in clients:
+            client.daemon = True
+            client.start()
+        # the subscribers are either waiting or refused, unless the threads of the server are exhausted
+        deadline = time.time() + 1
+        while push.hub.count_waiters() + len(refused) < subscribers and time.time() < deadline:
+            time.sleep(0.01)
+
+        start = time.time()
+        urllib2.urlopen(url + '/', timeout=timeout * 10).read()
+        latency = time.time() - start
+
+        start = time.time()
+        push.publish(u'board/1', 1)
+        push.flush()
+        for client in clients:
+            client.join(timeout * 10)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return len(woken), len(refused), latency, (max(woken) - start) if woken else None
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['server']:
+        subscribers = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+        stream = sys.argv[3:4] == ['sse']
+        woken, threads, latency = server(subscribers, stream)
+        print '%d/%d %s subscribers notified in %.1f ms, by a process of %d threads' % (
+            woken, subscribers, 'sse' if stream else 'long-poll', (latency or 0) * 1000, threads)
+    elif sys.argv[1:2] == ['endpoint']:
+        subscribers = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+        max_waiters = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+        woken, refused, latency, notification = endpoint(subscribers, max_waiters)
+        print '%d/%d subscribers notified in %.1f ms, %d refused, a regular request answered in %.1f ms' % (
+            woken, subscribers, (notification or 0) * 1000, refused, latency * 1000)
+    else:
+        subscribers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+        boards = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+        woken, latency = fan_out(subscribers, boards)
+        print '%d/%d subscribers of %d board(s) notified in %.1f ms' % (
+            woken, subscribers, boards, (latency or 0) * 1000)
@@ -0,0 +1,85 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import os
+import errno
+import socket
+import threading
+
+from nagare import log
+
+
+class LocalBroker(object):
+    '''In process broker: use it when the application is served by a single process'''
+
+    def __init__(self, **config):
+        self.hub = None
+
+    def start(self, hub):
+        self.hub = hub
+
+    def publish(self, channel, version):
+        self.hub.dispatch(channel, version)
+
+
+class SocketBroker(LocalBroker):
+    '''Broker between the processes of a host.
+
+    Each process listens on its own unix datagram socket in ``socket_dir``
+    and a message is sent to all the sockets found there.
+    '''
+
+    def __init__(self, socket_dir, **config):
+        super(SocketBroker, self).__init__(**config)
+        self.socket_dir = socket_dir
+        self.path = None
+        self.sender = None
+
+    def start(self, hub):
+        super(SocketBroker, self).start(hub)
+        if not os.path.isdir(self.socket_dir):
+            os.makedirs(self.socket_dir)
+        self.path = os.path.join(self.socket_dir, '%d.sock' % os.getpid())
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(self.path)
+        self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        listener = threading.Thread(target=self._listen, args=(receiver,), name='push-listener')
+        listener.daemon = True
+        listener.start()
+
+    def _listen(self, receiver):
+        while True:
+            message = receiver.recv(4096)
+            try:
+                channel, version = message.rsplit(' ', 1)
+                self.hub.dispatch(channel.decode('utf-8'), int(version))
+            except ValueError:
+                log.warning('Invalid push message %r' % message)
+
+    def publish(self, channel, version):
+        self.hub.dispatch(channel, version)
+        message = '%s %d' % (channel.encode('utf-8'), version)
+        for name in os.listdir(self.socket_dir):
+            path = os.path.join(self.socket_dir, name)
+            if path == self.path or not name.endswith('.sock'):
+                continue
+            try:
+                self.sender.sendto(message, path)
+            except socket.error as e:
+                if e.errno in (errno.ECONNREFUSED, errno.ENOENT):
+                    # the process is gone
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                else:
+                    log.warning('Cannot push to %s: %s' % (path, e))
@@ -0,0 +1,129 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import time
+import heapq
+import threading
+
+
+class _Waiter(object):
+    '''A request waiting for a new version of a channel'''
+
+    def __init__(self, channel, deadline, callback):
+        self.channel = channel
+        self.deadline = deadline
+        self.callback = callback
+        self.woken = False
+
+
+class Hub(object):
+    '''Per process registry of the requests waiting on channels.
+
+    The last version published on each channel is kept, so that a client
+    that missed a notification between two requests gets it right away.
+    '''
+
+    # granularity of the timeouts, in seconds
+    REAPER_PERIOD = 1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}
+        self._versions = {}
+        self._deadlines = []
+        self._reaper = None
+
+    def dispatch(self, channel, version):
+        '''Wake up all the requests waiting on ``channel``'''
+        with self._lock:
+            self._versions[channel] = version
+            waiters = self._waiters.pop(channel, ())
+            for waiter in waiters:
+                waiter.woken = True
+        for waiter in waiters:
+            waiter.callback(version)
+
+    def subscribe(self, channel, version, callback, timeout):
+        '''Call ``callback`` with the next version of ``channel`` other than ``version``,
+        or with None when ``timeout`` (in seconds) expires
+
+        The callback is called from the publishing thread or from the reaper: it must not block.
+
+        Return:
+          - the subscription, to ``unsubscribe``, or None if ``callback`` was called right away
+        '''
+        with self._lock:
+            current = self._versions.get(channel)
+            if current is None or current == version:
+                waiter = _Waiter(channel, time.time() + timeout, callback)
+                self._waiters.setdefault(channel, set()).add(waiter)
+                heapq.heappush(self._deadlines, (waiter.deadline, id(waiter), waiter))
+                self._start_reaper()
+                return waiter
+        callback(current)
+        return None
+
+    def unsubscribe(self, waiter):
+        '''Forget a subscription, its request is gone'''
+        with self._lock:
+            if not waiter.woken:
+                waiter.woken = True
+                self._discard(waiter)
+
+    def wait(self, channel, version, timeout):
+        '''Block until another version than ``version`` is published on ``channel``
+
+        Return:
+          - the new version or None if ``timeout`` (in seconds) expired
+        '''
+        # a plain lock blocks without polling, unlike a condition with a timeout
+        lock = threading.Lock()
+        lock.acquire()
+        versions = []
+
+        def wake(new_version):
+            versions.append(new_version)
+            lock.release()
+
+        self.subscribe(channel, version, wake, timeout)
+        lock.acquire()
+        return versions[0]
+
+    def count_waiters(self):
+        with self._lock:
+            return sum(len(waiters) for waiters in self._waiters.itervalues())
+
+    def _discard(self, waiter):
+        waiters = self._waiters[waiter.channel]
+        waiters.discard(waiter)
+        if not waiters:
+            del self._waiters[waiter.channel]
+
+    def _start_reaper(self):
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap, name='push-reaper')
+            self._reaper.daemon = True
+            self._reaper.start()
+
+    def _reap(self):
+        '''Wake up the requests that waited for too long'''
+        while True:
+            time.sleep(self.REAPER_PERIOD)
+            now = time.time()
+            expired = []
+            with self._lock:
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    __, __, waiter = heapq.heappop(self._deadlines)
+                    if not waiter.woken:
+                        waiter.woken = True
+                        self._discard(waiter)
+                        expired.append(waiter)
+            for waiter in expired:
+                waiter.callback(None)
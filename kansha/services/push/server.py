@@ -0,0 +1,297 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+'''
+Push server: answers the long-poll and Server-Sent Events requests of the
+browsers from a single thread, whatever the number of waiting requests.
+
+The web server in front of the application routes ``<application url>/push/``
+to it.
+'''
+
+import os
+import json
+import time
+import errno
+import fcntl
+import select
+import socket
+import urllib
+import asyncore
+import asynchat
+import urlparse
+import collections
+from functools import partial
+
+from nagare import log
+
+
+LONG_POLL_HEADERS = (
+    'HTTP/1.1 200 OK\r\n'
+    'Content-Type: application/json\r\n'
+    'Cache-Control: no-cache\r\n'
+    'Content-Length: %d\r\n'
+    'Connection: close\r\n\r\n'
+)
+
+STREAM_HEADERS = (
+    'HTTP/1.1 200 OK\r\n'
+    'Content-Type: text/event-stream\r\n'
+    'Cache-Control: no-cache\r\n'
+    # don't let nginx buffer the stream
+    'X-Accel-Buffering: no\r\n'
+    'Connection: close\r\n\r\n'
+    'retry: 3000\n\n'
+)
+
+ERROR_HEADERS = (
+    'HTTP/1.1 %s\r\n'
+    'Content-Length: 0\r\n'
+    'Connection: close\r\n\r\n'
+)
+
+
+class _Wakeup(asyncore.file_dispatcher):
+    '''Wakes the loop up when the hub delivers versions from another thread'''
+
+    def __init__(self, server):
+        reader, self.writer = os.pipe()
+        fcntl.fcntl(self.writer, fcntl.F_SETFL, fcntl.fcntl(self.writer, fcntl.F_GETFL) | os.O_NONBLOCK)
+        asyncore.file_dispatcher.__init__(self, reader, server.map)
+        # the dispatcher has its own copy
+        os.close(reader)
+        self.server = server
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        self.recv(4096)
+        self.server.deliver_all()
+
+    def wake(self):
+        try:
+            os.write(self.writer, 'x')
+        except OSError as e:
+            # the pipe is full: the loop is already woken up
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def close(self):
+        asyncore.file_dispatcher.close(self)
+        os.close(self.writer)
+
+
+class PushConnection(asynchat.async_chat):
+    '''A browser waiting for the new versions of a board'''
+
+    # a GET with a few headers
+    MAX_REQUEST_SIZE = 16 * 1024
+
+    def __init__(self, sock, server):
+        asynchat.async_chat.__init__(self, sock, server.map)
+        self.server = server
+        self.set_terminator('\r\n\r\n')
+        self.request = []
+        self.request_size = 0
+        self.channel = None
+        self.version = None
+        # end of the Server-Sent Events stream, None for a long-poll request
+        self.stream_end = None
+        self.subscription = None
+        self.subscriptions = 0
+        self.closed = False
+
+    def collect_incoming_data(self, data):
+        # nothing is expected from the browser once the request is read
+        if self.request is not None:
+            self.request_size += len(data)
+            if self.request_size > self.MAX_REQUEST_SIZE:
+                self.error('431 Request Header Fields Too Large')
+            else:
+                self.request.append(data)
+
+    def found_terminator(self):
+        if self.request is None:
+            return
+        lines = ''.join(self.request).split('\r\n')
+        self.request = None
+        self.set_terminator(None)
+        try:
+            method, target = lines[0].split(' ')[:2]
+        except ValueError:
+            return self.error('400 Bad Request')
+        headers = dict(
+            (name.strip().lower(), value.strip())
+            for name, __, value in (line.partition(':') for line in lines[1:])
+        )
+
+        path, __, query = target.partition('?')
+        path = urllib.unquote(path).split('/')
+        if method != 'GET' or len(path) < 4 or path[-3:-1] != ['push', 'board']:
+            return self.error('404 Not Found')
+        try:
+            self.channel = u'board/' + path[-1].decode('utf-8')
+            self.version = int(urlparse.parse_qs(query).get('version', ['0'])[0])
+        except ValueError:
+            return self.error('400 Bad Request')
+
+        if 'text/event-stream' in headers.get('accept', ''):
+            self.stream_end = time.time() + self.server.stream_duration
+            self.push(STREAM_HEADERS)
+        self.server.subscribe(self)
+
+    def notify(self, version):
+        '''Answer ``version``, None when the subscription timed out'''
+        self.subscription = None
+        if self.stream_end is None:
+            body = json.dumps({'version': version})
+            self.push(LONG_POLL_HEADERS % len(body) + body)
+            self.close_when_done()
+            return
+
+        if version is None:
+            self.push(': keep-alive\n\n')
+        else:
+            self.version = version
+            self.push('data: %s\n\n' % json.dumps({'version': version}))
+        if time.time() < self.stream_end:
+            self.server.subscribe(self)
+        else:
+            # the browser reconnects by itself
+            self.close_when_done()
+
+    def error(self, status):
+        self.request = None
+        self.set_terminator(None)
+        self.push(ERROR_HEADERS % status)
+        self.close_when_done()
+
+    def handle_error(self):
+        log.exception('Push connection error')
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if self.subscription is not None:
+                self.server.hub.unsubscribe(self.subscription)
+                self.subscription = None
+            asynchat.async_chat.close(self)
+
+
+class PushServer(asyncore.dispatcher):
+    '''HTTP server of the push notifications, on top of ``Hub``
+
+    A single thread runs the loop (``serve_forever``): the waiting requests
+    only hold a connection and a subscription to the hub. With epoll, only
+    the connections with something to do are looked at by each iteration.
+    '''
+
+    # the loop is woken up by the hub: this only bounds the time to notice ``shutdown``
+    POLL_TIMEOUT = 30
+
+    def __init__(self, hub, host, port, timeout, stream_duration, backlog=1024):
+        self.map = {}
+        asyncore.dispatcher.__init__(self, map=self.map)
+        self.hub = hub
+        self.timeout = timeout
+        self.stream_duration = stream_duration
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(backlog)
+        self.address = self.socket.getsockname()
+        self._deliveries = collections.deque()
+        self._wakeup = _Wakeup(self)
+        self._serving = False
+        self._epoll = None
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            self._update(PushConnection(pair[0], self))
+
+    def handle_error(self):
+        log.exception('Push server error')
+
+    def subscribe(self, connection):
+        '''Wait for the next version of the channel of ``connection``, from the loop'''
+        timeout = self.timeout
+        if connection.stream_end is not None:
+            timeout = max(0, min(timeout, connection.stream_end - time.time()))
+        connection.subscriptions += 1
+        connection.subscription = self.hub.subscribe(
+            connection.channel, connection.version,
+            partial(self._deliver, connection, connection.subscriptions), timeout
+        )
+
+    def _deliver(self, connection, subscription, version):
+        # called from the thread of the publisher or of the reaper: hand over to the loop
+        self._deliveries.append((connection, subscription, version))
+        self._wakeup.wake()
+
+    def deliver_all(self):
+        '''Answer the versions delivered by the hub, from the loop'''
+        while self._deliveries:
+            connection, subscription, version = self._deliveries.popleft()
+            # the browser may have gone or subscribed again
+            if not connection.closed and connection.subscriptions == subscription:
+                connection.notify(version)
+                self._update(connection)
+
+    def _update(self, dispatcher):
+        '''Register the events ``dispatcher`` now waits for'''
+        fd = dispatcher._fileno
+        if self._epoll is None or self.map.get(fd) is not dispatcher:
+            # closed: its descriptor left the epoll set with it
+            return
+        flags = 0
+        if dispatcher.readable():
+            flags |= select.EPOLLIN | select.EPOLLPRI
+        if dispatcher.writable() and not dispatcher.accepting:
+            flags |= select.EPOLLOUT
+        registered = getattr(dispatcher, 'epoll_flags', None)
+        if registered is None:
+            self._epoll.register(fd, flags)
+        elif registered != flags:
+            self._epoll.modify(fd, flags)
+        dispatcher.epoll_flags = flags
+
+    def serve_forever(self):
+        self._serving = True
+        if not hasattr(select, 'epoll'):
+            while self._serving:
+                asyncore.loop(self.POLL_TIMEOUT, True, self.map, 1)
+        else:
+            self._epoll = select.epoll()
+            for dispatcher in self.map.values():
+                self._update(dispatcher)
+            while self._serving:
+                try:
+                    events = self._epoll.poll(self.POLL_TIMEOUT)
+                except IOError as e:
+                    if e.errno != errno.EINTR:
+                        raise
+                    events = ()
+                for fd, flags in events:
+                    dispatcher = self.map.get(fd)
+                    if dispatcher is not None:
+                        # the epoll flags have the values of the poll ones
+                        asyncore.readwrite(dispatcher, flags)
+                        self._update(dispatcher)
+            self._epoll.close()
+            self._epoll = None
+        for dispatcher in self.map.values():
+            dispatcher.close()
+
+    def shutdown(self):
+        '''Stop ``serve_forever``, from any thread'''
+        self._serving = False
+        self._wakeup.wake()
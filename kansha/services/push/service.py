@@ -0,0 +1,187 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import json
+import time
+import random
+import threading
+
+from webob import Request, Response
+
+from ..services_repository import Service
+from . import Broker
+from .hub import Hub
+from .server import PushServer
+
+
+class PushNotifications(Service):
+    '''
+    Push notifications service.
+
+    The application publishes the new versions of the channels (a board for
+    example) and the browsers wait for them with:
+
+        GET <app>/push/<channel>?version=<known version>
+
+    With an ``Accept: text/event-stream`` header, the versions are streamed as
+    Server-Sent Events, otherwise the request is held until a version is
+    published (long-poll).
+
+    These requests are answered by the push server (see ``server.PushServer``),
+    from a single thread, either of an application process (``server = thread``)
+    or of the ``kansha-admin push-server`` command (``server = process``).
+
+    With ``server = wsgi``, they are answered by ``handle_request``, a
+    lightweight WSGI endpoint of the application where each waiting request
+    holds a thread of the server: past ``max_waiters`` in the process, the
+    requests are answered right away, with the delay after which the client
+    should come back.
+    '''
+
+    LOAD_PRIORITY = 10
+    CONFIG_SPEC = {
+        'activated': 'boolean(default=True)',
+        'broker': 'string(default="local")',
+        'socket_dir': 'string(default="/tmp/kansha-push")',
+        'server': 'option("wsgi", "thread", "process", default="wsgi")',
+        'host': 'string(default="127.0.0.1")',
+        'port': 'integer(default=8081)',
+        'timeout': 'integer(default=25)',
+        'stream_duration': 'integer(default=300)',
+        'max_waiters': 'integer(default=5)',
+        'retry_delay': 'integer(default=10)'
+    }
+
+    def __init__(self, config_filename, error, activated, broker, socket_dir, server, host, port, timeout,
+                 stream_duration, max_waiters, retry_delay):
+        super(PushNotifications, self).__init__(config_filename, error)
+        self.activated = activated
+        self.broker_name = broker
+        self.server = server
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.stream_duration = stream_duration
+        self.retry_delay = retry_delay
+        self._waiters = threading.BoundedSemaphore(max_waiters)
+        self.hub = Hub()
+        self.broker = Broker(broker, socket_dir=socket_dir)
+        self._started = False
+        self._thread = None
+        self._lock = threading.Lock()
+        self._outbox = threading.local()
+
+    def _start(self):
+        # brokers start threads: don't do it in the admin commands
+        with self._lock:
+            if not self._started:
+                self.broker.start(self.hub)
+                self._started = True
+
+    def serve(self):
+        '''Answer the browsers from the push server, forever'''
+        self._start()
+        PushServer(self.hub, self.host, self.port, self.timeout, self.stream_duration).serve_forever()
+
+    def start_server(self):
+        '''Start the push server in a thread of the application process, if configured'''
+        if self.activated and self.server == 'thread' and self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self.serve, name='push-server')
+                    self._thread.daemon = True
+                    self._thread.start()
+
+    def publish(self, channel, version):
+        '''Publish a new version of ``channel`` when the current request is over,
+        so that the notified clients find it committed'''
+        if self.activated:
+            if not hasattr(self._outbox, 'messages'):
+                self._outbox.messages = {}
+            self._outbox.messages[channel] = version
+
+    def cancel(self):
+        '''Forget the versions of the current request, its transaction is rolled back'''
+        self._outbox.messages = {}
+
+    def flush(self):
+        '''Actually publish the versions of the current request'''
+        messages = getattr(self._outbox, 'messages', None)
+        if messages:
+            self._start()
+            self._outbox.messages = {}
+            for channel, version in messages.iteritems():
+                self.broker.publish(channel, version)
+
+    def _retry_delay(self):
+        '''Delay, in seconds, before the client of a refused request comes back: spread so they don't come back together'''
+        return self.retry_delay * random.uniform(1, 2)
+
+    def handle_request(self, environ, start_response, channel):
+        '''WSGI endpoint for the clients to wait for new versions of ``channel``'''
+        request = Request(environ)
+        if not self.activated:
+            return Response(status=404)(environ, start_response)
+        self._start()
+        try:
+            version = int(request.GET.get('version', 0))
+        except ValueError:
+            return Response(status=400)(environ, start_response)
+
+        if 'text/event-stream' in request.accept:
+            response = Response(content_type='text/event-stream', charset=None)
+            response.headers['Cache-Control'] = 'no-cache'
+            # don't let nginx buffer the stream
+            response.headers['X-Accel-Buffering'] = 'no'
+            response.app_iter = self._stream(channel, version)
+        elif self._waiters.acquire(False):
+            try:
+                new_version = self.hub.wait(channel, version, self.timeout)
+            finally:
+                self._waiters.release()
+            response = Response(content_type='application/json', charset=None)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.body = json.dumps({'version': new_version})
+        else:
+            response = Response(status=503, content_type='application/json', charset=None)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['Retry-After'] = str(int(self._retry_delay()))
+            response.body = json.dumps({'version': None})
+        return response(environ, start_response)
+
+    def _stream(self, channel, version):
+        '''Server-Sent Events: the browser reconnects by itself when the stream ends'''
+        # acquired once the response is iterated: the slot is released when the server closes it
+        if not self._waiters.acquire(False):
+            # an error status would stop the browser from reconnecting
+            yield 'retry: %d\n\n' % (self._retry_delay() * 1000)
+            return
+        try:
+            yield 'retry: 3000\n\n'
+            end = time.time() + self.stream_duration
+            while time.time() < end:
+                new_version = self.hub.wait(channel, version, self.timeout)
+                if new_version is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    version = new_version
+                    yield 'data: %s\n\n' % json.dumps({'version': version})
+        finally:
+            self._waiters.release()
+
+
+class DummyPushNotifications(PushNotifications):
+    '''For use in unit tests.'''
+
+    def __init__(self, timeout=1, max_waiters=5):
+        super(DummyPushNotifications, self).__init__(
+            '', None, activated=True, broker='local', socket_dir='', server='wsgi', host='127.0.0.1', port=0,
+            timeout=timeout, stream_duration=1, max_waiters=max_waiters, retry_delay=1
+        )
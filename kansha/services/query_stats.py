@@ -0,0 +1,190 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import os
+import sys
+import time
+import logging
+import threading
+import logging.handlers
+
+from nagare import log
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .services_repository import Service
+
+
+KANSHA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the request being counted in the current thread, and its service
+_local = threading.local()
+_listening = False
+_listening_lock = threading.Lock()
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.start = time.time()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = getattr(_local, 'stats', None)
+    if stats is not None and stats.start is not None:
+        _local.service.record(stats, cursor, statement, sys._getframe(1))
+
+
+def _listen():
+    '''Register the listeners of the engines, once per process, whatever the number of services'''
+    global _listening
+    with _listening_lock:
+        if not _listening:
+            event.listen(Engine, 'before_cursor_execute', _before_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_execute)
+            _listening = True
+
+
+class RequestStats(object):
+    '''The SQL queries of a request'''
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.duration = 0.0
+        # {component: [queries, rows, duration]}
+        self.components = {}
+        # {statement: executions}
+        self.statements = {}
+        # [(statement, component, call site)]
+        self.repeated = []
+        self.start = None
+
+    def record(self, statement, rows, duration, component):
+        self.queries += 1
+        self.rows += rows
+        self.duration += duration
+        totals = self.components.setdefault(component, [0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += rows
+        totals[2] += duration
+        executions = self.statements[statement] = self.statements.get(statement, 0) + 1
+        return executions
+
+
+class QueryStats(Service):
+    '''
+    Count the SQL queries, their rows and their duration during each request,
+    by issuing component, and warn about the statements executed again and
+    again (N+1 queries).
+
+    The components are named after the package of the nearest ``comp`` or
+    ``view`` module in the call stack of the query: ``board``, ``column``,
+    ``card``, ``card_addons.checklist``...
+    '''
+
+    LOAD_PRIORITY = 10
+    CONFIG_SPEC = {
+        'activated': 'boolean(default=True)',
+        'repeats': 'integer(default=10)',
+        'log_file': 'string(default="")'
+    }
+
+    def __init__(self, config_filename, error, activated, repeats, log_file):
+        super(QueryStats, self).__init__(config_filename, error)
+        self.activated = activated
+        self.repeats = repeats
+        # {file name: (module path relative to kansha, component or None)}
+        self._modules = {}
+        self.logger = None
+        if log_file:
+            self.logger = logging.getLogger('kansha.query_stats')
+            self.logger.propagate = False
+            self.logger.setLevel(logging.INFO)
+            if not self.logger.handlers:
+                handler = logging.handlers.RotatingFileHandler(log_file, 'a', 10485760, 8, 'UTF-8')
+                handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+                self.logger.addHandler(handler)
+        if activated:
+            _listen()
+
+    def _module(self, filename):
+        module = self._modules.get(filename)
+        if module is None:
+            path = os.path.abspath(filename)
+            if not path.startswith(KANSHA_DIR + os.sep):
+                module = (None, None)
+            else:
+                path = os.path.splitext(path[len(KANSHA_DIR) + 1:])[0]
+                package, name = os.path.split(path)
+                component = package.replace(os.sep, '.') if name in ('comp', 'view') else None
+                module = (path, component)
+            self._modules[filename] = module
+        return module
+
+    def caller(self, frame):
+        '''The component and the call site of the query executed in ``frame``'''
+        component = site = None
+        while frame is not None and component is None:
+            path, component = self._module(frame.f_code.co_filename)
+            if site is None and path is not None and not path.startswith('services') and \
+                    not path.endswith('models'):
+                site = '%s.py:%d in %s' % (path, frame.f_lineno, frame.f_code.co_name)
+            frame = frame.f_back
+        return component or 'other', site or 'unknown'
+
+    def start(self):
+        '''Start counting the queries of the current thread'''
+        if self.activated:
+            _local.stats = RequestStats()
+            _local.service = self
+
+    def stop(self, request=''):
+        '''Stop counting, log the counts of the ``request`` and return them'''
+        stats = getattr(_local, 'stats', None)
+        _local.stats = _local.service = None
+        if stats is not None and stats.queries:
+            self._log(logging.INFO if self.logger else logging.DEBUG, '%s: %s' % (request, self.summary(stats)))
+        return stats
+
+    @staticmethod
+    def summary(stats):
+        components = sorted(stats.components.iteritems(), key=lambda (component, totals): -totals[2])
+        return '%d queries, %d rows, %.1f ms (%s)' % (
+            stats.queries, stats.rows, stats.duration * 1000,
+            ', '.join('%s %d/%d/%.1f' % (component, queries, rows, duration * 1000)
+                      for component, (queries, rows, duration) in components)
+        )
+
+    def _log(self, level, message):
+        if self.logger is not None:
+            self.logger.log(level, message)
+        else:
+            {logging.DEBUG: log.debug, logging.INFO: log.info, logging.WARNING: log.warning}[level](message)
+
+    def record(self, stats, cursor, statement, frame):
+        '''Count the query just executed in ``frame``'''
+        duration = time.time() - stats.start
+        stats.start = None
+        component, site = self.caller(frame)
+        # as reported by the driver: the modified rows, and the selected ones with some drivers only
+        rows = max(cursor.rowcount, 0)
+        if stats.record(statement, rows, duration, component) == self.repeats + 1:
+            stats.repeated.append((statement, component, site))
+            self._log(logging.WARNING, 'N+1 queries: executed more than %d times by %s, at %s: %s' % (
+                self.repeats, component, site, ' '.join(statement.split())[:300]
+            ))
+
+
+class DummyQueryStats(QueryStats):
+    '''For use in unit tests.'''
+
+    def __init__(self, repeats=10):
+        super(DummyQueryStats, self).__init__('', None, activated=True, repeats=repeats, log_file='')
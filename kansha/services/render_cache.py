@@ -0,0 +1,71 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2014 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import threading
+from collections import OrderedDict
+
+from .services_repository import Service
+
+
+class RenderCache(Service):
+    '''
+    Process wide cache of rendered HTML fragments (trees or strings), with LRU eviction.
+
+    The keys must change whenever what is rendered changes (a version
+    number is usually part of them), so entries never need to be invalidated.
+    '''
+
+    LOAD_PRIORITY = 10
+    CONFIG_SPEC = {
+        'activated': 'boolean(default=True)',
+        'max_entries': 'integer(default=10000)'
+    }
+
+    def __init__(self, config_filename, error, activated, max_entries):
+        super(RenderCache, self).__init__(config_filename, error)
+        self.activated = activated
+        self.max_entries = max_entries
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''Return the fragment cached for ``key`` or None'''
+        if not self.activated or key is None:
+            return None
+        with self._lock:
+            fragment = self._fragments.pop(key, None)
+            if fragment is not None:
+                # most recently used entries are at the end
+                self._fragments[key] = fragment
+        return fragment
+
+    def set(self, key, fragment):
+        '''Cache ``fragment`` for ``key``, evicting the least recently used entries if full'''
+        if not self.activated or key is None:
+            return
+        with self._lock:
+            self._fragments.pop(key, None)
+            self._fragments[key] = fragment
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+    def __len__(self):
+        return len(self._fragments)
+
+
+class DummyRenderCache(RenderCache):
+    '''For use in unit tests.'''
+
+    def __init__(self, max_entries=100):
+        super(DummyRenderCache, self).__init__('', None, activated=True, max_entries=max_entries)
@@ -0,0 +1,429 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+'''
+Benchmarks of the search engines.
+
+Under a concurrent load:
+
+    python -m kansha.services.search.benchmark concurrency [engine [threads [documents]]]
+
+each thread searches the index, or updates a document and commits,
+as the request threads of a threaded publisher would.
+
+Searches in a board:
+
+    python -m kansha.services.search.benchmark boards [engine [cards]]
+
+searches cards in boards of 1000 cards, as the board filter does on
+each keystroke.
+
+Bulk indexing, then searches:
+
+    python -m kansha.services.search.benchmark indexing [engine [cards]]
+
+reports the size of the index, the indexing throughput and the latency
+of the searches of word prefixes, as typed.
+
+Regression suite:
+
+    python -m kansha.services.search.benchmark suite [engine [sizes]]
+
+indexes generated cards, with the fields of the cards of Kansha, at each
+of the comma separated ``sizes`` (default ``1000,10000``) and reports the
+indexing throughput, the update latency and the latency of each kind of
+query, as JSON, to diff the runs. ``kansha-admin bench-search`` runs it on
+the engine configured for the application.
+
+``engine`` is one of sqlite, sqlite5, sqlite5-scoped (sqlite5 with
+``scope = board_id``), memory, elastic or elastic-prefix (elastic with
+``analysis = prefix``), the last two on an ElasticSearch node
+listening on localhost.
+'''
+
+import os
+import sys
+import json
+import time
+import bisect
+import random
+import tempfile
+import threading
+
+from . import schema
+from .sqliteengine import SQLiteFTSEngine
+from .sqlite5engine import SQLite5Engine
+from .memoryengine import MemorySearchEngine
+from .elasticengine import ElasticSearchEngine
+
+
+ENGINES = {
+    'sqlite': SQLiteFTSEngine,
+    'sqlite5': SQLite5Engine,
+    'sqlite5-scoped': lambda index, index_folder: SQLite5Engine(index, index_folder, scope='board_id'),
+    'memory': MemorySearchEngine,
+    'elastic': lambda index, index_folder: ElasticSearchEngine(index),
+    'elastic-prefix': lambda index, index_folder: ElasticSearchEngine(index, analysis='prefix')
+}
+
+
+LABELS = (u'Urgent', u'Bug', u'Feature', u'Blocked', u'Design', u'Backend', u'Frontend', u'Documentation')
+
+
+class BenchmarkCard(schema.Document):
+    # the schema of the cards with their extensions
+    title = schema.Text(stored=True)
+    description = schema.Text
+    checklists = schema.Text
+    labels = schema.Text
+    comments = schema.Text
+    board_id = schema.Int(stored=True)
+    archived = schema.Boolean(stored=True)
+
+
+def random_words(n, rnd):
+    return [
+        u''.join(rnd.choice(u'abcdefghijklmnopqrstuvwxyz') for __ in xrange(rnd.randint(3, 10)))
+        for __ in xrange(n)
+    ]
+
+
+def zipf_words(n, rnd):
+    '''Function drawing words of a vocabulary of ``n`` words, as in natural languages'''
+    vocabulary = random_words(n, rnd)
+    cumulated = []
+    total = 0.0
+    for rank in xrange(1, n + 1):
+        total += 1.0 / rank
+        cumulated.append(total)
+    return lambda: vocabulary[bisect.bisect(cumulated, rnd.random() * total)]
+
+
+def card_corpus(cards, seed=0, board_size=1000):
+    '''Generate ``cards`` cards, the same for a given ``seed``
+
+    Most cards have a short title and a few have a long description,
+    checklists or comments, as in real boards.
+    '''
+    rnd = random.Random(seed)
+    word = zipf_words(30000, rnd)
+
+    def sentence(shortest, longest):
+        return u' '.join(word() for __ in xrange(rnd.randint(shortest, longest))).capitalize()
+
+    def paragraph(sentences):
+        return u'. '.join(sentence(5, 20) for __ in xrange(sentences))
+
+    for i in xrange(cards):
+        checklists = []
+        if rnd.random() < 0.2:
+            checklists.append(sentence(1, 4))
+            checklists.extend(sentence(2, 6) for __ in xrange(rnd.randint(2, 8)))
+        yield BenchmarkCard(
+            u'card%d' % i,
+            title=sentence(2, 8),
+            description=paragraph(rnd.choice((0, 0, 0, 1, 1, 2, 4))),
+            checklists=u'\n'.join(checklists),
+            labels=u' '.join(rnd.sample(LABELS, rnd.choice((0, 0, 1, 1, 2)))),
+            comments=u'\n'.join(paragraph(rnd.randint(1, 2)) for __ in xrange(int(rnd.expovariate(0.7)))),
+            board_id=rnd.randrange(max(cards // board_size, 1)),
+            archived=rnd.random() < 0.1
+        )
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def concurrency(engine, threads=16, documents=10000, duration=10, write_ratio=0.1, seed=0):
+    '''Search and update the index of ``engine`` from ``threads`` threads during ``duration`` seconds
+
+    ``write_ratio`` of the operations are updates followed by a commit.
+
+    Return:
+      - ``{'search': latencies, 'update': latencies, 'errors': exceptions}``,
+        the latencies in seconds
+    '''
+    rnd = random.Random(seed)
+    vocabulary = random_words(5000, rnd)
+    engine.create_collection([BenchmarkCard])
+    engine.add_documents([
+        BenchmarkCard(
+            u'card%d' % i,
+            title=u' '.join(rnd.sample(vocabulary, 5)),
+            description=u' '.join(rnd.sample(vocabulary, 30)),
+            board_id=i % 100, archived=False
+        ) for i in xrange(documents)
+    ])
+    engine.commit()
+
+    results = {'search': [], 'update': [], 'errors': []}
+    lock = threading.Lock()
+    stop = time.time() + duration
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        latencies = {'search': [], 'update': []}
+        errors = []
+        while time.time() < stop:
+            start = time.time()
+            try:
+                if rnd.random() < write_ratio:
+                    kind = 'update'
+                    engine.update_document(BenchmarkCard.delta(
+                        u'card%d' % rnd.randrange(documents), title=u' '.join(rnd.sample(vocabulary, 5))
+                    ))
+                    engine.commit()
+                else:
+                    kind = 'search'
+                    engine.search(BenchmarkCard.match(rnd.choice(vocabulary)[:4]), 20)
+            except Exception as e:
+                engine.cancel()
+                errors.append(e)
+                continue
+            latencies[kind].append(time.time() - start)
+        with lock:
+            for kind, values in latencies.iteritems():
+                results[kind].extend(values)
+            results['errors'].extend(errors)
+
+    workers = [threading.Thread(target=worker, args=(seed + i,)) for i in xrange(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results
+
+
+def board_search(engine, cards, board_size=1000, searches=500, seed=0):
+    '''Search ``searches`` times in a board of an index of ``cards`` cards
+
+    The searches are the successive prefixes of words of the cards, as typed
+    in the board filter, 10% of the cards are archived.
+
+    Return:
+      - the latencies, in seconds
+    '''
+    rnd = random.Random(seed)
+    word = zipf_words(30000, rnd)
+    engine.create_collection([BenchmarkCard])
+    batch = []
+    for i in xrange(cards):
+        batch.append(BenchmarkCard(
+            u'card%d' % i,
+            title=u' '.join(word() for __ in xrange(6)),
+            description=u' '.join(word() for __ in xrange(20)),
+            board_id=rnd.randrange(max(cards // board_size, 1)),
+            archived=rnd.random() < 0.1
+        ))
+        if len(batch) == 10000:
+            engine.add_documents(batch)
+            engine.commit()
+            batch = []
+    engine.add_documents(batch)
+    engine.commit()
+    engine.optimize()
+
+    latencies = []
+    while len(latencies) < searches:
+        typed = word()
+        board_id = rnd.randrange(max(cards // board_size, 1))
+        for length in xrange(2, len(typed) + 1):
+            query = BenchmarkCard.match(typed[:length]) & (BenchmarkCard.board_id == board_id)
+            query &= (BenchmarkCard.archived == False)
+            start = time.time()
+            engine.search(query, 100)
+            latencies.append(time.time() - start)
+    return latencies
+
+
+def index_size(engine):
+    '''Size of the index of ``engine``, in bytes'''
+    if isinstance(engine, ElasticSearchEngine):
+        stats = engine.idx_manager.stats(index=engine.index)
+        return stats['_all']['primaries']['store']['size_in_bytes']
+    if isinstance(engine, MemorySearchEngine):
+        paths = (engine.index.snapshot_path, engine.index.log_path)
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+    db = engine._db_path()
+    return sum(os.path.getsize(path) for path in (db, db + '-wal') if os.path.exists(path))
+
+
+def indexing(engine, cards, searches=500, seed=0):
+    '''Index ``cards`` cards, by batches, then search them ``searches`` times
+
+    The searches are the successive prefixes of words of the cards, as typed.
+
+    Return:
+      - ``{'throughput': cards indexed per second, 'size': index size in bytes,
+        'search': latencies}``, the latencies in seconds
+    '''
+    rnd = random.Random(seed)
+    word = zipf_words(30000, rnd)
+    engine.create_collection([BenchmarkCard])
+    start = time.time()
+    for first in xrange(0, cards, 10000):
+        engine.add_documents([
+            BenchmarkCard(
+                u'card%d' % i,
+                title=u' '.join(word() for __ in xrange(6)),
+                description=u' '.join(word() for __ in xrange(20)),
+                board_id=i % 100, archived=False
+            ) for i in xrange(first, min(first + 10000, cards))
+        ])
+        engine.commit()
+    engine.commit(sync=True)
+    throughput = cards / (time.time() - start)
+    engine.optimize()
+
+    latencies = []
+    while len(latencies) < searches:
+        typed = word()
+        for length in xrange(2, len(typed) + 1):
+            start = time.time()
+            engine.search(BenchmarkCard.match(typed[:length]), 20)
+            latencies.append(time.time() - start)
+    return {'throughput': throughput, 'size': index_size(engine), 'search': latencies}
+
+
+def latency_stats(latencies):
+    '''``{'count': n, 'p50': ms, 'p95': ms, 'p99': ms}``'''
+    stats = dict(('p%d' % p, round(percentile(latencies, p / 100.0) * 1000, 3)) for p in (50, 95, 99))
+    stats['count'] = len(latencies)
+    return stats
+
+
+def run_suite(engine, cards, board_size=1000, searches=200, updates=200, seed=0):
+    '''Index ``cards`` generated cards, then update and search them
+
+    Return:
+      - ``{'indexing': cards per second, 'update': latency stats, 'search': {kind: latency stats}}``
+    '''
+    engine.create_collection([BenchmarkCard])
+    start = time.time()
+    batch = []
+    for card in card_corpus(cards, seed, board_size):
+        batch.append(card)
+        if len(batch) == 10000:
+            engine.add_documents(batch)
+            engine.commit()
+            batch = []
+    engine.add_documents(batch)
+    engine.commit(sync=True)
+    throughput = cards / (time.time() - start)
+
+    # the words of the cards
+    rnd = random.Random(seed)
+    word = zipf_words(30000, rnd)
+
+    def board():
+        return rnd.randrange(max(cards // board_size, 1))
+
+    queries = {
+        'match': lambda: BenchmarkCard.title.match(word()),
+        'matchany': lambda: BenchmarkCard.match(word()),
+        'multiterm': lambda: BenchmarkCard.match(word() + u' ' + word()),
+        'board': lambda: (
+            BenchmarkCard.match(word()) & (BenchmarkCard.board_id == board()) & (BenchmarkCard.archived == False)
+        ),
+        'disjunction': lambda: (
+            (BenchmarkCard.labels.match(rnd.choice(LABELS)) | BenchmarkCard.comments.match(word())) &
+            (BenchmarkCard.board_id == board())
+        )
+    }
+    search = {}
+    for kind in sorted(queries):
+        latencies = []
+        for __ in xrange(searches):
+            query = queries[kind]()
+            start = time.time()
+            engine.search(query, 20)
+            latencies.append(time.time() - start)
+        search[kind] = latency_stats(latencies)
+    latencies = []
+    while len(latencies) < searches:
+        typed = word()
+        for length in xrange(2, len(typed) + 1):
+            start = time.time()
+            engine.search(BenchmarkCard.match(typed[:length]), 20)
+            latencies.append(time.time() - start)
+    search['prefix'] = latency_stats(latencies)
+
+    latencies = []
+    for __ in xrange(updates):
+        start = time.time()
+        engine.update_document(BenchmarkCard.delta(
+            u'card%d' % rnd.randrange(cards), title=u' '.join(word() for __ in xrange(5))
+        ))
+        engine.commit()
+        latencies.append(time.time() - start)
+    return {'indexing': round(throughput, 1), 'update': latency_stats(latencies), 'search': search}
+
+
+def suite(create_engine, sizes, **options):
+    '''``run_suite`` on a new index of each of ``sizes`` cards, created by ``create_engine()``
+
+    Return:
+      - the results of ``run_suite``, with their ``cards``
+    '''
+    results = []
+    for cards in sizes:
+        engine = create_engine()
+        try:
+            results.append(dict(run_suite(engine, cards, **options), cards=cards))
+        finally:
+            engine.delete_collection()
+    return results
+
+
+def print_latencies(kind, latencies, duration=None):
+    print '  %-6s %s p50 %6.2f ms, p95 %6.2f ms, p99 %6.2f ms' % (
+        kind, '' if duration is None else '%6.0f ops/s,' % (len(latencies) / float(duration)),
+        percentile(latencies, 0.5) * 1000, percentile(latencies, 0.95) * 1000, percentile(latencies, 0.99) * 1000
+    )
+
+
+if __name__ == '__main__':
+    benchmark = sys.argv[1] if len(sys.argv) > 1 else 'concurrency'
+    engine_name = sys.argv[2] if len(sys.argv) > 2 else 'sqlite'
+    folder = tempfile.mkdtemp()
+    engine = ENGINES[engine_name](u'benchmark', folder)
+    try:
+        if benchmark == 'boards':
+            cards = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+            latencies = board_search(engine, cards)
+            print '%s, %d cards, searches in boards of 1000 cards:' % (engine_name, cards)
+            print_latencies('search', latencies)
+        elif benchmark == 'suite':
+            sizes = [int(size) for size in (sys.argv[3] if len(sys.argv) > 3 else '1000,10000').split(',')]
+            results = suite(lambda: ENGINES[engine_name](u'benchmark', folder), sizes)
+            print json.dumps({'engine': engine_name, 'runs': results}, indent=2, sort_keys=True, separators=(',', ': '))
+        elif benchmark == 'indexing':
+            cards = int(sys.argv[3]) if len(sys.argv) > 3 else 100000
+            results = indexing(engine, cards)
+            print '%s, %d cards:' % (engine_name, cards)
+            print '  index  %6.1f MB, %6.0f cards/s' % (results['size'] / 1048576.0, results['throughput'])
+            print_latencies('search', results['search'])
+        else:
+            threads = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+            documents = int(sys.argv[4]) if len(sys.argv) > 4 else 10000
+            duration = 10
+            results = concurrency(engine, threads, documents, duration)
+            print '%s, %d threads, %d documents, %ds:' % (engine_name, threads, documents, duration)
+            for kind in ('search', 'update'):
+                print_latencies(kind, results[kind], duration)
+            print '  %d error(s)' % len(results['errors'])
+            for error in results['errors'][:5]:
+                print '    %r' % error
+    finally:
+        engine.delete_collection()
+        os.rmdir(folder)
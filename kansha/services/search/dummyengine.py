@@ -32,6 +32,14 @@ class DummySearchEngine(object):
         '''
         pass
 
+    def add_documents(self, documents, replace=False):
+        '''
+        Add many documents at once, as efficiently as the backend allows.
+        Used to (re)build the index.
+        If ``replace``, the documents already in the index are replaced.
+        '''
+        pass
+
     def delete_document(self, schema, docid):
         '''
         Remove document from index and storage.
@@ -56,16 +64,26 @@ class DummySearchEngine(object):
         Forget documents added since last commit'''
         pass
 
-    def search(self, query, size=20):
+    def search(self, query, size=20, snippets=False):
         '''
         Search the database.
         The query Query expression (see search.query).
-        Return list of tuples (score, document).
+        Return list of tuples (score, document), best first.
         The returned document only contains stored values, the others
         are set to None.
+        If ``snippets``, the documents have a ``_snippet`` attribute: an extract
+        of their text, matched terms highlighted with <b>, not escaped.
         '''
         return []
 
+    def optimize(self, automerge=None):
+        '''
+        Compact the index, to speed up the searches.
+        If ``automerge`` is given, configure the incremental merges
+        done on writes instead, if backend supports it.
+        '''
+        pass
+
     def create_collection(self, schemas):
         '''
         Init the collections the first time.
@@ -76,3 +94,18 @@ class DummySearchEngine(object):
 
     def delete_collection(self):
         pass
+
+    def create_shadow(self, schemas):
+        '''
+        Create the collections in a new, empty, index and return an engine
+        writing to it: the index can be rebuilt there while the current one
+        is searched.
+        '''
+        return self
+
+    def swap(self, shadow):
+        '''
+        Replace the current index by the ``shadow`` one, created by
+        ``create_shadow``, for all the processes.
+        '''
+        pass
@@ -13,6 +13,9 @@ Depends on a running ElasticSearch cluster, somewhere.
 For usage, look at the unit tests.
 """
 
+import copy
+import time
+
 try:
     from elasticsearch import Elasticsearch, helpers
     from elasticsearch.client import IndicesClient
@@ -24,14 +27,28 @@ else:
 
 class ESQueryMapper(object):
 
+    def __init__(self, analysis='ngram'):
+        self.analysis = analysis
+
+    def _match(self, name, value):
+        if self.analysis == 'ngram':
+            return {'match': {name: {'query': value, 'operator': 'and'}}}
+        # the words are searched as prefixes, whole words rank first
+        return {
+            'bool': {
+                'must': {'match': {name + '.prefix': {'query': value, 'operator': 'and'}}},
+                'should': {'match': {name: value}}
+            }
+        }
+
     def match(self, field, value):
-        return {'match': {field.name: {'query': value, 'operator': 'and'}}}
+        return self._match(field.name, value)
 
     def matchany(self, schema, value):
         # _all does not make sense for fulltext searches
         # so we use a custom field for that: _full.
         # it only contains Text fields
-        return {'match': {'_full': {'query': value, 'operator': 'and'}}}
+        return self._match('_full', value)
 
     def eq(self, field, value):
         return {'term': {field.name: value}}
@@ -84,6 +101,13 @@ class ESQueryMapper(object):
 
 class ESSchemaMapper(object):
 
+    '''
+    Analysis profiles of the Text fields:
+      - ``ngram`` -- the words are indexed with all their substrings (infix searches)
+      - ``prefix`` -- the words are indexed as is, and with their prefixes in a
+        ``prefix`` subfield: a much smaller index, for prefix searches
+    '''
+
     FT2ES = {
         'Text': {'type': 'string',
                  'analyzer':  'autocomplete',
@@ -121,23 +145,59 @@ class ESSchemaMapper(object):
         }
     }
 
-    def __init__(self, idx_manager):
+    PREFIX_TEXT = {'type': 'string',
+                   'analyzer': 'standard',
+                   'fields': {'prefix': {'type': 'string',
+                                         'analyzer': 'prefix',
+                                         'search_analyzer': 'standard'}}}
+
+    PREFIX_SETTINGS = {
+        "number_of_shards": 1,
+        "analysis": {
+            "filter": {
+                "prefix_filter": {
+                    "type":     "edge_ngram",
+                    "min_gram": 1,
+                    "max_gram": 20
+                }
+            },
+            "analyzer": {
+                "prefix": {
+                    "type":      "custom",
+                    "tokenizer": "standard",
+                    "filter": [
+                        "lowercase",
+                        "prefix_filter"
+                    ]
+                }
+            }
+        }
+    }
+
+    def __init__(self, idx_manager, analysis='ngram'):
 
         self.idx_manager = idx_manager
+        self.analysis = analysis
         self.mappings = {}
 
     # Schema API
 
     def define(self, schema_name):
-        properties = {'_full': {"type": "string",
-                                "analyzer":  "autocomplete",
-                                "search_analyzer": "standard"}}
+        if self.analysis == 'ngram':
+            full = {"type": "string",
+                    "analyzer":  "autocomplete",
+                    "search_analyzer": "standard"}
+        else:
+            full = dict(self.PREFIX_TEXT)
+        properties = {'_full': full}
         excludes = []
         self.mappings[schema_name] = {'properties': properties,
                                       '_source': {"excludes": excludes}}
 
     def define_field(self, schema_name, field_type, name, indexed, stored):
         estype = dict(self.FT2ES[field_type])
+        if field_type == 'Text' and indexed and self.analysis == 'prefix':
+            estype = dict(self.PREFIX_TEXT, copy_to='_full')
         if not indexed:
             estype['index'] = 'no'
         mapping = self.mappings[schema_name]
@@ -148,15 +208,18 @@ class ESSchemaMapper(object):
     ## Specific API
 
     def create(self, index):
-        body = {"mappings": self.mappings, "settings": self.SETTINGS}
+        settings = self.SETTINGS if self.analysis == 'ngram' else self.PREFIX_SETTINGS
+        body = {"mappings": self.mappings, "settings": settings}
         self.idx_manager.create(index=index, body=body)
 
 
 class IndexCursor(object):
 
-    def __init__(self, index, search_function=None):
+    def __init__(self, index, search_function=None, snippets=False, analysis='ngram'):
         self.index = index
         self.es_search = search_function
+        self.snippets = snippets
+        self.analysis = analysis
         self.op = {}
 
     # Document API
@@ -178,13 +241,25 @@ class IndexCursor(object):
                        doc_type=schema_name,
                        body={'query': dsl},
                        size=limit)
+        if self.snippets:
+            if self.analysis == 'prefix':
+                # the prefix matches are only found in the subfields
+                fields_to_load = [field + '.prefix' for field in fields_to_load]
+            self.op['body']['highlight'] = {
+                'pre_tags': ['<b>'], 'post_tags': ['</b>'],
+                'fields': dict((field, {'number_of_fragments': 1}) for field in fields_to_load)
+            }
 
     def get_results(self, result_factory):
         hits = self.es_search(**self.op)
-        return [
-            (h['_score'], result_factory(h['_id'], **h['_source']))
-            for h in hits['hits']['hits']
-        ]
+        results = []
+        for h in hits['hits']['hits']:
+            document = result_factory(h['_id'], **h['_source'])
+            if self.snippets:
+                fragments = [fragment for fragments in h.get('highlight', {}).itervalues() for fragment in fragments]
+                document._snippet = fragments[0] if fragments else None
+            results.append((h['_score'], document))
+        return results
 
     # Specific API
 
@@ -198,51 +273,107 @@ class IndexCursor(object):
             doc: fields
         }
 
-    def enqueue(self, queue):
-        queue.append(self.op)
-
 
 class ElasticSearchEngine(object):
     '''
     ElasticSearch Engine.
+
+    Options:
+      - ``analysis`` -- "ngram" (default) to match any part of the words,
+        or "prefix" to only match their beginning, with a much smaller index
+        (see ``ESSchemaMapper``)
+
+      - ``queue_size``, ``queue_bytes`` -- the queued operations are sent
+        as soon as they are that many, or that big once serialized
+      - ``bulk_threads`` -- number of threads sending the bulk requests
+
+    The operations sent before ``commit``, because the queue was full,
+    can't be cancelled anymore.
+
+    The index can be rebuilt in a new index (``create_shadow``) while it is
+    searched, then replaced by it (``swap``): the configured index name
+    is then an alias of the live index.
     '''
 
     # make it compatible with services
     LOAD_PRIORITY = 30
+    # number of operations per bulk request
+    BULK_SIZE = 500
+    QUEUE_SIZE = 5000
+    QUEUE_BYTES = 10 * 1024 * 1024
 
-    def __init__(self, index, host=None, port=None):
+    def __init__(self, index, host=None, port=None, analysis='ngram',
+                 queue_size=QUEUE_SIZE, queue_bytes=QUEUE_BYTES, bulk_threads=1):
         '''Only one host for now.'''
         if not es_installed:
             raise ValueError('elasticsearch not installed')
 
         assert(index.isalpha())
-        self.init_state(index, host, port)
+        assert(analysis in ('ngram', 'prefix'))
+        self.init_state(index, host, port, analysis, int(queue_size), int(queue_bytes), int(bulk_threads))
 
-    def init_state(self, index, host, port):
+    def init_state(self, index, host, port, analysis='ngram',
+                   queue_size=QUEUE_SIZE, queue_bytes=QUEUE_BYTES, bulk_threads=1):
         self._queue = []
+        self._queue_bytes = 0
+        # errors of the operations sent since the last commit
+        self._errors = []
         self.index = index
         self.host = host
         self.port = port
+        self.analysis = analysis
+        self.queue_size = queue_size
+        self.queue_bytes = queue_bytes
+        self.bulk_threads = bulk_threads
         if host is None:
             self.es = Elasticsearch()
         else:
             self.es = Elasticsearch(hosts=[{'host': host, 'port': port}])
         self.idx_manager = IndicesClient(self.es)
-        self.mapper = ESQueryMapper()
+        self.mapper = ESQueryMapper(analysis)
 
     # be persistence friendly
     def __getstate__(self):
-        return (self.index, self.host, self.port)
+        return (self.index, self.host, self.port, self.analysis, self.queue_size, self.queue_bytes, self.bulk_threads)
 
     def __setstate__(self, state):
         self.init_state(*state)
 
-    def _index(self, document, update=False):
+    def _index(self, document, update=False, replace=False):
         # for efficiency, nothing is executed yet,
         # we prepare and queue the operation
         cursor = IndexCursor(self.index)
         document.save(cursor, update)
-        cursor.enqueue(self._queue)
+        if replace:
+            cursor.op['_op_type'] = 'index'
+        self._enqueue(cursor.op)
+
+    def _enqueue(self, op):
+        self._queue.append(op)
+        self._queue_bytes += len(self.es.transport.serializer.dumps(op))
+        if len(self._queue) >= self.queue_size or self._queue_bytes >= self.queue_bytes:
+            self.flush()
+
+    def _bulk(self, actions):
+        '''Send ``actions`` by chunks of ``BULK_SIZE`` and return the errors'''
+        options = dict(chunk_size=self.BULK_SIZE, max_chunk_bytes=self.queue_bytes, raise_on_error=False)
+        if self.bulk_threads > 1:
+            results = helpers.parallel_bulk(self.es, actions, thread_count=self.bulk_threads, **options)
+            errors = [item for ok, item in results if not ok]
+        else:
+            __, errors = helpers.bulk(self.es, actions, **options)
+        # deleting a document that is not indexed is not an error
+        return [error for error in errors if error.get('delete', {}).get('status') != 404]
+
+    def flush(self):
+        '''
+        Send the queued operations now. Their errors are raised by the next commit.
+        '''
+        queue = self._queue
+        self._queue = []
+        self._queue_bytes = 0
+        if queue:
+            self._errors.extend(self._bulk(queue))
 
     def add_document(self, document):
         '''
@@ -251,6 +382,15 @@ class ElasticSearchEngine(object):
         '''
         self._index(document)
 
+    def add_documents(self, documents, replace=False):
+        '''
+        Add many documents at once: they are sent by chunks of
+        ``BULK_SIZE`` on commit, or before if the queue is full.
+        If ``replace``, the documents already in the index are replaced.
+        '''
+        for document in documents:
+            self._index(document, replace=replace)
+
     def delete_document(self, schema, docid):
         '''
         Remove document from index and storage.
@@ -261,7 +401,7 @@ class ElasticSearchEngine(object):
             '_type': schema.type_name,
             '_id': docid
         }
-        self._queue.append(op)
+        self._enqueue(op)
 
     def update_document(self, document):
         '''Update document (partial update from delta document)'''
@@ -271,27 +411,57 @@ class ElasticSearchEngine(object):
         '''
         If ``sync``, index synchronously, else let Elasticsearch
         manage its index.
+        Raise ``BulkIndexError`` with the failed operations, if any,
+        once the other ones are done.
         '''
-        helpers.bulk(self.es, self._queue)
+        self.flush()
+        errors = self._errors
+        self._errors = []
         if sync:
             self.idx_manager.refresh(self.index)
-        self._queue = []
+        if errors:
+            failures = []
+            for error in errors:
+                (op_type, item), = error.items()
+                failures.append('%s %s: %s' % (op_type, item.get('_id'), item.get('error')))
+            raise helpers.BulkIndexError(
+                '%d document(s) failed to index: %s' % (len(errors), '; '.join(failures[:10])), errors
+            )
 
     def cancel(self):
         '''
-        Forget operation scheduled since last commit'''
+        Forget operation scheduled since last commit, except those already
+        sent because the queue was full.'''
         self._queue = []
+        self._queue_bytes = 0
+        self._errors = []
 
-    def search(self, query, size=20):
+    def search(self, query, size=20, snippets=False):
         '''
         Search the database.
         '''
-        index_cursor = IndexCursor(self.index, self.es.search)
+        index_cursor = IndexCursor(self.index, self.es.search, snippets, self.analysis)
         return query.search(index_cursor, self.mapper, size)
 
+    def optimize(self, automerge=None):
+        '''
+        Merge the segments of the index. ``automerge`` is ignored:
+        Elasticsearch merges on its own.
+        '''
+        if automerge is None:
+            self.idx_manager.forcemerge(index=self.index, max_num_segments=1)
+
+    def _indices(self):
+        '''Indices behind the index name: the index itself or those of the alias'''
+        if self.idx_manager.exists_alias(name=self.index):
+            return self.idx_manager.get_alias(name=self.index).keys()
+        elif self.idx_manager.exists(self.index):
+            return [self.index]
+        return []
+
     def delete_collection(self):
-        if self.idx_manager.exists(self.index):
-            self.idx_manager.delete(index=self.index)
+        for index in self._indices():
+            self.idx_manager.delete(index=index)
 
     def create_collection(self, schemas):
         '''
@@ -300,12 +470,43 @@ class ElasticSearchEngine(object):
         `schemas` is a list of Document classes or Schema instances.
         '''
 
-        idx_manager = self.idx_manager
-        if idx_manager.exists(self.index):
-            idx_manager.delete(index=self.index)
+        self.delete_collection()
 
-        mapper = ESSchemaMapper(idx_manager)
+        mapper = ESSchemaMapper(self.idx_manager, self.analysis)
         for schema in schemas:
             schema.map(mapper)
 
         mapper.create(self.index)
+
+    def create_shadow(self, schemas):
+        '''
+        Create the collections in a new index and return an engine writing
+        to it, to rebuild the index while the current one is searched.
+        '''
+        shadow = copy.copy(self)
+        shadow.index = '%s_%d' % (self.index, int(time.time() * 1000))
+        mapper = ESSchemaMapper(shadow.idx_manager, shadow.analysis)
+        for schema in schemas:
+            schema.map(mapper)
+        mapper.create(shadow.index)
+        return shadow
+
+    def swap(self, shadow):
+        '''
+        Point the index name to the ``shadow`` index, atomically, and delete
+        the previous index.
+        The first time, the index name is an index, not an alias: it is
+        deleted before the alias is created, and the searches fail meanwhile.
+        '''
+        shadow.commit(sync=True)
+        previous = [index for index in self._indices() if index != shadow.index]
+        if self.idx_manager.exists_alias(name=self.index):
+            actions = [{'remove': {'index': index, 'alias': self.index}} for index in previous]
+        else:
+            for index in previous:
+                self.idx_manager.delete(index=index)
+            previous = actions = []
+        actions.append({'add': {'index': shadow.index, 'alias': self.index}})
+        self.idx_manager.update_aliases(body={'actions': actions})
+        for index in previous:
+            self.idx_manager.delete(index=index)
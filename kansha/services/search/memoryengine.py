@@ -0,0 +1,839 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+"""
+In-process search engine plugin.
+Zero dependency.
+
+The index is held in the memory of the process: the postings of each word
+are arrays of document numbers, and the words are indexed by their 1, 2
+and 3 letters substrings, for infix searches.
+
+Without ``index_folder``, the index only lives in the process (unit tests,
+single process sites). With it, the committed operations are appended to
+a journal, replayed by the other processes on their next search, and the
+journal is regularly compacted into a snapshot whose postings are loaded
+lazily from a memory map.
+
+For usage, look at the unit tests.
+"""
+
+import os
+import re
+import math
+import mmap
+import array
+import fcntl
+import heapq
+import struct
+import cPickle
+import threading
+import unicodedata
+from itertools import izip
+
+from .sqliteengine import unialpha
+
+K1 = 1.2
+B = 0.75
+SEPARATORS = re.compile(r'([\W_]+)', re.UNICODE)
+
+
+def normalize(text):
+    '''The words of ``text``, lower case, diacritics removed'''
+    text = unicodedata.normalize('NFKD', unicode(text).lower())
+    text = u''.join(c for c in text if not unicodedata.combining(c))
+    return unialpha.sub(u' ', text).split()
+
+
+def grams(word):
+    '''The substrings of 1 to 3 letters of ``word``'''
+    return set(word[i:i + n] for n in (1, 2, 3) for i in xrange(len(word) - n + 1))
+
+
+def snippet(text, words, size=12):
+    '''Extract of ``text`` around the first of its words containing one of ``words``, highlighted'''
+    # words at even indexes, separators at odd ones
+    pieces = SEPARATORS.split(text)
+    hits = [
+        i for i in xrange(0, len(pieces), 2)
+        if pieces[i] and any(word in w for w in normalize(pieces[i]) for word in words)
+    ]
+    if not hits:
+        return None
+    start = max(0, hits[0] - 4)
+    end = min(len(pieces), start + 2 * size - 1)
+    extract = u''.join(u'<b>%s</b>' % pieces[i] if i in hits else pieces[i] for i in xrange(start, end))
+    return (u'...' if start else u'') + extract + (u'...' if end < len(pieces) - 1 else u'')
+
+
+class MemoryQueryMapper(object):
+    '''
+    Mapped queries are (search, words, count, terms) tuples:
+      - ``search(collection, candidates)`` returns the scores of the matching
+        documents of a collection, by document number, among the
+        ``candidates`` documents if not None
+      - ``words`` are the words of the full text conditions
+      - ``count(collection)`` estimates the number of matching documents
+      - ``terms`` are the conditions of a conjunction, or None
+    '''
+
+    def _fulltext(self, fields, value):
+        def search(collection, candidates):
+            return collection.match(fields or collection.fulltext, value, candidates)
+        # evaluated last, on the documents selected by the other conditions
+        return (search, tuple(normalize(value)), lambda collection: len(collection.docs) + 1, None)
+
+    def match(self, field, value):
+        return self._fulltext([field.name], value)
+
+    def matchany(self, schema, value):
+        return self._fulltext(None, value)
+
+    def _compare(self, field, predicate):
+        return (lambda collection, candidates: collection.select(field.name, predicate, candidates), (),
+                lambda collection: len(collection.ids), None)
+
+    def eq(self, field, value):
+        return self.in_(field, (value,))
+
+    def gt(self, field, value):
+        return self._compare(field, lambda v: v > value)
+
+    def gte(self, field, value):
+        return self._compare(field, lambda v: v >= value)
+
+    def lt(self, field, value):
+        return self._compare(field, lambda v: v < value)
+
+    def lte(self, field, value):
+        return self._compare(field, lambda v: v <= value)
+
+    def in_(self, field, value):
+        return (lambda collection, candidates: collection.equal(field.name, value, candidates), (),
+                lambda collection: collection.count(field.name, value), None)
+
+    def and_(self, exp1, exp2):
+        terms = (exp1[3] or (exp1,)) + (exp2[3] or (exp2,))
+
+        def search(collection, candidates):
+            # the most selective conditions first, the scores are null until a full text one
+            scores, scored = None, False
+            for term in sorted(terms, key=lambda term: term[2](collection)):
+                matches = term[0](collection, candidates if scores is None else scores)
+                if scored and term[1]:
+                    scores = dict((docnum, scores[docnum] + score) for docnum, score in matches.iteritems())
+                elif scored:
+                    scores = dict((docnum, scores[docnum]) for docnum in matches)
+                else:
+                    scores = matches
+                scored = scored or bool(term[1])
+                if not scores:
+                    return {}
+            return scores
+
+        def count(collection):
+            return min(term[2](collection) for term in terms)
+        return (search, exp1[1] + exp2[1], count, terms)
+
+    def or_(self, exp1, exp2):
+        search1, search2 = exp1[0], exp2[0]
+
+        def search(collection, candidates):
+            scores = search1(collection, candidates)
+            for docnum, score in search2(collection, candidates).iteritems():
+                scores[docnum] = scores.get(docnum, 0.0) + score
+            return scores
+
+        def count(collection):
+            return exp1[2](collection) + exp2[2](collection)
+        return (search, exp1[1] + exp2[1], count, None)
+
+
+class MemorySchemaMapper(object):
+
+    def __init__(self):
+        self.definitions = {}
+
+    # Schema API
+
+    def define(self, schema_name):
+        self.definitions[schema_name] = {}
+
+    def define_field(self, schema_name, field_type, name, indexed, stored):
+        self.definitions[schema_name][name] = (field_type, indexed, stored)
+
+
+class Collection(object):
+    '''Documents of a type, and their indexes'''
+
+    def __init__(self, fields):
+        # {name: (type, indexed, stored)}
+        self.fields = fields
+        self.fulltext = sorted(name for name, (type_, indexed, __) in fields.iteritems()
+                               if indexed and type_ == 'Text')
+        # by document number: (docid, values, {field: (length, {word: frequency}, words)}, all the words),
+        # None if deleted
+        self.docs = []
+        self.ids = {}
+        # the values of the other indexed fields: {field: {value: set of document numbers}}
+        self.values = dict((name, {}) for name, (type_, indexed, __) in fields.iteritems()
+                           if indexed and type_ != 'Text')
+        # {(field, word): [document numbers, frequencies]}, the numbers of deleted documents are
+        # removed by ``compacted``. Or (offset, count) in ``blob`` until loaded.
+        self.postings = {}
+        self.blob = None
+        # number of live documents of each (field, word)
+        self.df = {}
+        self.lengths = dict.fromkeys(self.fulltext, 0)
+        self.vocabulary = set()
+        # {substring: words}
+        self.grams = {}
+
+    # Documents
+
+    def add(self, docid, values):
+        if docid in self.ids:
+            self.delete(docid)
+        values = dict((name, value) for name, value in values.iteritems() if value is not None)
+        terms = {}
+        for name in self.fulltext:
+            words = normalize(values.get(name) or u'')
+            if not words:
+                continue
+            frequencies = {}
+            for word in words:
+                frequencies[word] = frequencies.get(word, 0) + 1
+            # the words joined, to find the words of a document containing a string at once
+            terms[name] = (len(words), frequencies, u' '.join(frequencies))
+        self._insert(docid, values, terms)
+
+    def _insert(self, docid, values, terms):
+        docnum = len(self.docs)
+        for name, (length, frequencies, __) in terms.iteritems():
+            self.lengths[name] += length
+            for word, frequency in frequencies.iteritems():
+                key = (name, word)
+                if key in self.postings:
+                    docnums, tfs = self._postings(key)
+                else:
+                    docnums, tfs = self.postings[key] = [array.array('i'), array.array('i')]
+                docnums.append(docnum)
+                tfs.append(frequency)
+                self.df[key] = self.df.get(key, 0) + 1
+                if word not in self.vocabulary:
+                    self.vocabulary.add(word)
+                    for gram in grams(word):
+                        self.grams.setdefault(gram, set()).add(word)
+        for name, index in self.values.iteritems():
+            value = values.get(name)
+            if value is not None:
+                index.setdefault(value, set()).add(docnum)
+        self.docs.append((docid, values, terms, u'\n'.join(words for __, __, words in terms.itervalues())))
+        self.ids[docid] = docnum
+
+    def update(self, docid, values):
+        docnum = self.ids.get(docid)
+        if docnum is not None:
+            updated = dict(self.docs[docnum][1])
+            updated.update((name, value) for name, value in values.iteritems() if value is not None)
+            self.add(docid, updated)
+
+    def delete(self, docid):
+        docnum = self.ids.pop(docid, None)
+        if docnum is None:
+            return
+        __, values, terms, __ = self.docs[docnum]
+        self.docs[docnum] = None
+        for name, (length, frequencies, __) in terms.iteritems():
+            self.lengths[name] -= length
+            for word in frequencies:
+                key = (name, word)
+                self.df[key] -= 1
+                if not self.df[key]:
+                    del self.df[key]
+                    del self.postings[key]
+        for name, index in self.values.iteritems():
+            value = values.get(name)
+            if value is not None:
+                index[value].discard(docnum)
+                if not index[value]:
+                    del index[value]
+
+    def dead(self):
+        '''Number of deleted documents still in ``docs`` and in the postings'''
+        return len(self.docs) - len(self.ids)
+
+    def compacted(self):
+        '''Copy of the collection, without the deleted documents nor their words'''
+        collection = Collection(self.fields)
+        for doc in self.docs:
+            if doc is not None:
+                collection._insert(doc[0], doc[1], doc[2])
+        return collection
+
+    # Search
+
+    def _postings(self, key):
+        postings = self.postings[key]
+        if isinstance(postings, tuple):
+            offset, count = postings
+            docnums = array.array('i')
+            docnums.fromstring(self.blob[offset:offset + 4 * count])
+            tfs = array.array('i')
+            tfs.fromstring(self.blob[offset + 4 * count:offset + 8 * count])
+            postings = self.postings[key] = [docnums, tfs]
+        return postings
+
+    def _words(self, word):
+        '''The words of the collection containing ``word``'''
+        if len(word) <= 3:
+            return self.grams.get(word, ())
+        candidates = sorted((self.grams.get(gram, set()) for gram in grams(word) if len(gram) == 3), key=len)
+        return [w for w in candidates[0].intersection(*candidates[1:]) if word in w]
+
+    def _match_word(self, fields, word, candidates):
+        count = len(self.ids)
+        idfs = {}
+
+        def idf(key):
+            if key not in idfs:
+                df = self.df[key]
+                idfs[key] = max(math.log((count - df + 0.5) / (df + 0.5)), 1e-6)
+            return idfs[key]
+        averages = dict((name, float(self.lengths[name]) / count or 1.0) for name in fields)
+        scores = {}
+        docs = self.docs
+        if candidates is not None and len(candidates) * 4 < count:
+            # a small part of the collection: read the words of the documents rather than the postings
+            for docnum in candidates:
+                doc = docs[docnum]
+                if word not in doc[3]:
+                    continue
+                terms = doc[2]
+                score = 0.0
+                for name in fields:
+                    if name in terms and word in terms[name][2]:
+                        length, frequencies, __ = terms[name]
+                        norm = K1 * (1 - B + B * length / averages[name])
+                        for w in [w for w in frequencies if word in w]:
+                            tf = frequencies[w]
+                            score += (idfs.get((name, w)) or idf((name, w))) * tf * (K1 + 1) / (tf + norm)
+                if score:
+                    scores[docnum] = score
+            return scores
+        for w in self._words(word):
+            for name in fields:
+                key = (name, w)
+                if key not in self.df:
+                    continue
+                weight = idf(key)
+                average = averages[name]
+                docnums, tfs = self._postings(key)
+                for docnum, tf in izip(docnums, tfs):
+                    if candidates is not None and docnum not in candidates:
+                        continue
+                    doc = docs[docnum]
+                    if doc is None:
+                        continue
+                    norm = K1 * (1 - B + B * doc[2][name][0] / average)
+                    scores[docnum] = scores.get(docnum, 0.0) + weight * tf * (K1 + 1) / (tf + norm)
+        return scores
+
+    def match(self, fields, value, candidates=None):
+        '''Documents with all the words of ``value`` in ``fields``, as parts of their words, BM25 scored'''
+        words = normalize(value)
+        if not words or not self.ids:
+            return {}
+        scores = candidates
+        for word in words:
+            matches = self._match_word(fields, word, scores)
+            if scores is candidates:
+                scores = matches
+            else:
+                scores = dict((docnum, scores[docnum] + score) for docnum, score in matches.iteritems())
+            if not scores:
+                return {}
+        return scores
+
+    def count(self, name, values):
+        '''Number of documents with one of ``values`` in field ``name``'''
+        if name not in self.values:
+            return len(self.ids)
+        return sum(len(self.values[name].get(value, ())) for value in values)
+
+    def equal(self, name, values, candidates=None):
+        if name not in self.values:
+            return self.select(name, lambda v: v in values, candidates)
+        index = self.values[name]
+        if candidates is not None and len(values) == 1:
+            value, = values
+            docnums = index.get(value, set())
+            if len(candidates) < len(docnums):
+                return dict((docnum, 0.0) for docnum in candidates if docnum in docnums)
+            return dict((docnum, 0.0) for docnum in docnums if docnum in candidates)
+        docnums = set()
+        for value in values:
+            docnums.update(index.get(value, ()))
+        if candidates is not None:
+            docnums.intersection_update(candidates)
+        return dict.fromkeys(docnums, 0.0)
+
+    def select(self, name, predicate, candidates=None):
+        field = self.fields.get(name)
+        if field is None or not field[1]:
+            # not indexed
+            return {}
+        if name in self.values:
+            docnums = set()
+            for value, numbers in self.values[name].iteritems():
+                if predicate(value):
+                    docnums.update(numbers)
+        else:
+            docnums = set(self.ids[docid] for docid, values, __, __ in filter(None, self.docs)
+                          if name in values and predicate(values[name]))
+        if candidates is not None:
+            docnums.intersection_update(candidates)
+        return dict.fromkeys(docnums, 0.0)
+
+    # Persistence
+
+    def dump(self, out):
+        '''Write the postings to the ``out`` file and return the state of the collection'''
+        directory = {}
+        for key in self.postings:
+            docnums, tfs = self._postings(key)
+            directory[key] = (out.tell(), len(docnums))
+            docnums.tofile(out)
+            tfs.tofile(out)
+        state = dict(self.__dict__, postings=directory)
+        del state['blob']
+        return state
+
+    @classmethod
+    def load(cls, state, blob):
+        collection = cls.__new__(cls)
+        collection.__dict__.update(state)
+        collection.blob = blob
+        return collection
+
+
+class Index(object):
+
+    '''
+    Collections shared by the engines of a process, with their persistence:
+      - ``<index>.mem``: snapshot of the collections
+      - ``<index>.mem-log``: operations committed since the snapshot
+      - ``<index>.mem-lock``: lock of the two files, between the processes
+    '''
+
+    # size of the journal, in bytes, that triggers a snapshot
+    SNAPSHOT_SIZE = 16 * 1024 * 1024
+    # number of deleted documents, beyond the number of live ones, that triggers a compaction
+    COMPACT_MIN = 1000
+
+    def __init__(self, name, folder):
+        self.folder = folder
+        self.collections = {}
+        self.lock = threading.RLock()
+        self.log = None
+        self.log_inode = None
+        self.position = 0
+        self.lock_file = None
+        self._snapshot_thread = None
+        if folder is not None:
+            path = os.path.join(folder, name + MemorySearchEngine.EXTENSION)
+            self.snapshot_path = path
+            self.log_path = path + '-log'
+            self.lock_path = path + '-lock'
+
+    def _flock(self, operation):
+        if self.lock_file is None:
+            self.lock_file = open(self.lock_path, 'a')
+        fcntl.flock(self.lock_file, operation)
+
+    def apply(self, operation):
+        kind, args = operation[0], operation[1:]
+        if kind == 'create':
+            for name, fields in args[0].iteritems():
+                self.collections[name] = Collection(fields)
+        elif args[0] in self.collections:
+            collection = self.collections[args[0]]
+            getattr(collection, kind)(*args[1:])
+            # each update leaves a deleted document: amortized, as a list growth
+            if collection.dead() > max(len(collection.ids), self.COMPACT_MIN):
+                self.collections[args[0]] = collection.compacted()
+
+    def _load(self):
+        self.collections = {}
+        try:
+            f = open(self.snapshot_path, 'rb')
+        except IOError:
+            return
+        with f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset, = struct.unpack('<Q', blob[:8])
+        for name, state in cPickle.loads(blob[offset:]).iteritems():
+            self.collections[name] = Collection.load(state, blob)
+
+    def _catch_up(self):
+        '''Replay the journal, reloading the snapshot first if it was replaced. Lock held.'''
+        try:
+            inode = os.stat(self.log_path).st_ino
+        except OSError:
+            inode = None
+        if self.log is None or inode != self.log_inode:
+            self._load()
+            if self.log is not None:
+                self.log.close()
+            self.log = open(self.log_path, 'a+b')
+            self.log_inode = os.fstat(self.log.fileno()).st_ino
+            self.position = 0
+        self.log.seek(self.position)
+        data = self.log.read()
+        offset = 0
+        while offset + 4 <= len(data):
+            size, = struct.unpack('<I', data[offset:offset + 4])
+            if offset + 4 + size > len(data):
+                # interrupted write
+                break
+            for operation in cPickle.loads(data[offset + 4:offset + 4 + size]):
+                self.apply(operation)
+            offset += 4 + size
+        self.position += offset
+
+    def sync(self):
+        '''See the operations committed by the other processes'''
+        if self.folder is None:
+            return
+        with self.lock:
+            try:
+                stat = os.stat(self.log_path)
+            except OSError:
+                stat = None
+            if self.log is not None and stat is not None and \
+                    (stat.st_ino, stat.st_size) == (self.log_inode, self.position):
+                return
+            self._flock(fcntl.LOCK_SH)
+            try:
+                self._catch_up()
+            finally:
+                self._flock(fcntl.LOCK_UN)
+
+    def commit(self, operations):
+        with self.lock:
+            if self.folder is None:
+                for operation in operations:
+                    self.apply(operation)
+                return
+            self._flock(fcntl.LOCK_EX)
+            try:
+                self._catch_up()
+                # drop an interrupted write
+                self.log.truncate(self.position)
+                data = cPickle.dumps(operations, cPickle.HIGHEST_PROTOCOL)
+                self.log.write(struct.pack('<I', len(data)) + data)
+                self.log.flush()
+                self._catch_up()
+                snapshot = self.position > self.SNAPSHOT_SIZE
+            finally:
+                self._flock(fcntl.LOCK_UN)
+            if snapshot and (self._snapshot_thread is None or not self._snapshot_thread.is_alive()):
+                # not in the way of the commit
+                self._snapshot_thread = threading.Thread(target=self._snapshot, name='index-snapshot')
+                self._snapshot_thread.daemon = True
+                self._snapshot_thread.start()
+
+    def _snapshot(self):
+        '''Write the collections, compacted, in a new snapshot and start a new journal
+
+        The snapshot is written without lock, from a copy of the collections:
+        the operations committed meanwhile are moved to the new journal.
+        '''
+        with self.lock:
+            self._flock(fcntl.LOCK_SH)
+            try:
+                self._catch_up()
+            finally:
+                self._flock(fcntl.LOCK_UN)
+            collections = dict((name, c.compacted()) for name, c in self.collections.iteritems())
+            inode, position = self.log_inode, self.position
+        tmp = '%s.%d-%d.tmp' % (self.snapshot_path, os.getpid(), id(collections))
+        try:
+            with open(tmp, 'wb') as out:
+                out.write('\0' * 8)
+                states = dict((name, collection.dump(out)) for name, collection in collections.iteritems())
+                offset = out.tell()
+                cPickle.dump(states, out, cPickle.HIGHEST_PROTOCOL)
+                out.seek(0)
+                out.write(struct.pack('<Q', offset))
+            with self.lock:
+                self._flock(fcntl.LOCK_EX)
+                try:
+                    self._catch_up()
+                    if self.log_inode != inode:
+                        # another process wrote a snapshot meanwhile
+                        return
+                    self.log.seek(position)
+                    tail = self.log.read(self.position - position)
+                    with open(self.log_path + '.tmp', 'wb') as log:
+                        log.write(tail)
+                    os.rename(tmp, self.snapshot_path)
+                    # the other processes reload the snapshot when they see a new journal
+                    os.rename(self.log_path + '.tmp', self.log_path)
+                    self.log.close()
+                    self.log = open(self.log_path, 'a+b')
+                    self.log_inode = os.fstat(self.log.fileno()).st_ino
+                    self.position = len(tail)
+                finally:
+                    self._flock(fcntl.LOCK_UN)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def optimize(self):
+        '''Drop the deleted documents from the postings and write a snapshot'''
+        self.sync()
+        with self.lock:
+            self.collections = dict((name, c.compacted()) for name, c in self.collections.iteritems())
+        if self.folder is not None:
+            self._snapshot()
+
+    def replace(self, other):
+        '''Take the collections of the ``other`` index'''
+        with self.lock:
+            if self.folder is None:
+                self.collections = other.collections
+                return
+            other.optimize()
+            self._flock(fcntl.LOCK_EX)
+            try:
+                os.rename(other.snapshot_path, self.snapshot_path)
+                self._load()
+                open(self.log_path + '.tmp', 'wb').close()
+                os.rename(self.log_path + '.tmp', self.log_path)
+                self.log = None
+                self._catch_up()
+            finally:
+                self._flock(fcntl.LOCK_UN)
+            other.drop()
+
+    def drop(self):
+        with self.lock:
+            self.collections = {}
+            if self.folder is None:
+                return
+            for path in (self.snapshot_path, self.log_path, self.lock_path):
+                if os.path.exists(path):
+                    os.unlink(path)
+            if self.log is not None:
+                self.log.close()
+            if self.lock_file is not None:
+                self.lock_file.close()
+            self.log = self.log_inode = self.lock_file = None
+            self.position = 0
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(name, folder):
+    '''The ``Index`` shared by the engines of the process'''
+    with _indexes_lock:
+        key = (name, folder and os.path.abspath(folder))
+        if key not in _indexes:
+            _indexes[key] = Index(name, folder)
+        return _indexes[key]
+
+
+class MemoryIndexCursor(object):
+
+    def __init__(self, index, snippets=False):
+        self.index = index
+        self.snippets = snippets
+        self.operation = None
+
+    # Document API
+
+    def insert(self, schema_name, docid, **fields):
+        self.operation = ('add', schema_name, docid, fields)
+
+    def update(self, schema_name, docid, **fields):
+        self.operation = ('update', schema_name, docid, fields)
+
+    # Query API
+
+    def search(self, schema_name, fields_to_load, mapped_query, limit):
+        """
+        ``fields_to_load`` is  a list of field names.
+        """
+        self.schema_name = schema_name
+        self.fields_to_load = fields_to_load
+        self.mapped_query = mapped_query
+        self.limit = limit
+
+    def get_results(self, result_factory):
+        """
+        Return a list of (score, document) tuples, best first.
+        Without a full text condition, every result is given weight 1.
+        """
+        collection = self.index.collections.get(self.schema_name)
+        if collection is None:
+            return []
+        search, words = self.mapped_query[:2]
+        scores = search(collection, None)
+        if not words:
+            scores = dict.fromkeys(scores, 1)
+        best = heapq.nsmallest(self.limit, scores.iteritems(), key=lambda (docnum, score): (-score, docnum))
+        results = []
+        for docnum, score in best:
+            docid, values, __, __ = collection.docs[docnum]
+            document = result_factory(docid, **dict((name, values.get(name)) for name in self.fields_to_load))
+            if self.snippets:
+                document._snippet = None
+                for name in collection.fulltext:
+                    document._snippet = values.get(name) and snippet(values[name], words)
+                    if document._snippet:
+                        break
+            results.append((score, document))
+        return results
+
+
+class MemorySearchEngine(object):
+
+    '''
+    Search engine holding its index in memory: no round trip to a database
+    or to a cluster. The words are matched anywhere in the words of the
+    documents (infix searches), and the results are ranked with BM25.
+
+    Thread safe: the operations of each thread are kept until its commit.
+    The searches don't see the operations not committed yet.
+
+    Options:
+      - ``index_folder`` -- where to persist the index, shared by the processes
+        of the site. If not given, the index only lives in memory.
+    '''
+
+    # make it compatible with services
+    LOAD_PRIORITY = 30
+    EXTENSION = '.mem'
+
+    def __init__(self, index, index_folder=None):
+        assert(index.isalnum())
+        self.init_state(index, index_folder)
+
+    def init_state(self, collection, index_folder=None):
+        self.collection = collection
+        self.index_folder = index_folder
+        self.index = get_index(collection, index_folder)
+        self.mapper = MemoryQueryMapper()
+        # operations of each thread, until committed
+        self._local = threading.local()
+
+    # be persistence friendly
+    def __getstate__(self):
+        return (self.collection, self.index_folder)
+
+    def __setstate__(self, state):
+        self.init_state(*state)
+
+    @property
+    def _operations(self):
+        if not hasattr(self._local, 'operations'):
+            self._local.operations = []
+        return self._local.operations
+
+    def add_document(self, document):
+        '''
+        Add a document to the data store, in collection (a.k.a. index)
+        `collection`, under the document type (a.k.a. schema) `schema`.
+        '''
+        cursor = MemoryIndexCursor(self.index)
+        document.save(cursor)
+        self._operations.append(cursor.operation)
+
+    def add_documents(self, documents, replace=False):
+        '''
+        Add many documents at once. The documents already in the index are
+        always replaced.
+        '''
+        for document in documents:
+            self.add_document(document)
+
+    def delete_document(self, schema, docid):
+        '''
+        Remove document from index and storage.
+        '''
+        self._operations.append(('delete', schema.type_name, docid))
+
+    def update_document(self, document):
+        '''Update document'''
+        cursor = MemoryIndexCursor(self.index)
+        document.save(cursor, update=True)
+        self._operations.append(cursor.operation)
+
+    def commit(self, sync=False):
+        '''``sync`` option is ignored by this engine'''
+        operations = self._operations
+        self._local.operations = []
+        if operations:
+            self.index.commit(operations)
+
+    def cancel(self):
+        '''
+        Forget documents added since last commit'''
+        self._local.operations = []
+
+    def search(self, query, size=20, snippets=False):
+        '''
+        Search the index.
+        Full text results are ranked with BM25.
+        '''
+        self.index.sync()
+        with self.index.lock:
+            return query.search(MemoryIndexCursor(self.index, snippets), self.mapper, size)
+
+    def optimize(self, automerge=None):
+        '''
+        Drop the deleted documents from the index and, if persisted, write a
+        snapshot. ``automerge`` is ignored.
+        '''
+        self.index.optimize()
+
+    def delete_collection(self):
+        self.cancel()
+        self.index.drop()
+
+    def create_collection(self, schemas):
+        '''
+        Init the collections the first time.
+        Just use once! Or you'll have to reindex all your documents.
+        `schemas` is a list of Document classes or Schema instances.
+        '''
+        mapper = MemorySchemaMapper()
+        for schema in schemas:
+            schema.map(mapper)
+        self.index.commit([('create', mapper.definitions)])
+
+    def create_shadow(self, schemas):
+        '''
+        Create the collections in a new index and return an engine writing
+        to it, to rebuild the index while the current one is searched.
+        '''
+        shadow = MemorySearchEngine(self.collection + 'shadow', self.index_folder)
+        shadow.delete_collection()
+        shadow.create_collection(schemas)
+        return shadow
+
+    def swap(self, shadow):
+        '''
+        Replace the index by the ``shadow`` one, for all the processes.
+        '''
+        shadow.commit()
+        self.index.replace(shadow.index)
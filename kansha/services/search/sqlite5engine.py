@@ -0,0 +1,358 @@
+#-*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+"""
+SQLite FTS5 based search engine plugin.
+Zero dependency, needs sqlite 3.9.0 or newer compiled with FTS5.
+
+Each document type is stored in an ordinary table, with B-tree indexes on
+its non full text fields, and only the full text fields are indexed by an
+external content FTS5 table, kept in sync by triggers.
+
+With the ``scope`` option, the full text fields are also indexed by a second
+FTS5 table, with each word prefixed by the value of the scope field of its
+document (``12xword`` for the word ``word`` in a document of scope 12).
+A full text search restricted to a scope (``match(...) & (scope == 12)``)
+then only reads the index entries of this scope: its cost does not depend
+on the size of the other scopes.
+
+For usage, look at the unit tests.
+"""
+
+import re
+
+from .sqliteengine import unialpha, IndexCursor, SQLiteFTSEngine
+
+SQLTYPES = {
+    'Text': 'TEXT',
+    'Keyword': 'TEXT',
+    'Attachment': 'TEXT',
+    'Float': 'REAL',
+    'Int': 'INTEGER',
+    'Boolean': 'INTEGER',
+    'Datetime': 'TIMESTAMP'
+}
+
+
+def scope_key(value):
+    '''Prefix of the words of the documents of scope ``value``, an integer'''
+    value = int(value)
+    return (u'n%dx' if value < 0 else u'%dx') % abs(value)
+
+
+def scoped(value, text):
+    '''SQL function: the words of ``text`` prefixed by the scope key of ``value``'''
+    if text is None or value is None:
+        return None
+    key = scope_key(value)
+    return u' '.join(key + word for word in unialpha.sub(u' ', text).split())
+
+
+class SQLite5QueryMapper(object):
+    '''
+    Mapped queries are (where clause, parameters, full text queries, scope) tuples.
+    The full text queries are (schema name, column or None, words, scope) tuples,
+    joined by the index cursor, for ranking.
+    The scope is the value the ``scope`` field is compared to, if the query
+    requires it.
+    '''
+
+    def __init__(self, scope=''):
+        self.scope = scope
+
+    def _match(self, schema_name, column, value):
+        words = tuple(unialpha.sub(u' ', value).split())
+        if not words:
+            return ('0', (), (), None)
+        # the full text query is joined as ``m<number>``: number it later
+        return ('m%(match)d.docnum is not null', (), ((schema_name, column, words, None),), None)
+
+    def match(self, field, value):
+        return self._match(field.schema.type_name, field.name, value)
+
+    def matchany(self, schema, value):
+        return self._match(schema.type_name, None, value)
+
+    def _compare(self, field, operator, value):
+        return ('d.%s %s ?' % (field.name, operator), (value,), (), None)
+
+    def eq(self, field, value):
+        query = self._compare(field, '=', value)
+        if self.scope and field.name == self.scope and value is not None:
+            query = query[:3] + (value,)
+        return query
+
+    def gt(self, field, value):
+        return self._compare(field, '>', value)
+
+    def gte(self, field, value):
+        return self._compare(field, '>=', value)
+
+    def lt(self, field, value):
+        return self._compare(field, '<', value)
+
+    def lte(self, field, value):
+        return self._compare(field, '<=', value)
+
+    def in_(self, field, value):
+        query = 'd.%s in (%s)' % (field.name, ','.join(('?',) * len(value)))
+        return (query, tuple(value), (), None)
+
+    def and_(self, exp1, exp2):
+        query, params, matches, scope = self._combine('and', exp1, exp2)
+        scope = exp1[3] if exp1[3] is not None else exp2[3]
+        if scope is not None:
+            # the documents must be in the scope anyway: restrict the full text queries to it
+            matches = tuple(
+                (schema_name, column, words, scope if match_scope is None else match_scope)
+                for schema_name, column, words, match_scope in matches
+            )
+        return (query, params, matches, scope)
+
+    def or_(self, exp1, exp2):
+        return self._combine('or', exp1, exp2)
+
+    def _combine(self, operator, exp1, exp2):
+        query = '(%s %s %s)' % (exp1[0], operator, exp2[0])
+        return (query, tuple(exp1[1]) + tuple(exp2[1]), tuple(exp1[2]) + tuple(exp2[2]), None)
+
+
+class SQLite5SchemaMapper(object):
+
+    def __init__(self, db_cursor, prefix, detail, scope=''):
+        self.db_cursor = db_cursor
+        self.prefix = prefix
+        self.detail = detail
+        self.scope = scope
+        self.mappings = {}
+
+    # Schema API
+
+    def define(self, schema_name):
+        self.mappings[schema_name] = {'fields': [], 'fulltext': [], 'indexed': [], 'scoped': False}
+
+    def define_field(self, schema_name, field_type, name, indexed, stored):
+        # all the fields are stored: external content tables need them to update the index
+        mapping = self.mappings[schema_name]
+        mapping['fields'].append('%s %s' % (name, SQLTYPES[field_type]))
+        if indexed and field_type == 'Text':
+            mapping['fulltext'].append(name)
+        elif indexed:
+            mapping['indexed'].append(name)
+        if name == self.scope:
+            assert field_type in ('Int', 'Boolean'), 'the scope field must be an integer'
+            mapping['scoped'] = True
+
+    # specific API
+
+    def create(self):
+        for schema_name, mapping in self.mappings.iteritems():
+            self.db_cursor.execute('drop table if exists %s_scoped' % schema_name)
+            self.db_cursor.execute('drop view if exists %s_scopedtext' % schema_name)
+            self.db_cursor.execute('drop table if exists %s_fts' % schema_name)
+            self.db_cursor.execute('drop table if exists %s' % schema_name)
+            self.db_cursor.execute(
+                'create table %s (docnum integer primary key, id text unique not null, %s)' %
+                (schema_name, ', '.join(mapping['fields']))
+            )
+            for name in mapping['indexed']:
+                self.db_cursor.execute('create index %s_%s on %s(%s)' % (schema_name, name, schema_name, name))
+            fulltext = mapping['fulltext']
+            if not fulltext:
+                continue
+            params = {
+                'table': schema_name, 'columns': ', '.join(fulltext),
+                'new': ', '.join('new.' + name for name in fulltext),
+                'old': ', '.join('old.' + name for name in fulltext),
+                'prefix': self.prefix, 'detail': self.detail
+            }
+            self.db_cursor.execute(
+                '''create virtual table %(table)s_fts using fts5(%(columns)s, content='%(table)s', content_rowid='docnum',
+                   tokenize='unicode61 remove_diacritics 2', prefix='%(prefix)s', detail=%(detail)s)''' % params
+            )
+            inserts = ['insert into %(table)s_fts(rowid, %(columns)s) values (new.docnum, %(new)s);' % params]
+            deletes = [
+                "insert into %(table)s_fts(%(table)s_fts, rowid, %(columns)s) values ('delete', old.docnum, %(old)s);" %
+                params
+            ]
+            if mapping['scoped']:
+                params.update(
+                    scope=self.scope,
+                    scoped=', '.join('scoped(%s, %s) as %s' % (self.scope, name, name) for name in fulltext),
+                    scoped_new=', '.join('scoped(new.%s, new.%s)' % (self.scope, name) for name in fulltext),
+                    scoped_old=', '.join('scoped(old.%s, old.%s)' % (self.scope, name) for name in fulltext)
+                )
+                # the scoped words are read from a view, for the snippets
+                self.db_cursor.execute(
+                    'create view %(table)s_scopedtext as select docnum, %(scoped)s from %(table)s' % params
+                )
+                # detail=full: else bm25() gets the positions of the words by reading
+                # the view, i.e. calling scoped() for each result, which is slow
+                self.db_cursor.execute(
+                    '''create virtual table %(table)s_scoped using fts5(%(columns)s, content='%(table)s_scopedtext',
+                       content_rowid='docnum', tokenize='unicode61 remove_diacritics 2', detail=full)''' %
+                    params
+                )
+                inserts.append(
+                    'insert into %(table)s_scoped(rowid, %(columns)s) values (new.docnum, %(scoped_new)s);' % params
+                )
+                deletes.append(
+                    "insert into %(table)s_scoped(%(table)s_scoped, rowid, %(columns)s) "
+                    "values ('delete', old.docnum, %(scoped_old)s);" % params
+                )
+            params.update(inserts='\n'.join(inserts), deletes='\n'.join(deletes))
+            self.db_cursor.execute('''
+                create trigger %(table)s_ai after insert on %(table)s begin
+                  %(inserts)s
+                end''' % params)
+            self.db_cursor.execute('''
+                create trigger %(table)s_ad after delete on %(table)s begin
+                  %(deletes)s
+                end''' % params)
+            self.db_cursor.execute('''
+                create trigger %(table)s_au after update on %(table)s begin
+                  %(deletes)s
+                  %(inserts)s
+                end''' % params)
+
+
+class SQLite5IndexCursor(IndexCursor):
+
+    SNIPPET = u"snippet(%s, -1, '<b>', '</b>', '...', 12)"
+
+    def __init__(self, db_cursor, snippets=False):
+        super(SQLite5IndexCursor, self).__init__(db_cursor, snippets)
+        # prefixes of the scoped words to remove from the snippets
+        self.scope_keys = set()
+
+    # Query API
+
+    def _fts_query(self, column, words, scope):
+        key = u'' if scope is None else scope_key(scope)
+        query = u' '.join(u'"%s%s"*' % (key, word) for word in words)
+        return query if column is None else u'{%s} : (%s)' % (column, query)
+
+    def search(self, schema_name, fields_to_load, mapped_query, limit):
+        """
+        ``fields_to_load`` is  a list of field names.
+        """
+        where, params, matches, __ = mapped_query
+        columns = ['d.id as docid'] + ['d.' + field for field in fields_to_load]
+        joins = []
+        self.params = []
+        for i, (match_schema, column, words, scope) in enumerate(matches):
+            table = match_schema + ('_fts' if scope is None else '_scoped')
+            if scope is not None:
+                self.scope_keys.add(scope_key(scope))
+            # bm25() is lower for better matches
+            ranking = 'bm25(%s) as score' % table
+            if self.snippets:
+                ranking += (', ' + self.SNIPPET + ' as snippet') % table
+            joins.append(
+                'left join (select rowid as docnum, %s from %s where %s match ?) m%d on m%d.docnum = d.docnum' %
+                (ranking, table, table, i, i)
+            )
+            self.params.append(self._fts_query(column, words, scope))
+            where = where.replace('%(match)d', str(i), 1)
+        self.params.extend(params)
+        order = ''
+        if matches:
+            columns.append('-(%s) as _score' % ' + '.join('coalesce(m%d.score, 0)' % i for i in range(len(matches))))
+            order = 'order by _score desc'
+            if self.snippets:
+                snippets = ['m%d.snippet' % i for i in range(len(matches))]
+                columns.append('coalesce(%s, null) as _snippet' % ', '.join(snippets))
+        self.query = 'select %s from %s d %s where %s %s limit %s' % (
+            ', '.join(columns), schema_name, ' '.join(joins), where, order, limit
+        )
+
+    def get_results(self, result_factory):
+        results = super(SQLite5IndexCursor, self).get_results(result_factory)
+        if self.snippets and self.scope_keys:
+            keys = re.compile(u'(?<!\\w)(%s)' % u'|'.join(re.escape(key) for key in self.scope_keys), re.UNICODE)
+            for __, document in results:
+                if document._snippet:
+                    document._snippet = keys.sub(u'', document._snippet)
+        return results
+
+
+class SQLite5Engine(SQLiteFTSEngine):
+
+    '''
+    Search engine based on SQLite FTS5: smaller index and faster prefix searches
+    than ``SQLiteFTSEngine``. Full text fields are indexed with the unicode61
+    tokenizer, diacritics removed.
+
+    Options:
+      - ``prefix`` -- lengths of the prefix indexes, space separated (e.g. "2 3")
+      - ``detail`` -- "full" to support phrase queries, or "column" for a smaller index
+      - ``automerge`` -- FTS5 automerge setting, from 2 to 16 (0 to disable)
+      - ``scope`` -- name of an integer field partitioning the documents
+        (e.g. "board_id"), to index the full text fields by scope too
+    '''
+
+    EXTENSION = '.fts5'
+    query_mapper_factory = SQLite5QueryMapper
+    index_cursor_factory = SQLite5IndexCursor
+
+    def __init__(self, index, index_folder, prefix='3', detail='column', automerge=4, scope=''):
+        assert(index.isalnum())
+        assert(all(length.isdigit() for length in prefix.split()))
+        assert(detail in ('full', 'column', 'none'))
+        assert(not scope or scope.replace('_', '').isalnum())
+        self.init_state(index, index_folder, prefix, detail, int(automerge), scope)
+
+    def init_state(self, collection, index_folder, prefix='3', detail='column', automerge=4, scope=''):
+        self.prefix = prefix
+        self.detail = detail
+        self.automerge = automerge
+        self.scope = scope
+        super(SQLite5Engine, self).init_state(collection, index_folder)
+        self.mapper = self.query_mapper_factory(scope)
+
+    # be persistence friendly
+    def __getstate__(self):
+        return (self.collection, self.index_folder, self.prefix, self.detail, self.automerge, self.scope)
+
+    def _connect(self):
+        connection = super(SQLite5Engine, self)._connect()
+        connection.create_function('scoped', 2, scoped)
+        return connection
+
+    def create_collection(self, schemas):
+        '''
+        Init the collections the first time.
+        Just use once! Or you'll have to reindex all your documents.
+        `schemas` is a list of Document classes or Schema instances.
+        '''
+        c = self._get_cursor()
+        mapper = SQLite5SchemaMapper(c, self.prefix, self.detail, self.scope)
+        for schema in schemas:
+            schema.map(mapper)
+        mapper.create()
+        self.commit()
+        self.optimize(self.automerge)
+
+    def _fts_tables(self):
+        c = self._get_cursor()
+        c.execute("select name from sqlite_master where type = 'table' and sql like 'CREATE VIRTUAL TABLE % USING fts5%'")
+        return [name for name, in c.fetchall()]
+
+    def optimize(self, automerge=None):
+        '''
+        Merge the index segments: all of them, or set the ``automerge``
+        setting (incremental merges on writes) if given.
+        '''
+        c = self._get_cursor()
+        for table in self._fts_tables():
+            if automerge is None:
+                c.execute("insert into %s(%s) values ('optimize')" % (table, table))
+            else:
+                c.execute("insert into %s(%s, rank) values ('automerge', ?)" % (table, table), (automerge,))
+        self.commit()
@@ -15,11 +15,47 @@ For usage, look at the unit tests.
 
 import sqlite3
 import os.path
+import struct
+import math
 import re
+import time
+import copy
+import threading
+import Queue
 
 unialpha = re.compile('[\W_]+', re.UNICODE)
 
 
+def bm25(raw_matchinfo, *weights):
+    """
+    Okapi BM25 relevance of a FTS4 row, from its ``matchinfo(table, 'pcnalx')``.
+    The optional ``weights`` are those of the columns of the table (default 1).
+    """
+    K1 = 1.2
+    B = 0.75
+    matchinfo = struct.unpack('@%dI' % (len(raw_matchinfo) // 4), raw_matchinfo)
+    if not matchinfo:
+        # row selected by another condition than the full text one
+        return 0.0
+    phrases, columns, total_docs = matchinfo[:3]
+    avg_lengths = matchinfo[3:3 + columns]
+    lengths = matchinfo[3 + columns:3 + 2 * columns]
+    hits = matchinfo[3 + 2 * columns:]
+    score = 0.0
+    for phrase in xrange(phrases):
+        for column in xrange(columns):
+            weight = weights[column] if column < len(weights) else 1
+            x = 3 * (column + phrase * columns)
+            frequency = float(hits[x])
+            if not weight or not frequency:
+                continue
+            docs_with_phrase = hits[x + 2]
+            idf = max(math.log((total_docs - docs_with_phrase + 0.5) / (docs_with_phrase + 0.5)), 1e-6)
+            ratio = float(lengths[column]) / (avg_lengths[column] or 1)
+            score += weight * idf * frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * ratio))
+    return score
+
+
 class SQLiteFTSQueryMapper(object):
 
     def match(self, field, value):
@@ -118,8 +154,12 @@ class SQLiteFTSSchemaMapper(object):
 
 class IndexCursor(object):
 
-    def __init__(self,  db_cursor):
+    # snippets are not escaped: escape them first if you render them as HTML
+    SNIPPET = u"snippet(%s, '<b>', '</b>', '...', -1, 12)"
+
+    def __init__(self,  db_cursor, snippets=False):
         self.db_cursor = db_cursor
+        self.snippets = snippets
         self.query = ''
         self.params = []
 
@@ -153,18 +193,37 @@ class IndexCursor(object):
         ``fields_to_load`` is  a list of field names.
         """
         where, params = mapped_query
-        self.query = 'select id as docid, %s from %s where %s limit %s' % (
-            ', '.join(field for field in fields_to_load),
-            schema_name, where, limit
+        columns = ['id as docid'] + fields_to_load
+        order = ''
+        # ranking functions only make sense for full text queries
+        if ' match ?' in where:
+            columns.append("bm25(matchinfo(%s, 'pcnalx')) as _score" % schema_name)
+            order = 'order by _score desc'
+            if self.snippets:
+                columns.append((self.SNIPPET + ' as _snippet') % schema_name)
+        self.query = 'select %s from %s where %s %s limit %s' % (
+            ', '.join(columns), schema_name, where, order, limit
         )
         self.params = params
 
     def get_results(self, result_factory):
+        """
+        Return a list of (score, document) tuples, best first.
+        Without a full text condition, every result is given weight 1.
+        With the ``snippets`` option, the documents have a ``_snippet`` attribute
+        with the matched terms highlighted.
+        """
         self.execute()
         fields = [d[0].lower() for d in self.db_cursor.description]
-        # no score function in sqlite, so every result is given weight 1
-        scored_results = [(1, result_factory(**dict(zip(fields, row))))
-             for row in self.db_cursor.fetchall()]
+        scored_results = []
+        for row in self.db_cursor.fetchall():
+            values = dict(zip(fields, row))
+            score = values.pop('_score', 1)
+            snippet = values.pop('_snippet', None)
+            document = result_factory(**values)
+            if self.snippets:
+                document._snippet = snippet
+            scored_results.append((score, document))
         return scored_results
 
     # Specific API
@@ -173,15 +232,111 @@ class IndexCursor(object):
         self.db_cursor.execute(self.query, self.params)
 
 
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool(object):
+
+    """
+    Bounded pool of connections, shared by the threads.
+    ``connect`` is called to open a new connection when none is idle,
+    ``size`` connections at most.
+    If given, ``stamp`` returns the version of the database the connections
+    must be opened on: connections opened on another version are reopened.
+    ``acquire`` raises ``PoolTimeout`` when no connection is released
+    within ``timeout`` seconds.
+    """
+
+    def __init__(self, connect, size, stamp=None, timeout=None):
+        self.connect = connect
+        self.size = size
+        self.stamp = stamp
+        self.timeout = timeout
+        # transaction in progress of each thread, whatever the engine it goes through
+        self.local = threading.local()
+        self._idle = Queue.LifoQueue()
+        self._connections = []
+        self._stamps = {}
+        self._lock = threading.Lock()
+
+    def _open(self):
+        stamp = self.stamp() if self.stamp else None
+        connection = self.connect()
+        self._stamps[connection] = stamp
+        return connection
+
+    def acquire(self):
+        try:
+            connection = self._idle.get_nowait()
+        except Queue.Empty:
+            connection = None
+            with self._lock:
+                if len(self._connections) < self.size:
+                    connection = self._open()
+                    self._connections.append(connection)
+                    return connection
+        if connection is None:
+            # wait for another thread to release one
+            try:
+                connection = self._idle.get(timeout=self.timeout)
+            except Queue.Empty:
+                raise PoolTimeout('No connection released within %s seconds' % self.timeout)
+        if self.stamp and self._stamps.get(connection) != self.stamp():
+            with self._lock:
+                self._connections.remove(connection)
+                del self._stamps[connection]
+                connection.close()
+                connection = self._open()
+                self._connections.append(connection)
+        return connection
+
+    def release(self, connection):
+        self._idle.put(connection)
+
+    def close(self):
+        """Close all the connections. They must have been released."""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+            self._stamps = {}
+            self._idle = Queue.LifoQueue()
+
+
+# Connection pools of the process, by database: shared by all the engines
+# (there is one per user session) and kept from one request to the other
+_pools = {}
+_pools_lock = threading.Lock()
+
+
 class SQLiteFTSEngine(object):
 
     '''
     Basic search engine, weakly typed, every field is indexed.
     Sufficient in most cases.
+
+    Thread safe: the threads share a pool of connections to a database in
+    WAL mode, so that the searches are never blocked by the index writes.
+    A thread keeps its connection from its first write to its commit or cancel.
+
+    The index can be rebuilt in a new database file (``create_shadow``) while
+    it is searched, then replaced by it (``swap``): the name of the live
+    file is then read from a ``.current`` file next to it, and the
+    connections of all the processes move to the new file.
     '''
 
     # make it compatible with services
     LOAD_PRIORITY = 30
+    EXTENSION = '.fts'
+    query_mapper_factory = SQLiteFTSQueryMapper
+    index_cursor_factory = IndexCursor
+    # connections settings
+    POOL_SIZE = 16
+    BUSY_TIMEOUT = 10.0  # seconds a writer waits for the other ones
+    POOL_TIMEOUT = 30.0  # seconds a thread waits for a connection of the pool
+    MMAP_SIZE = 256 * 1024 * 1024
+    CACHED_STATEMENTS = 200
 
     def __init__(self, index, index_folder):
         assert(index.isalnum())
@@ -190,10 +345,9 @@ class SQLiteFTSEngine(object):
     def init_state(self, collection, index_folder):
         self.collection = collection
         self.index_folder = index_folder
-        self.connection = sqlite3.connect(
-            os.path.join(index_folder, collection + '.fts'))
-        self._cursor = None
-        self.mapper = SQLiteFTSQueryMapper()
+        # database file of a shadow engine, else the live one is followed
+        self.path = None
+        self.mapper = self.query_mapper_factory()
 
     # be persistence friendly
     def __getstate__(self):
@@ -202,18 +356,104 @@ class SQLiteFTSEngine(object):
     def __setstate__(self, state):
         self.init_state(*state)
 
+    @property
+    def pool(self):
+        '''Pool of connections to the database, shared by the engines of the process'''
+        key = self.path or os.path.join(self.index_folder, self.collection + self.EXTENSION)
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(self._connect, self.POOL_SIZE, self._stamp,
+                                                             self.POOL_TIMEOUT)
+            return pool
+
+    @property
+    def _local(self):
+        '''Transaction in progress of the current thread: the engines are copied in the sessions,
+        and a failed request must be able to roll it back from any of them'''
+        return self.pool.local
+
+    def _pointer(self):
+        '''File holding the name of the live database file, if not the default one'''
+        return os.path.join(self.index_folder, self.collection + self.EXTENSION + '.current')
+
+    def _stamp(self):
+        if self.path is not None:
+            return None
+        try:
+            stat = os.stat(self._pointer())
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime)
+
+    def _db_path(self):
+        if self.path is not None:
+            return self.path
+        try:
+            with open(self._pointer()) as pointer:
+                name = pointer.read().strip()
+        except IOError:
+            name = self.collection + self.EXTENSION
+        return os.path.join(self.index_folder, name)
+
+    def _connect(self):
+        connection = sqlite3.connect(
+            self._db_path(),
+            timeout=self.BUSY_TIMEOUT,
+            cached_statements=self.CACHED_STATEMENTS,
+            # connections are used by one thread at a time, but not always the same
+            check_same_thread=False
+        )
+        connection.execute('pragma journal_mode=wal')
+        connection.execute('pragma synchronous=normal')
+        connection.execute('pragma mmap_size=%d' % self.MMAP_SIZE)
+        connection.create_function('bm25', -1, bm25)
+        return connection
+
     def _get_cursor(self):
-        if not self._cursor:
-            self._cursor = self.connection.cursor()
-        return self._cursor
+        '''Cursor of the transaction of the current thread'''
+        local = self._local
+        if getattr(local, 'cursor', None) is None:
+            local.connection = self.pool.acquire()
+            local.cursor = local.connection.cursor()
+        return local.cursor
+
+    def _end_transaction(self, commit):
+        local = self._local
+        if getattr(local, 'cursor', None) is None:
+            # no operation in progress
+            return
+        try:
+            if commit:
+                local.connection.commit()
+            else:
+                local.connection.rollback()
+        finally:
+            local.cursor.close()
+            self.pool.release(local.connection)
+            local.cursor = local.connection = None
+
+    @staticmethod
+    def _unlink(db):
+        for path in (db, db + '-wal', db + '-shm'):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _generations(self):
+        '''Database files of the collection: the default one and those of the swapped shadows'''
+        pattern = re.compile(r'%s(-\d+)?%s$' % (re.escape(self.collection), re.escape(self.EXTENSION)))
+        return [os.path.join(self.index_folder, name) for name in os.listdir(self.index_folder)
+                if pattern.match(name)]
 
     def _dropdb(self):
-        if self.connection:
-            self.connection.close()
-            self.connection = None
-            self._cursor = None
-        db = os.path.join(self.index_folder, self.collection + '.fts')
-        os.unlink(db)
+        self.cancel()
+        self.pool.close()
+        self._unlink(self._db_path())
+        if self.path is None:
+            for db in self._generations():
+                self._unlink(db)
+            if os.path.exists(self._pointer()):
+                os.unlink(self._pointer())
 
     def add_document(self, document):
         '''
@@ -221,10 +461,30 @@ class SQLiteFTSEngine(object):
         `collection`, under the document type (a.k.a. schema) `schema`.
 
         '''
-        index_cursor = IndexCursor(self._get_cursor())
+        index_cursor = self.index_cursor_factory(self._get_cursor())
         document.save(index_cursor)
         index_cursor.execute()
 
+    def add_documents(self, documents, replace=False):
+        '''
+        Add many documents at once, with one ``executemany`` per kind of document.
+        If ``replace``, the documents already in the index are replaced.
+        '''
+        c = self._get_cursor()
+        if replace:
+            deletions = {}
+            for document in documents:
+                deletions.setdefault(document.schema_name, []).append((document._id,))
+            for schema_name, docids in deletions.iteritems():
+                c.executemany('delete from %s where id=?' % schema_name, docids)
+        batches = {}
+        for document in documents:
+            index_cursor = self.index_cursor_factory(None)
+            document.save(index_cursor)
+            batches.setdefault(index_cursor.query, []).append(index_cursor.params)
+        for query, params in batches.iteritems():
+            c.executemany(query, params)
+
     def delete_document(self, schema, docid):
         '''
         Remove document from index and storage.
@@ -234,36 +494,92 @@ class SQLiteFTSEngine(object):
 
     def update_document(self, document):
         '''Update document'''
-        index_cursor = IndexCursor(self._get_cursor())
+        index_cursor = self.index_cursor_factory(self._get_cursor())
         document.save(index_cursor, update=True)
         index_cursor.execute()
 
     def commit(self, sync=False):
         '''``sync`` option is ignored by this engine'''
-        if not self._cursor:
-            # no operation in progress
-            return
-        self.connection.commit()
-        self._cursor.close()
-        self._cursor = None
+        self._end_transaction(True)
 
     def cancel(self):
         '''
         Forget documents added since last commit'''
-        if self._cursor:
-            self._cursor.close()
-            self._cursor = None
+        self._end_transaction(False)
 
-    def search(self, query, size=20):
+    def search(self, query, size=20, snippets=False):
         '''
         Search the database.
+        Full text results are ranked with BM25.
         '''
-        index_cursor = IndexCursor(self._get_cursor())
-        return query.search(index_cursor, self.mapper, size)
+        if getattr(self._local, 'cursor', None) is not None:
+            # see the changes of the transaction in progress
+            index_cursor = self.index_cursor_factory(self._local.cursor, snippets)
+            return query.search(index_cursor, self.mapper, size)
+        connection = self.pool.acquire()
+        cursor = connection.cursor()
+        try:
+            index_cursor = self.index_cursor_factory(cursor, snippets)
+            return query.search(index_cursor, self.mapper, size)
+        finally:
+            cursor.close()
+            self.pool.release(connection)
+
+    def optimize(self, automerge=None):
+        '''
+        Merge the index b-trees. ``automerge`` is the FTS4 automerge
+        setting (0 to 16), applied instead of a full merge if given.
+        '''
+        c = self._get_cursor()
+        c.execute("select name from sqlite_master where type = 'table' and sql like 'CREATE VIRTUAL TABLE % USING fts4%'")
+        for table, in c.fetchall():
+            if automerge is None:
+                c.execute("insert into %s(%s) values ('optimize')" % (table, table))
+            else:
+                c.execute("insert into %s(%s) values ('automerge=%d')" % (table, table, automerge))
+        self.commit()
 
     def delete_collection(self):
         self._dropdb()
 
+    def create_shadow(self, schemas):
+        '''
+        Create the collections in a new database file and return an engine
+        writing to it, to rebuild the index while the current one is searched.
+        '''
+        shadow = copy.copy(self)
+        shadow.path = os.path.join(
+            self.index_folder, '%s-%d%s' % (self.collection, int(time.time() * 1000), self.EXTENSION)
+        )
+        shadow.create_collection(schemas)
+        return shadow
+
+    def swap(self, shadow):
+        '''
+        Replace the live index by the ``shadow`` one, for all the processes.
+        The searches and the transactions in progress end on the previous
+        index, which is kept until the next swap: the processes still
+        writing to it must not lose their writes in an unlinked file (the
+        index queue replays them in the new index, see ``swap_index``).
+        '''
+        shadow.commit()
+        c = shadow._get_cursor()
+        # the new file must be complete on its own: no WAL left
+        c.execute('pragma wal_checkpoint(truncate)')
+        shadow.commit()
+        shadow.pool.close()
+        with _pools_lock:
+            _pools.pop(shadow.path, None)
+        previous = self._db_path()
+        pointer = self._pointer()
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(os.path.basename(shadow.path))
+        # atomic: the connections opened from now on are on the new file
+        os.rename(pointer + '.tmp', pointer)
+        for db in self._generations():
+            if db not in (previous, shadow.path):
+                self._unlink(db)
+
     def create_collection(self, schemas):
         '''
         Init the collections the first time.
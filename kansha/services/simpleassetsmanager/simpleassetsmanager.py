@@ -41,6 +41,22 @@ class SimpleAssetsManager(AssetsManager):
         data, metadata = self.load(file_id)
         return self.save(data, metadata=metadata)
 
+    def share(self, file_id):
+        # hard links to the files written once, by ``save``
+        new_file_id = unicode(uuid.uuid4())
+        try:
+            for size in (None, 'thumb', 'medium'):
+                filename = self._get_filename(file_id, size)
+                if os.path.exists(filename):
+                    os.link(filename, self._get_filename(new_file_id, size))
+        except OSError:
+            # not supported by the file system
+            self.delete(new_file_id)
+            return self.copy(file_id)
+        self.copy_cover(file_id, new_file_id)
+        self.update_metadata(new_file_id, self.get_metadata(file_id))
+        return new_file_id
+
     def _get_filename(self, file_id, size=None):
         filename = os.path.join(self.basedir, file_id)
         if size and size != 'large':
@@ -70,7 +70,14 @@ setup(
       alembic-revision = kansha.alembic.admin:AlembicRevisionCommand
       alembic-stamp = kansha.alembic.admin:AlembicStampCommand
       alembic-upgrade = kansha.alembic.admin:AlembicUpgradeCommand
+      bench-board = kansha.batch.bench_board:BenchBoard
+      bench-search = kansha.batch.bench_search:BenchSearch
       create-index = kansha.batch.create_index:ReIndex
+      deletion-worker = kansha.batch.deletion_worker:DeletionWorker
+      index-worker = kansha.batch.index_worker:IndexWorker
+      optimize-index = kansha.batch.optimize_index:OptimizeIndex
+      push-server = kansha.batch.push_server:PushServer
+      rebuild-counters = kansha.batch.rebuild_counters:RebuildCounters
       save-config = kansha.batch.save_config:SaveConfig
       create-demo = kansha.batch.create_demo:CreateDemo
 
@@ -78,6 +85,12 @@ setup(
       authentication = kansha.services.authentication_repository:AuthenticationsRepository
       mail_sender = kansha.services.mail:MailSender
       assets_manager = kansha.services.simpleassetsmanager.simpleassetsmanager:SimpleAssetsManager
+      render_cache = kansha.services.render_cache:RenderCache
+      query_stats = kansha.services.query_stats:QueryStats
+      profiler = kansha.services.profiler:Profiler
+      push = kansha.services.push.service:PushNotifications
+      index_queue = kansha.services.index_queue.service:IndexQueue
+      deletion_queue = kansha.services.deletion_queue.service:DeletionQueue
 
       [kansha.authentication]
       dblogin = kansha.authentication.database.forms:Login
@@ -101,6 +114,12 @@ setup(
       [search.engines]
       dummy = kansha.services.search.dummyengine:DummySearchEngine
       sqlite = kansha.services.search.sqliteengine:SQLiteFTSEngine
+      sqlite5 = kansha.services.search.sqlite5engine:SQLite5Engine
+      memory = kansha.services.search.memoryengine:MemorySearchEngine
       elastic = kansha.services.search.elasticengine:ElasticSearchEngine
+
+      [push.brokers]
+      local = kansha.services.push.brokers:LocalBroker
+      socket = kansha.services.push.brokers:SocketBroker
       """
 )
@@ -44,6 +44,54 @@
             };
         }()),
 
+        /**
+         * Listen to the changes of the board made by the other users
+         * and catch up with them.
+         * Server-Sent Events are used when available, long-polling otherwise.
+         */
+        listenBoardChanges: function (url, version) {
+            var onVersion = function (newVersion) {
+                if (newVersion !== null && newVersion !== version) {
+                    version = newVersion;
+                    NS.app.waitForFinalEvent(function () {
+                        if (typeof increase_version === 'function') {
+                            increase_version();
+                        }
+                    }, 200, 'board changes');
+                }
+            };
+            if (NS.app.boardChanges) {
+                NS.app.boardChanges.close();
+            }
+            NS.app.boardChanges = {closed: false, close: function () { this.closed = true; }};
+            if (window.EventSource) {
+                var source = new EventSource(url + '?version=' + version);
+                source.onmessage = function (ev) {
+                    onVersion(YAHOO.lang.JSON.parse(ev.data).version);
+                };
+                NS.app.boardChanges = source;
+            } else {
+                var listener = NS.app.boardChanges,
+                    poll = function () {
+                        if (listener.closed) {
+                            return;
+                        }
+                        YAHOO.util.Connect.asyncRequest('GET', url + '?version=' + version, {
+                            success: function (o) {
+                                onVersion(YAHOO.lang.JSON.parse(o.responseText).version);
+                                poll();
+                            },
+                            failure: function (o) {
+                                // too many clients waiting on the server: come back later
+                                var delay = parseInt(o.getResponseHeader && o.getResponseHeader['Retry-After'], 10);
+                                setTimeout(poll, delay > 0 ? delay * 1000 : 5000);
+                            }
+                        });
+                    };
+                poll();
+            }
+        },
+
         /**
          * App initialization :
          *    - register events
@@ -8,15 +8,22 @@
 # this distribution.
 #--
 
+import json
 import unittest
 
 from nagare import database
 from elixir import metadata as __metadata__
 
 from kansha import helpers
+from kansha.models import RANK_GAP, rank_for
 from kansha.board import boardsmanager
 from kansha.board.models import DataBoard
 from kansha.board import comp as board_module
+from kansha.card_addons.label import CardLabels
+from kansha.card_addons.description.comp import CardDescription
+from kansha.card_addons.description.models import DataCardDescription
+from kansha.card_addons.checklist.comp import Checklists
+from kansha.card_addons.checklist.models import DataChecklist, DataChecklistItem
 
 
 database.set_metadata(__metadata__, 'sqlite:///:memory:', False, {})
@@ -286,6 +293,36 @@ class BoardTest(unittest.TestCase):
         boards_manager.load_user_boards()
         self.assert_(in_comp(board, boards_manager.archived_boards))
 
+    def test_user_boards(self):
+        """The boards of a user come with his role and their last activity"""
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        user = helpers.create_user()
+        user2 = helpers.create_user('bis')
+        board.add_member(user2, 'member')
+        self.assertIsNone(board.data.last_activity)
+        helpers.set_context(user2)
+        board.create_column(1, u'test').create_card(u'test')
+        self.assertIsNotNone(board.data.last_activity)
+        self.assertEqual(DataBoard.get_user_boards(user.data), [(board.data, True)])
+        self.assertEqual(DataBoard.get_user_boards(user2.data), [(board.data, False)])
+        board.set_visibility(board_module.BOARD_SHARED)
+        self.assertEqual(DataBoard.get_user_boards(helpers.create_user('ter').data), [(board.data, None)])
+
+    def test_user_roles_invalidated(self):
+        """The roles loaded with the boards are forgotten when the members change"""
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        user = helpers.create_user('bis')
+        board.user_roles[user.username] = None
+        board.add_member(user)
+        self.assertTrue(board.has_member(user))
+        board.user_roles[user.username] = False
+        board.update_members()
+        member = [m() for m in board.members if m().user() == user][0]
+        board.change_role(member, 'manager')
+        self.assertTrue(board.has_manager(user))
+
     def test_get_by(self):
         '''Test get_by_uri and get_by_id methods'''
         helpers.set_dummy_context()
@@ -296,3 +333,109 @@ class BoardTest(unittest.TestCase):
         board = self.boards_manager.get_by_uri(orig_board.data.uri)
         self.assertEqual(orig_board.data.id, board.data.id)
         self.assertEqual(orig_board.data.title, board.data.title)
+
+    def test_version_journal(self):
+        '''Other sessions catch up with the journaled changes only'''
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        other = self.boards_manager.get_by_id(board.id)
+        first_column = other.columns[0]
+        board.create_column(1, u'test')
+        self.assertTrue(other.increase_version())
+        self.assertEqual(other.count_columns(), 5)
+        # untouched components are kept
+        self.assertIs(other.columns[0], first_column)
+        self.assertFalse(other.increase_version())
+
+    def test_move_card(self):
+        """Moving a card only writes its rank"""
+        helpers.set_dummy_context()
+        helpers.set_context(helpers.create_user())
+        board = helpers.create_board()
+        column = board.columns[0]()
+        cards = [card_comp().data for card_comp in column.cards]
+        ranks = dict((card.id, card.rank) for card in cards)
+        moved = cards[-1]
+        board.update_card_position(json.dumps(
+            {'orig': column.id, 'dest': column.id, 'card': 'card_%d' % moved.id, 'index': 1}))
+        database.session.expire_all()
+        data_cards = column.data.cards
+        self.assertEqual([card.id for card in data_cards], [cards[0].id, moved.id] + [card.id for card in cards[1:-1]])
+        self.assertEqual([card.id for card in data_cards if card.rank != ranks[card.id]], [moved.id])
+
+    def test_move_column(self):
+        """Moving a column only writes its rank"""
+        helpers.set_dummy_context()
+        board = helpers.create_board()
+        columns = [col().data for col in board.columns]
+        ranks = dict((col.id, col.rank) for col in columns)
+        board.update_column_position(json.dumps({'list': board.columns[2]().id, 'index': 0}))
+        database.session.expire_all()
+        self.assertEqual([col.id for col in board.data.columns], [columns[2].id, columns[0].id, columns[1].id, columns[3].id])
+        self.assertEqual([col.id for col in board.data.columns if col.rank != ranks[col.id]], [columns[2].id])
+
+    def test_move_cards(self):
+        """Moving cards in bulk appends them after the cards of the destination"""
+        helpers.set_dummy_context()
+        helpers.set_context(helpers.create_user())
+        board = helpers.create_board()
+        from_column, to_column = board.columns[0](), board.columns[1]()
+        to_ids = [card_comp().db_id for card_comp in to_column.cards]
+        cards = [card_comp() for card_comp in from_column.cards]
+        moved = board.move_cards(cards, from_column, to_column)
+        self.assertEqual(moved, cards)
+        self.assertEqual(from_column.cards, [])
+        database.session.expire_all()
+        self.assertEqual(from_column.data.cards, [])
+        self.assertEqual([card.id for card in to_column.data.cards], to_ids + [card.db_id for card in cards])
+
+    def test_copy(self):
+        """Copying a board copies its cards and the data of their extensions"""
+        helpers.set_dummy_context()
+        extensions = [('labels', CardLabels), ('description', CardDescription), ('checklists', Checklists)]
+        board = helpers.create_board(extensions)
+        card = board.columns[0]().cards[2]().data
+        DataCardDescription.new(card).description = u'Description'
+        DataChecklist(card=card, title=u'Checklist', index=0,
+                      items=[DataChecklistItem(title=u'item', index=0, done=True)])
+        database.session.flush()
+        boards_manager = helpers.get_boards_manager(extensions)
+        template = boards_manager.create_template_from_board(board, helpers.word(), u'', False)
+        database.session.expire_all()
+
+        columns = [column for column in board.data.columns if not column.archive]
+        self.assertEqual([column.title for column in template.data.columns], [column.title for column in columns])
+        new_card = template.data.columns[0].cards[2]
+        self.assertNotEqual(new_card.id, card.id)
+        self.assertEqual(new_card.title, card.title)
+        self.assertEqual(sorted(label.title for label in new_card.labels), [u'Green', u'Red'])
+        self.assertEqual([label.board for label in new_card.labels], [template.data] * 2)
+        self.assertEqual(DataCardDescription.get_by_card(new_card).description, u'Description')
+        checklist = DataChecklist.get_by_card(new_card)[0]
+        self.assertEqual(checklist.title, u'Checklist')
+        self.assertEqual([(item.title, item.done) for item in checklist.items], [(u'item', False)])
+        self.assertEqual(new_card.get_counter('checklist_items'), 1)
+
+
+class Ranked(object):
+
+    def __init__(self, rank):
+        self.rank = rank
+
+
+class RankTest(unittest.TestCase):
+
+    def test_insert(self):
+        """Ranks - an insertion leaves the other ranks untouched"""
+        items = [Ranked(rank) for rank in (RANK_GAP, 2 * RANK_GAP)]
+        self.assertEqual(rank_for([], 0), RANK_GAP)
+        self.assertEqual(rank_for(items, 0), 0)
+        self.assertEqual(rank_for(items, 1), RANK_GAP + RANK_GAP // 2)
+        self.assertEqual(rank_for(items, 2), 3 * RANK_GAP)
+        self.assertEqual([item.rank for item in items], [RANK_GAP, 2 * RANK_GAP])
+
+    def test_rebalance(self):
+        """Ranks - they are spread again when there is no room left"""
+        items = [Ranked(rank) for rank in (1, 2, None)]
+        self.assertEqual(rank_for(items, 1), RANK_GAP + RANK_GAP // 2)
+        self.assertEqual([item.rank for item in items], [RANK_GAP, 2 * RANK_GAP, 3 * RANK_GAP])
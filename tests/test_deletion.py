@@ -0,0 +1,114 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import unittest
+
+from nagare import database, security
+from elixir import metadata as __metadata__
+
+from kansha import helpers
+from kansha.card.models import DataCard
+from kansha.board.models import DataBoard
+from kansha.column.models import DataColumn
+from kansha.card_addons.vote.comp import Votes
+from kansha.card_addons.label import CardLabels
+from kansha.card_addons.vote.models import DataVote
+from kansha.card_addons.gallery import Gallery
+from kansha.card_addons.gallery.models import DataAsset
+from kansha.card_addons.checklist.comp import Checklists
+from kansha.card_addons.checklist.models import DataChecklist, DataChecklistItem
+from kansha.services.actionlog.models import DataHistory
+from kansha.services.deletion_queue.models import DataBoardDeletion
+from kansha.services.deletion_queue.service import DummyDeletionQueue
+
+
+database.set_metadata(__metadata__, 'sqlite:///:memory:', False, {})
+
+
+class RecordingAssetsManager(object):
+
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, file_id):
+        self.deleted.append(file_id)
+
+
+class DeletionTest(unittest.TestCase):
+
+    def setUp(self):
+        helpers.setup_db(__metadata__)
+        helpers.set_dummy_context()
+        self.board = helpers.create_board(
+            [('labels', CardLabels), ('votes', Votes), ('gallery', Gallery), ('checklists', Checklists)])
+        user = security.get_user().data
+        card = self.board.columns[0]().cards[0]().data
+        DataAsset.add(u'asset1', card, user)
+        DataChecklist(card=card, items=[DataChecklistItem(title=u'item', index=0)])
+        DataHistory.add_history(self.board.data, card, user, u'card_create', {})
+        database.session.flush()
+        self.assets_manager = RecordingAssetsManager()
+
+    def tearDown(self):
+        helpers.teardown_db(__metadata__)
+
+    def assertDeleted(self, board_id):
+        self.assertIsNone(DataBoard.get(board_id))
+        for entity in (DataColumn, DataCard, DataVote, DataAsset, DataChecklist, DataChecklistItem, DataHistory):
+            self.assertEqual(entity.query.count(), 0, entity.__name__)
+
+    def test_delete_cards(self):
+        """Deletion - the cards and the data of their extensions are deleted, the files once the request is over"""
+        column = self.board.columns[0]()
+        column.purge_cards()
+        self.assertEqual(column.cards, [])
+        self.assertEqual(DataCard.query.filter_by(column=column.data).count(), 0)
+        self.assertEqual(DataChecklistItem.query.count(), 0)
+        self.assertEqual(self.assets_manager.deleted, [])
+        self.board.deletion_queue.flush(self.assets_manager)
+        self.assertEqual(self.assets_manager.deleted, [u'asset1'])
+
+    def test_delete_board(self):
+        """Deletion - small boards are deleted right away"""
+        board_id = self.board.id
+        self.board.delete()
+        self.assertDeleted(board_id)
+        self.board.deletion_queue.flush(self.assets_manager)
+        self.assertEqual(self.assets_manager.deleted, [u'asset1'])
+
+    def test_delete_board_in_background(self):
+        """Deletion - big boards are hidden, then deleted in chunked transactions"""
+        queue = self.board.deletion_queue = DummyDeletionQueue(activated=True, min_cards=1, chunk_size=3)
+        board_id = self.board.id
+        self.board.delete()
+        board = DataBoard.get(board_id)
+        self.assertTrue(board.archived)
+        self.assertFalse(board.board_members)
+        self.assertEqual(DataBoardDeletion.count(), 1)
+
+        drained = 0
+        while queue.drain(self.board.card_extensions, helpers.create_services(), self.board.search_engine,
+                          self.assets_manager):
+            drained += 1
+        # 11 cards, 3 per transaction, the board with the last ones
+        self.assertEqual(drained, 4)
+        self.assertDeleted(board_id)
+        self.assertEqual(DataBoardDeletion.count(), 0)
+        self.assertEqual(self.assets_manager.deleted, [u'asset1'])
+
+    def test_claimed_board(self):
+        """Deletion - a board being deleted by a worker is left to it"""
+        queue = self.board.deletion_queue = DummyDeletionQueue(activated=True, min_cards=1, chunk_size=3)
+        self.board.delete()
+        self.assertIsNotNone(DataBoardDeletion.claim(u'other:1'))
+        self.assertFalse(queue.drain(self.board.card_extensions, helpers.create_services(), self.board.search_engine,
+                                     self.assets_manager))
+        self.assertIsNone(DataBoardDeletion.claim(u'another:2'))
+        self.assertIsNotNone(DataBoardDeletion.claim(u'other:1'))
@@ -0,0 +1,120 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import unittest
+import threading
+
+from nagare import database
+from elixir import metadata as __metadata__
+
+from kansha import helpers
+from kansha.services.search.dummyengine import DummySearchEngine
+from kansha.services.index_queue.models import DataIndexUpdate, DataIndexCapture
+from kansha.services.index_queue.service import DummyIndexQueue, QueuedSearchEngine
+
+
+database.set_metadata(__metadata__, 'sqlite:///:memory:', False, {})
+
+
+class RecordingSearchEngine(DummySearchEngine):
+
+    def __init__(self):
+        super(RecordingSearchEngine, self).__init__(None)
+        self.added = {}
+        self.deleted = []
+
+    def add_document(self, document):
+        self.added[document._id] = document
+
+    def add_documents(self, documents, replace=False):
+        for document in documents:
+            self.add_document(document)
+
+    def delete_document(self, schema, docid):
+        self.deleted.append(docid)
+
+
+class IndexQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        helpers.setup_db(__metadata__)
+        helpers.set_dummy_context()
+        self.board = helpers.create_board()
+        self.card = self.board.columns[0]().create_card(u'queued card')
+        self.engine = RecordingSearchEngine()
+
+    def tearDown(self):
+        helpers.teardown_db(__metadata__)
+
+    def test_queue(self):
+        """IndexQueue - updates are queued, and applied on sync commit only"""
+        queued = QueuedSearchEngine(self.engine)
+        self.card.add_to_index(queued, self.board.id)
+        self.card.add_to_index(queued, self.board.id, update=True)
+        queued.commit()
+        self.assertEqual(DataIndexUpdate.count(), 1)
+        self.assertEqual(self.engine.added, {})
+        self.card.add_to_index(queued, self.board.id)
+        queued.commit(sync=True)
+        self.assertEqual(DataIndexUpdate.count(), 2)
+        self.assertIn(self.card.id, self.engine.added)
+
+    def test_queue_per_thread(self):
+        """IndexQueue - a request commits its own updates only"""
+        queued = QueuedSearchEngine(self.engine)
+        self.card.add_to_index(queued, self.board.id)
+        other = threading.Thread(target=queued.cancel)
+        other.start()
+        other.join()
+        queued.commit(sync=True)
+        self.assertIn(self.card.id, self.engine.added)
+
+    def test_drain(self):
+        """IndexQueue - repeated updates are coalesced, deleted cards are removed"""
+        DataIndexUpdate.add([self.card.db_id, self.card.db_id, 999999])
+        queue = DummyIndexQueue(activated=True)
+        self.assertEqual(queue.drain(self.engine, self.board.card_extensions, helpers.create_services()), 3)
+        self.assertEqual(self.engine.added.keys(), [self.card.id])
+        self.assertEqual(self.engine.added[self.card.id].title, u'queued card')
+        self.assertEqual(self.engine.deleted, ['card_999999'])
+        self.assertEqual(DataIndexUpdate.count(), 0)
+
+    def test_capture(self):
+        """IndexQueue - while a shadow index is built, the applied updates are captured and replayed"""
+        queue = DummyIndexQueue(activated=True)
+        services = helpers.create_services()
+        DataIndexUpdate.add([self.card.db_id])
+        queue.drain(self.engine, self.board.card_extensions, services)
+        self.assertEqual(DataIndexCapture.get_batch(10), [])
+        DataIndexCapture.open()
+        DataIndexUpdate.add([self.card.db_id, 999999])
+        queue.drain(self.engine, self.board.card_extensions, services)
+        self.assertEqual(sorted(card_id for __, card_id in DataIndexCapture.get_batch(10)), [self.card.db_id, 999999])
+        shadow = RecordingSearchEngine()
+        self.assertEqual(queue.replay(shadow, self.board.card_extensions, services), 2)
+        self.assertEqual(shadow.added.keys(), [self.card.id])
+        self.assertEqual(shadow.deleted, ['card_999999'])
+        self.assertEqual(DataIndexCapture.get_batch(10), [])
+        DataIndexCapture.close()
+        DataIndexUpdate.add([self.card.db_id])
+        queue.drain(self.engine, self.board.card_extensions, services)
+        self.assertEqual(DataIndexCapture.get_batch(10), [])
+
+    def test_capture_closed(self):
+        """IndexQueue - the updates captured before the capture is closed are still replayed"""
+        queue = DummyIndexQueue(activated=True)
+        services = helpers.create_services()
+        DataIndexCapture.open()
+        DataIndexUpdate.add([self.card.db_id])
+        queue.drain(self.engine, self.board.card_extensions, services)
+        DataIndexCapture.close()
+        self.assertEqual([card_id for __, card_id in DataIndexCapture.get_batch(10)], [self.card.db_id])
+        self.assertEqual(queue.replay(RecordingSearchEngine(), self.board.card_extensions, services), 1)
+        self.assertEqual(DataIndexCapture.get_batch(10), [])
@@ -0,0 +1,67 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from kansha.services.profiler import DummyProfiler
+
+
+def busy_loop(duration):
+    start = time.time()
+    while time.time() - start < duration:
+        pass
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_sampling(self):
+        """Profiler - the stacks of the profiled requests are sampled"""
+        profiler = DummyProfiler(frequency=200, output_dir=self.output_dir)
+        profiler.start()
+        busy_loop(0.2)
+        profiler.stop()
+        samples = sum(count for stack, count in profiler.stacks.iteritems() if stack.endswith(':busy_loop'))
+        self.assertTrue(samples > 10)
+        # not profiled
+        profiler.stacks.clear()
+        busy_loop(0.05)
+        self.assertEqual(profiler.stacks, {})
+
+    def test_sampling_rate(self):
+        """Profiler - only a fraction of the requests are profiled"""
+        profiler = DummyProfiler(rate=0.0)
+        profiler.start()
+        busy_loop(0.05)
+        profiler.stop()
+        self.assertEqual(profiler.stacks, {})
+
+    def test_renders(self):
+        """Profiler - render durations by component and model"""
+        profiler = DummyProfiler(output_dir=self.output_dir)
+        profiler.record('Votes', 'badge', 0.0003)
+        profiler.record('Votes', 'badge', 0.0004)
+        profiler.record('Gallery', 'cover', 2)
+        self.assertEqual(profiler.renders[('Votes', 'badge')][2], 2)
+        self.assertEqual(profiler.renders[('Gallery', 'cover')][-1], 1)
+        profiler.write()
+        with open(os.path.join(self.output_dir, 'profile-%d.renders' % os.getpid())) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[1].split('\t')[:5], ['Gallery', 'cover', '0', '0', '0'])
+        self.assertEqual(lines[2].split('\t')[:5], ['Votes', 'badge', '0', '0', '2'])
@@ -0,0 +1,119 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import time
+import socket
+import unittest
+import threading
+
+from kansha.services.push.hub import Hub
+from kansha.services.push.server import PushServer
+from kansha.services.push.service import DummyPushNotifications
+from kansha.services.push.benchmark import fan_out, endpoint, server
+
+
+class HubTest(unittest.TestCase):
+
+    def test_known_version(self):
+        """Hub - a client that missed a version gets it right away"""
+        hub = Hub()
+        hub.dispatch(u'board/1', 3)
+        self.assertEqual(hub.wait(u'board/1', 2, 10), 3)
+        self.assertEqual(hub.count_waiters(), 0)
+
+    def test_dispatch(self):
+        """Hub - waiting clients are woken up by a new version of their channel"""
+        hub = Hub()
+        results = {}
+
+        def wait(channel):
+            results[channel] = hub.wait(channel, 0, 10)
+        waiters = [threading.Thread(target=wait, args=(channel,)) for channel in (u'board/1', u'board/2')]
+        for waiter in waiters:
+            waiter.start()
+        while hub.count_waiters() < 2:
+            time.sleep(0.01)
+        hub.dispatch(u'board/1', 1)
+        waiters[0].join(5)
+        self.assertEqual(results, {u'board/1': 1})
+        self.assertEqual(hub.count_waiters(), 1)
+        hub.dispatch(u'board/2', 4)
+        waiters[1].join(5)
+        self.assertEqual(results, {u'board/1': 1, u'board/2': 4})
+
+    def test_timeout(self):
+        """Hub - waiting clients are released when their timeout expires"""
+        hub = Hub()
+        hub.REAPER_PERIOD = 0.1
+        self.assertIsNone(hub.wait(u'board/1', 0, 0.2))
+        self.assertEqual(hub.count_waiters(), 0)
+
+    def test_fan_out(self):
+        """Hub - a version is delivered to 1000 subscribers of a board"""
+        woken, latency = fan_out(1000)
+        self.assertEqual(woken, 1000)
+        self.assertLess(latency, 5)
+
+
+class EndpointTest(unittest.TestCase):
+
+    def test_rolled_back(self):
+        """Push endpoint - the versions of a rolled back request are not published"""
+        push = DummyPushNotifications()
+        push.publish(u'board/1', 2)
+        push.cancel()
+        push.flush()
+        push.publish(u'board/1', 1)
+        push.flush()
+        self.assertEqual(push.hub.wait(u'board/1', 0, 0.1), 1)
+
+    def test_max_waiters(self):
+        """Push endpoint - the requests past max_waiters are answered right away, the other requests are served"""
+        woken, refused, latency, notification = endpoint(8, max_waiters=2, threads=4, timeout=2)
+        self.assertEqual((woken, refused), (2, 6))
+        self.assertLess(latency, 1)
+
+
+class ServerTest(unittest.TestCase):
+
+    def test_long_poll(self):
+        """Push server - a version is delivered to 1000 long-poll connections, without a thread each"""
+        woken, threads, latency = server(1000)
+        self.assertEqual(woken, 1000)
+        self.assertLess(threads, 20)
+        self.assertLess(latency, 5)
+
+    def test_stream(self):
+        """Push server - a version is delivered to 1000 Server-Sent Events connections, without a thread each"""
+        woken, threads, latency = server(1000, stream=True)
+        self.assertEqual(woken, 1000)
+        self.assertLess(threads, 20)
+        self.assertLess(latency, 5)
+
+    def test_disconnected(self):
+        """Push server - the subscription of a closed connection is forgotten"""
+        hub = Hub()
+        push_server = PushServer(hub, '127.0.0.1', 0, 10, 10)
+        thread = threading.Thread(target=push_server.serve_forever)
+        thread.start()
+        try:
+            client = socket.create_connection(push_server.address, 5)
+            client.sendall('GET /push/board/1?version=0 HTTP/1.1\r\n\r\n')
+            deadline = time.time() + 5
+            while not hub.count_waiters() and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(hub.count_waiters(), 1)
+            client.close()
+            while hub.count_waiters() and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(hub.count_waiters(), 0)
+        finally:
+            push_server.shutdown()
+            thread.join(5)
@@ -0,0 +1,61 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import unittest
+
+import sqlalchemy
+
+from kansha.services.query_stats import DummyQueryStats
+
+
+class QueryStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        self.engine.execute('create table item (id integer primary key, parent integer)')
+        self.engine.execute('insert into item (id, parent) values (1, null), (2, 1), (3, 1)')
+
+    def test_counts(self):
+        """QueryStats - queries, rows and duration of a request"""
+        stats = DummyQueryStats()
+        stats.start()
+        self.engine.execute('select * from item').fetchall()
+        self.engine.execute('update item set parent = 2 where parent = 1')
+        counts = stats.stop('GET /')
+        self.assertEqual(counts.queries, 2)
+        self.assertEqual(counts.rows, 2)
+        self.assertEqual(counts.components.keys(), ['other'])
+        self.assertEqual(counts.repeated, [])
+
+    def test_outside_requests(self):
+        """QueryStats - the queries of the other threads are not counted"""
+        stats = DummyQueryStats()
+        self.engine.execute('select * from item').fetchall()
+        self.assertIsNone(stats.stop())
+
+    def test_n_plus_one(self):
+        """QueryStats - statements executed again and again are reported"""
+        stats = DummyQueryStats(repeats=2)
+        stats.start()
+        for item_id in (1, 2, 3):
+            self.engine.execute('select * from item where parent = ?', item_id).fetchall()
+        counts = stats.stop()
+        self.assertEqual(len(counts.repeated), 1)
+        statement, component, site = counts.repeated[0]
+        self.assertEqual(statement, 'select * from item where parent = ?')
+        self.assertEqual(component, 'other')
+
+    def test_several_services(self):
+        """QueryStats - the queries are counted once, whatever the number of services"""
+        DummyQueryStats()
+        stats = DummyQueryStats()
+        stats.start()
+        self.engine.execute('select * from item').fetchall()
+        self.assertEqual(stats.stop().queries, 1)
@@ -0,0 +1,76 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2014 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import unittest
+
+from nagare import database
+from elixir import metadata as __metadata__
+
+from kansha import helpers
+from kansha.services.render_cache import DummyRenderCache
+from kansha.card_addons.members import CardMembers
+
+
+class RenderCacheTest(unittest.TestCase):
+
+    def test_lru(self):
+        """RenderCache - least recently used entries are evicted first"""
+        cache = DummyRenderCache(max_entries=2)
+        cache.set(1, u'one')
+        cache.set(2, u'two')
+        self.assertEqual(cache.get(1), u'one')
+        cache.set(3, u'three')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), u'one')
+        self.assertEqual(cache.get(3), u'three')
+
+    def test_deactivated(self):
+        """RenderCache - nothing is cached when deactivated"""
+        cache = DummyRenderCache()
+        cache.activated = False
+        cache.set(1, u'one')
+        self.assertIsNone(cache.get(1))
+
+
+class CardVersionTest(unittest.TestCase):
+
+    def setUp(self):
+        database.set_metadata(__metadata__, 'sqlite:///:memory:', False, {})
+        helpers.setup_db(__metadata__)
+        helpers.set_context(helpers.create_user())
+        board = helpers.create_board()
+        self.card = board.create_column(1, u'test').create_card(u'test')
+
+    def tearDown(self):
+        helpers.teardown_db(__metadata__)
+
+    def test_version(self):
+        """Card version - writes increase the version"""
+        version = self.card.data.version
+        self.assertTrue(self.card.is_up_to_date)
+        self.card.set_title(u'new title')
+        self.assertEqual(self.card.data.version, version + 1)
+        self.assertFalse(self.card.is_up_to_date)
+        self.card.refresh()
+        self.assertTrue(self.card.is_up_to_date)
+
+    def test_members_profiles(self):
+        """Card version - the profile changes of the members increase the version"""
+        board = helpers.create_board([('members', CardMembers)])
+        card = board.create_column(1, u'test').create_card(u'test')
+        user = helpers.create_user('bis')
+        board.add_member(user)
+        card.extension('members').add_members([user.data.email])
+        version = card.data.version
+        user.data.fullname = u'New name'
+        database.session.flush()
+        database.session.expire(card.data)
+        self.assertEqual(card.data.version, version + 1)
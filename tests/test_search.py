@@ -8,9 +8,12 @@
 # this distribution.
 #--
 
+import os
+import copy
+import sqlite3
 import unittest
 
-from kansha.services.search import schema, sqliteengine, elasticengine
+from kansha.services.search import schema, sqliteengine, sqlite5engine, elasticengine, memoryengine, benchmark
 
 #TODO: test all types on schema, doc creation and search
 
@@ -192,6 +195,26 @@ class SearchTestCase(object):
     def test_add_document(self):
         self.load_documents()
 
+    def test_add_documents(self):
+        docs = [
+            self.MyDocument('doc%d' % i, title=u'Titre %d' % i, pages=i)
+            for i in range(100)
+        ]
+        docs.append(self.Person('p1', firstname=u'John', lastname=u'Doe'))
+        self.engine.add_documents(docs)
+        self.engine.commit(sync=True)
+        res = self.engine.search(self.MyDocument.match(u'titre'), 200)
+        self.assertEqual(len(res), 100)
+        res = self.engine.search(self.Person.lastname == u'Doe')
+        self.assertEqual(len(res), 1)
+
+    def test_cancel(self):
+        self.load_documents()
+        self.engine.add_document(self.MyDocument('doc3', title=u'Annulé'))
+        self.engine.cancel()
+        self.engine.commit(sync=True)
+        self.assertEqual(len(self.engine.search(self.MyDocument.match(u'annulé'))), 0)
+
     def test_remove_document(self):
         self.load_documents()
         self.engine.delete_document(self.MyDocument, 'doc1')
@@ -222,6 +245,22 @@ class SearchTestCase(object):
         self.assertEqual(res[0][1].title, u'Unit tests')
         self.assertIsNone(res[0][1].tags)  # not stored
 
+    def test_ranking(self):
+        self.load_documents()
+        self.engine.add_document(self.MyDocument(
+            'doc3', title=u'Services', tags=u'services', description=u'Services, services, services.'))
+        self.engine.commit(sync=True)
+        res = self.engine.search(self.MyDocument.match(u'services'))
+        self.assertEqual(len(res), 3)
+        self.assertEqual(res[0][1]._id, 'doc3')
+        self.assertTrue(res[0][0] > res[1][0] > 0)
+
+    def test_snippets(self):
+        self.load_documents()
+        res = self.engine.search(self.MyDocument.match(u'tests'), snippets=True)
+        self.assertEqual(len(res), 1)
+        self.assertIn(u'<b>tests</b>', res[0][1]._snippet)
+
     def test_match_field(self):
         self.load_documents()
         query = self.MyDocument.tags.match(u'best')
@@ -307,7 +346,297 @@ class TestSQLiteEngine(SearchTestCase, unittest.TestCase):
         return sqliteengine.SQLiteFTSEngine(self.collection, u'/tmp')
 
 
-class TestElasticEngine(SearchTestCase, unittest.TestCase):
+def create_sqlite5_engine(test, scope=''):
+    try:
+        sqlite3.connect(':memory:').execute('create virtual table t using fts5(c)')
+    except sqlite3.OperationalError:
+        test.skipTest('sqlite is not compiled with FTS5')
+    return sqlite5engine.SQLite5Engine(test.collection, u'/tmp', scope=scope)
+
+
+class SQLite5SearchTestCase(object):
+
+    def test_diacritics(self):
+        self.load_documents()
+        res = self.engine.search(self.MyDocument.match(u'francais'))
+        self.assertEqual(len(res), 1)
+        self.assertEqual(res[0][1]._id, 'doc1')
+
+    def test_replace_documents(self):
+        self.load_documents()
+        self.engine.add_documents([self.MyDocument('doc1', title=u'Nouveau titre')], replace=True)
+        self.engine.commit(sync=True)
+        self.assertEqual(len(self.engine.search(self.MyDocument.match(u'best'))), 1)
+        res = self.engine.search(self.MyDocument.match(u'nouveau'))
+        self.assertEqual([doc._id for __, doc in res], ['doc1'])
+
+    def test_optimize(self):
+        self.load_documents()
+        self.engine.delete_document(self.MyDocument, 'doc2')
+        self.engine.commit(sync=True)
+        self.engine.optimize()
+        self.engine.optimize(automerge=8)
+        res = self.engine.search(self.MyDocument.match(u'best'))
+        self.assertEqual([doc._id for __, doc in res], ['doc1'])
+
+
+class TestSQLite5Engine(SQLite5SearchTestCase, SearchTestCase, unittest.TestCase):
+
+    def _create_search_engine(self):
+        return create_sqlite5_engine(self)
+
+
+class SQLiteConcurrencyTestCase(object):
+
+    def test_concurrent_search_and_update(self):
+        engine = self._create_search_engine()
+        try:
+            results = benchmark.concurrency(engine, threads=8, documents=200, duration=1, write_ratio=0.2)
+        finally:
+            engine.delete_collection()
+        self.assertEqual(results['errors'], [])
+        self.assertTrue(results['search'])
+        self.assertTrue(results['update'])
+
+    def test_shadow_swap(self):
+        engine = self._create_search_engine()
+        # another process, connected to the index before the swap
+        other = self._create_search_engine()
+        try:
+            engine.create_collection([MyDocument])
+            engine.add_document(MyDocument('doc1', title=u'Previous index'))
+            engine.commit()
+            self.assertEqual(len(other.search(MyDocument.match(u'previous'))), 1)
+            shadow = engine.create_shadow([MyDocument])
+            shadow.add_document(MyDocument('doc1', title=u'Rebuilt index'))
+            shadow.commit()
+            self.assertEqual(len(other.search(MyDocument.match(u'rebuilt'))), 0)
+            engine.swap(shadow)
+            self.assertEqual(len(other.search(MyDocument.match(u'previous'))), 0)
+            res = other.search(MyDocument.match(u'rebuilt'))
+            self.assertEqual([doc._id for __, doc in res], ['doc1'])
+            other.add_document(MyDocument('doc2', title=u'Rebuilt again'))
+            other.commit()
+            self.assertEqual(len(engine.search(MyDocument.match(u'rebuilt'))), 2)
+        finally:
+            other.pool.close()
+            engine.delete_collection()
+        self.assertEqual([name for name in os.listdir(u'/tmp') if name.startswith(self.collection + u'-')], [])
+
+    def test_cancel_from_another_engine(self):
+        engine = self._create_search_engine()
+        try:
+            engine.create_collection([MyDocument])
+            engine.add_document(MyDocument('doc1', title=u'Failed request'))
+            # the engine of the application, not the copy in the session
+            self._create_search_engine().cancel()
+            self.assertIsNone(getattr(engine._local, 'cursor', None))
+            self.assertEqual(len(engine.search(MyDocument.match(u'failed'))), 0)
+        finally:
+            engine.delete_collection()
+
+    def test_pool_timeout(self):
+        pool = sqliteengine.ConnectionPool(lambda: object(), 1, timeout=0.1)
+        pool.acquire()
+        self.assertRaises(sqliteengine.PoolTimeout, pool.acquire)
+
+
+class TestSQLiteConcurrency(SQLiteConcurrencyTestCase, unittest.TestCase):
+    collection = u'concurrency'
+
+    def _create_search_engine(self):
+        return sqliteengine.SQLiteFTSEngine(self.collection, u'/tmp')
+
+
+class TestSQLite5Concurrency(SQLiteConcurrencyTestCase, unittest.TestCase):
+    collection = u'concurrency'
+
+    def _create_search_engine(self):
+        return create_sqlite5_engine(self)
+
+
+class TestSQLite5EngineScope(SQLite5SearchTestCase, SearchTestCase, unittest.TestCase):
+
+    def _create_search_engine(self):
+        return create_sqlite5_engine(self, 'pages')
+
+    def test_scoped_match(self):
+        self.load_documents()
+        self.engine.add_document(self.MyDocument('doc3', title=u'Best of', pages=12))
+        self.engine.commit(sync=True)
+        query = self.MyDocument.match(u'best')
+        self.assertEqual(len(self.engine.search(query)), 3)
+        res = self.engine.search(query & (self.MyDocument.pages == 89))
+        self.assertEqual(sorted(doc._id for __, doc in res), ['doc1', 'doc2'])
+        res = self.engine.search((self.MyDocument.pages == 12) & self.MyDocument.title.match(u'best'))
+        self.assertEqual([doc._id for __, doc in res], ['doc3'])
+        self.assertEqual(self.engine.search(self.MyDocument.tags.match(u'best') & (self.MyDocument.pages == 12)), [])
+
+    def test_scoped_update(self):
+        self.load_documents()
+        self.engine.update_document(self.MyDocument.delta('doc1', pages=12))
+        self.engine.commit(sync=True)
+        query = self.MyDocument.match(u'best')
+        res = self.engine.search(query & (self.MyDocument.pages == 12))
+        self.assertEqual([doc._id for __, doc in res], ['doc1'])
+        res = self.engine.search(query & (self.MyDocument.pages == 89))
+        self.assertEqual([doc._id for __, doc in res], ['doc2'])
+        self.engine.delete_document(self.MyDocument, 'doc1')
+        self.engine.commit(sync=True)
+        self.assertEqual(self.engine.search(query & (self.MyDocument.pages == 12)), [])
+
+    def test_scoped_snippets(self):
+        self.load_documents()
+        query = self.MyDocument.match(u'tests') & (self.MyDocument.pages == 89)
+        res = self.engine.search(query, snippets=True)
+        self.assertEqual(len(res), 1)
+        self.assertEqual(res[0][1]._snippet, u'Unit <b>tests</b>')
+
+    def test_board_search_benchmark(self):
+        engine = benchmark.ENGINES['sqlite5-scoped'](u'boards', u'/tmp')
+        try:
+            latencies = benchmark.board_search(engine, cards=500, board_size=100, searches=20)
+        finally:
+            engine.delete_collection()
+        self.assertTrue(len(latencies) >= 20)
+
+
+class MemorySearchTestCase(object):
+
+    def test_infix(self):
+        self.load_documents()
+        res = self.engine.search(self.MyDocument.match(u'ervi'))
+        self.assertEqual(sorted(doc._id for __, doc in res), ['doc1', 'doc2'])
+        res = self.engine.search(self.MyDocument.match(u'ctices ervi'))
+        self.assertEqual([doc._id for __, doc in res], ['doc2'])
+
+    def test_board_search_benchmark(self):
+        latencies = benchmark.board_search(self.engine, 2000, board_size=100, searches=50)
+        self.assertTrue(len(latencies) >= 50)
+
+
+class TestMemoryEngine(MemorySearchTestCase, SQLite5SearchTestCase, SearchTestCase, unittest.TestCase):
+
+    def _create_search_engine(self):
+        return memoryengine.MemorySearchEngine(self.collection)
+
+    def test_shared_index(self):
+        self.load_documents()
+        # the index worker works on a copy of the engine
+        engine = copy.copy(self.engine)
+        engine.delete_document(self.MyDocument, 'doc1')
+        engine.commit()
+        res = self.engine.search(self.MyDocument.match(u'best'))
+        self.assertEqual([doc._id for __, doc in res], ['doc2'])
+
+
+class TestMemoryEnginePersistent(MemorySearchTestCase, SQLite5SearchTestCase, SearchTestCase, unittest.TestCase):
+
+    def _create_search_engine(self):
+        return memoryengine.MemorySearchEngine(self.collection, u'/tmp')
+
+    def test_other_process(self):
+        self.load_documents()
+        # not shared with the engine, as in another process
+        other = memoryengine.Index(self.collection, u'/tmp')
+        other.sync()
+        self.assertEqual(sorted(other.collections['MyDocument'].ids), ['doc1', 'doc2'])
+        self.engine.update_document(self.MyDocument.delta('doc2', title=u'Functional tests'))
+        self.engine.commit()
+        other.sync()
+        collection = other.collections['MyDocument']
+        self.assertEqual(sorted(collection.match(collection.fulltext, u'unctional').keys()), [2])
+        self.engine.optimize()
+        other.sync()
+        collection = other.collections['MyDocument']
+        self.assertTrue(isinstance(collection.postings[('title', u'functional')], tuple))
+        self.assertEqual(sorted(collection.match(collection.fulltext, u'unctional').keys()), [1])
+        self.assertEqual(collection.docs[1][1]['price'], 9.90)
+
+    def test_background_snapshot(self):
+        self.load_documents()
+        index = self.engine.index
+        index.SNAPSHOT_SIZE = 0
+        try:
+            self.engine.update_document(self.MyDocument.delta('doc2', title=u'Functional tests'))
+            self.engine.commit()
+            index._snapshot_thread.join()
+        finally:
+            del index.SNAPSHOT_SIZE
+        other = memoryengine.Index(self.collection, u'/tmp')
+        other.sync()
+        collection = other.collections['MyDocument']
+        self.assertEqual(len(collection.docs), 2)
+        self.assertEqual(sorted(collection.match(collection.fulltext, u'unctional').keys()), [1])
+
+    def test_compaction(self):
+        self.load_documents()
+        index = self.engine.index
+        index.COMPACT_MIN = 0
+        try:
+            for title in (u'Functional tests', u'Unit tests', u'Load tests'):
+                self.engine.update_document(self.MyDocument.delta('doc2', title=title))
+                self.engine.commit()
+        finally:
+            del index.COMPACT_MIN
+        self.assertTrue(index.collections['MyDocument'].dead() <= 2)
+
+    def test_shadow_swap(self):
+        self.load_documents()
+        other = memoryengine.Index(self.collection, u'/tmp')
+        shadow = self.engine.create_shadow([MyDocument, Person])
+        shadow.add_document(MyDocument('doc1', title=u'Rebuilt index'))
+        shadow.commit()
+        self.assertEqual(len(self.engine.search(MyDocument.match(u'rebuilt'))), 0)
+        self.engine.swap(shadow)
+        res = self.engine.search(MyDocument.match(u'rebuilt'))
+        self.assertEqual([doc._id for __, doc in res], ['doc1'])
+        other.sync()
+        self.assertEqual(other.collections['MyDocument'].ids.keys(), ['doc1'])
+        self.assertEqual([name for name in os.listdir(u'/tmp') if name.startswith(self.collection + u'shadow')], [])
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_card_corpus(self):
+        cards = list(benchmark.card_corpus(50, seed=1))
+        self.assertEqual(len(cards), 50)
+        self.assertEqual([card.title for card in cards], [card.title for card in benchmark.card_corpus(50, seed=1)])
+        self.assertNotEqual(cards[0].title, next(benchmark.card_corpus(1, seed=2)).title)
+
+    def test_suite(self):
+        results = benchmark.suite(
+            lambda: memoryengine.MemorySearchEngine(u'benchmark'), [100, 300], searches=5, updates=5
+        )
+        self.assertEqual([run['cards'] for run in results], [100, 300])
+        self.assertEqual(
+            sorted(results[0]['search']), ['board', 'disjunction', 'match', 'matchany', 'multiterm', 'prefix']
+        )
+        self.assertEqual(results[1]['update']['count'], 5)
+
+
+class ElasticSearchTestCase(object):
+
+    def test_auto_flush(self):
+        self.engine.queue_size = 10
+        self.engine.add_documents([self.MyDocument('doc%d' % i, title=u'Titre %d' % i) for i in range(25)])
+        self.assertEqual(len(self.engine._queue), 5)
+        self.engine.commit(sync=True)
+        self.assertEqual(len(self.engine.search(self.MyDocument.match(u'titre'), 100)), 25)
+
+    def test_bulk_errors(self):
+        self.engine.queue_size = 2
+        self.engine.add_document(self.MyDocument('doc1', title=u'Titre'))
+        self.engine.add_document(self.MyDocument('doc1', title=u'Titre'))
+        self.engine.add_document(self.MyDocument('doc2', title=u'Titre'))
+        with self.assertRaises(elasticengine.helpers.BulkIndexError) as raised:
+            self.engine.commit(sync=True)
+        self.assertEqual(len(raised.exception.errors), 1)
+        self.assertIn('doc1', str(raised.exception))
+        self.assertEqual(len(self.engine.search(self.MyDocument.match(u'titre'))), 2)
+
+
+class TestElasticEngine(ElasticSearchTestCase, SearchTestCase, unittest.TestCase):
 
     def _create_search_engine(self):
         try:
@@ -316,12 +645,68 @@ class TestElasticEngine(SearchTestCase, unittest.TestCase):
             self.skipTest(unicode(exc))
 
 
+class TestElasticEngineParallelBulk(ElasticSearchTestCase, SearchTestCase, unittest.TestCase):
+
+    def _create_search_engine(self):
+        try:
+            return elasticengine.ElasticSearchEngine(self.collection, bulk_threads=4)
+        except ValueError as exc:
+            self.skipTest(unicode(exc))
+
+
+class TestElasticEnginePrefix(SearchTestCase, unittest.TestCase):
+
+    def _create_search_engine(self):
+        try:
+            return elasticengine.ElasticSearchEngine(self.collection, analysis='prefix')
+        except ValueError as exc:
+            self.skipTest(unicode(exc))
+
+
+class TestElasticMapping(unittest.TestCase):
+
+    class IndicesClient(object):
+
+        def create(self, index, body):
+            self.body = body
+
+    def create_mapping(self, analysis):
+        idx_manager = self.IndicesClient()
+        mapper = elasticengine.ESSchemaMapper(idx_manager, analysis)
+        MyDocument.map(mapper)
+        mapper.create(u'test')
+        return idx_manager.body
+
+    def test_ngram(self):
+        body = self.create_mapping('ngram')
+        self.assertEqual(body['settings']['analysis']['filter']['autocomplete_filter']['type'], 'ngram')
+        self.assertEqual(body['mappings']['MyDocument']['properties']['title']['analyzer'], 'autocomplete')
+
+    def test_prefix(self):
+        body = self.create_mapping('prefix')
+        self.assertEqual(body['settings']['analysis']['filter']['prefix_filter']['type'], 'edge_ngram')
+        properties = body['mappings']['MyDocument']['properties']
+        self.assertEqual(properties['title']['analyzer'], 'standard')
+        self.assertEqual(properties['title']['fields']['prefix']['analyzer'], 'prefix')
+        self.assertEqual(properties['title']['copy_to'], '_full')
+        self.assertEqual(properties['_full']['fields']['prefix']['analyzer'], 'prefix')
+        self.assertEqual(properties['price'], {'type': 'double', 'index': 'no'})
+        query = elasticengine.ESQueryMapper('prefix').match(MyDocument.title, u'bes')
+        self.assertEqual(query['bool']['must'], {'match': {'title.prefix': {'query': u'bes', 'operator': 'and'}}})
+
+
 class TestSQLiteEngineImpSchema(ImpSchemaSearchTestCase, unittest.TestCase):
 
     def _create_search_engine(self):
         return sqliteengine.SQLiteFTSEngine(self.collection, u'/tmp')
 
 
+class TestSQLite5EngineImpSchema(SQLite5SearchTestCase, ImpSchemaSearchTestCase, unittest.TestCase):
+
+    def _create_search_engine(self):
+        return create_sqlite5_engine(self)
+
+
 class TestElasticEngineImpSchema(ImpSchemaSearchTestCase, unittest.TestCase):
 
     def _create_search_engine(self):
@@ -329,3 +714,9 @@ class TestElasticEngineImpSchema(ImpSchemaSearchTestCase, unittest.TestCase):
             return elasticengine.ElasticSearchEngine(self.collection)
         except ValueError as exc:
             self.skipTest(unicode(exc))
+
+
+class TestMemoryEngineImpSchema(SQLite5SearchTestCase, ImpSchemaSearchTestCase, unittest.TestCase):
+
+    def _create_search_engine(self):
+        return memoryengine.MemorySearchEngine(self.collection)
@@ -0,0 +1,145 @@
+# -*- coding:utf-8 -*-
+#--
+# Copyright (c) 2012-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+#--
+
+import unittest
+
+from nagare import component, database, i18n
+from elixir import metadata as __metadata__
+
+from kansha import events, helpers
+from kansha.pickle import pickled_sizes
+from kansha.card_addons.due_date.comp import DueDate
+from kansha.card_addons.label.comp import CardLabels
+
+
+class Leaf(object):
+
+    def __init__(self):
+        self.text = u'x' * 100
+
+
+class Node(object):
+
+    def __init__(self, leaves):
+        self.leaves = [Leaf() for __ in xrange(leaves)]
+
+
+class PickledSizesTest(unittest.TestCase):
+
+    def test_sizes_by_class(self):
+        """Pickled sizes - the bytes of the nested instances are counted for their class"""
+        total, sizes = pickled_sizes(Node(3))
+        self.assertEqual(set(sizes), {__name__ + '.Node', __name__ + '.Leaf'})
+        self.assertLess(sum(sizes.values()), total)
+        self.assertGreater(sizes[__name__ + '.Leaf'], 3 * 100)
+        self.assertLess(sizes[__name__ + '.Node'], 100)
+
+    def test_shared_instances(self):
+        """Pickled sizes - shared instances are counted once"""
+        node = Node(1)
+        __, sizes = pickled_sizes([node, node])
+        __, sizes2 = pickled_sizes([node])
+        self.assertEqual(sizes, sizes2)
+
+
+class LazyExtensionsTest(unittest.TestCase):
+
+    def setUp(self):
+        database.set_metadata(__metadata__, 'sqlite:///:memory:', False, {})
+        helpers.setup_db(__metadata__)
+        helpers.set_context(helpers.create_user())
+        board = helpers.create_board([('labels', CardLabels), ('due_date', DueDate)])
+        self.card = board.create_column(1, u'test').create_card(u'test')
+
+    def tearDown(self):
+        helpers.teardown_db(__metadata__)
+
+    def test_built_on_first_use(self):
+        """Card extensions - only the used extensions are built"""
+        self.card.refresh()
+        self.assertEqual(self.card._extensions, {})
+        due_date = self.card.extension('due_date')
+        self.assertEqual(self.card._extensions.keys(), ['due_date'])
+        self.assertIs(self.card.extension('due_date'), due_date)
+        self.assertEqual([name for name, __ in self.card.extensions], ['labels', 'due_date'])
+
+    def test_render_cache_key(self):
+        """Card extensions - the render cache key doesn't build the extensions"""
+        self.card.refresh()
+        with i18n.Locale('en', 'US'):
+            self.assertIsNotNone(self.card.render_cache_key())
+        self.assertEqual(self.card._extensions, {})
+
+    def test_released_from_session(self):
+        """Card extensions - they are not pickled, unless the card is being edited"""
+        self.card.extensions
+        self.assertEqual(self.card.__getstate__()['_extensions'], {})
+        # the card in use is left untouched
+        self.assertEqual(len(self.card._extensions), 2)
+
+        card_comp = component.Component(self.card).on_answer(lambda event: None)
+        self.card.emit_event(card_comp, events.CardClicked, card_comp)
+        self.card.extensions
+        self.assertEqual(len(self.card.__getstate__()['_extensions']), 2)
+
+
+class CompactStateTest(unittest.TestCase):
+
+    def setUp(self):
+        database.set_metadata(__metadata__, 'sqlite:///:memory:', False, {})
+        helpers.setup_db(__metadata__)
+        helpers.set_context(helpers.create_user())
+        self.board = helpers.create_board([('labels', CardLabels), ('due_date', DueDate)])
+        self.column_comp = self.board.columns[0].on_answer(lambda event: None)
+
+    def tearDown(self):
+        helpers.teardown_db(__metadata__)
+
+    def test_bulk_preload(self):
+        """Compact state - the cards of the board are built together and share their preloaded data"""
+        cards = self.column_comp().cards
+        others = self.board.columns[1]().cards
+        self.assertTrue(self.board.columns[1]().cards_built)
+        preloader = cards[0]().preloader
+        self.assertIs(others[0]().preloader, preloader)
+        self.assertIsNone(preloader.preloaded)
+        self.assertEqual(len(cards[2]().extension('labels')().labels), 2)
+        self.assertIsNotNone(preloader.preloaded)
+        others[0]().extension('labels')
+        self.assertIsNone(others[0]().preloader)
+
+    def test_cards_rebuilt(self):
+        """Compact state - the columns only keep the cards being edited"""
+        column = self.column_comp()
+        cards = list(column.cards)
+        card = cards[1]()
+        column.open_card(self.column_comp, card.db_id)
+        self.assertTrue(card.editing)
+
+        state = column.__getstate__()
+        self.assertIsNone(state['_cards'])
+        self.assertEqual(state['_open_cards'], {card.db_id: cards[1]})
+        # the column in use is left untouched
+        self.assertEqual(column.cards, cards)
+
+        column.__dict__.update(state)
+        self.assertFalse(column.cards_built)
+        rebuilt = column.cards
+        self.assertEqual([column.get_card(card_comp).db_id for card_comp in rebuilt],
+                         [column.get_card(card_comp).db_id for card_comp in cards])
+        self.assertIs(rebuilt[1], cards[1])
+        self.assertIsNot(rebuilt[0], cards[0])
+
+    def test_find_card(self):
+        """Compact state - the actions find the cards by id"""
+        column = self.column_comp()
+        card_comp = column.cards[0]
+        self.assertIs(column.find_card(self.column_comp, card_comp().db_id), card_comp)
+        self.assertIsNone(column.find_card(self.column_comp, -1))